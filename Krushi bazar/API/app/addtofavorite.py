@@ -1,7 +1,6 @@
 from flask import Blueprint, request, jsonify
 from API.db_connect import get_db
 from API.app.translation_service import HybridTranslationService
-import asyncio
 import time
 
 addtofavorite_bp = Blueprint('addtofavorite', __name__)
@@ -28,7 +27,7 @@ def addtofavorite():
     
     if action == 'get':
         query = """
-            SELECT fd.marketid, d.name
+            SELECT fd.marketid, d.name, d.name_hi, d.name_gu
             FROM favorite_markets fd
             JOIN markets d ON fd.marketid = d.id
             WHERE fd.user_id = %s AND fd.isFavorite = 1
@@ -41,19 +40,15 @@ def addtofavorite():
         for row in rows:
             favorites.append({
                 'district_id': str(row['marketid']),
-                'district_name': row['name']
+                'district_name': row['name'],
+                'district_name_hi': row['name_hi'],
+                'district_name_gu': row['name_gu']
             })
         
-        # Translate district names if language is specified
-        if language in ['hi', 'gu'] and favorites:  # Hindi or Gujarati
-            # Use the HybridTranslationService for accurate translations
-            translated_favorites = asyncio.run(
-                HybridTranslationService.batch_hybrid_translate(favorites, language, 'district_name')
-            )
-            return jsonify({'status': 'success', 'favorites': translated_favorites})
-        else:
-            # Return original data for English or unsupported languages
-            return jsonify({'status': 'success', 'favorites': favorites})
+        # Use the precomputed Hindi/Gujarati names (names not localised yet
+        # are translated by the HybridTranslationService)
+        favorites = HybridTranslationService.localize_rows(favorites, language, ['district_name'])
+        return jsonify({'status': 'success', 'favorites': favorites})
 
     # For add action, validate marketid
     if not data.get('marketid') or not data.get('marketid').strip():
@@ -1,7 +1,6 @@
 from flask import Blueprint, request, jsonify
 from API.db_connect import get_db
 from API.app.translation_service import HybridTranslationService
-import asyncio
 
 alerts_bp = Blueprint('alerts', __name__)
 
@@ -67,69 +66,12 @@ def alerts():
 
 
         if alerts_data:
-            # Enhanced translation logic that handles all scenarios properly
-            translated_alerts = []
-            
-            for alert in alerts_data:
-                translated_alert = alert.copy()
-                
-                # Define fields to translate
-                fields_to_translate = ['market_name', 'commodity', 'variety', 'conditions']
-                
-                for field in fields_to_translate:
-                    if field in translated_alert and translated_alert[field]:
-                        original_value = translated_alert[field]
-                        
-                        if language == 'en':
-                            # Translate TO English (from any source language)
-                            try:
-                                # Check if it's already English
-                                if HybridTranslationService.is_english_text(original_value):
-                                    translated_alert[field] = original_value
-                                else:
-                                    # Detect language and translate to English
-                                    detected_lang = HybridTranslationService.detect_language_from_json(original_value)
-                                    if detected_lang:
-                                        translated_alert[field] = asyncio.run(
-                                            HybridTranslationService.reverse_translate_to_english(original_value, detected_lang)
-                                        )
-                                    else:
-                                        # Fallback: use Google Translate
-                                        translated_alert[field] = asyncio.run(
-                                            HybridTranslationService.detect_language_and_translate_to_english(original_value)
-                                        )
-                            except Exception as e:
-                                print(f"Translation error for {field}: {e}")
-                                translated_alert[field] = original_value
-                                
-                        elif language in ['hi', 'gu']:
-                            # Translate TO Hindi/Gujarati (from any source language)
-                            try:
-                                # First, get English version
-                                if HybridTranslationService.is_english_text(original_value):
-                                    english_value = original_value
-                                else:
-                                    # Convert to English first
-                                    detected_lang = HybridTranslationService.detect_language_from_json(original_value)
-                                    if detected_lang:
-                                        english_value = asyncio.run(
-                                            HybridTranslationService.reverse_translate_to_english(original_value, detected_lang)
-                                        )
-                                    else:
-                                        english_value = asyncio.run(
-                                            HybridTranslationService.detect_language_and_translate_to_english(original_value)
-                                        )
-                                
-                                # Then translate from English to target language
-                                translated_alert[field] = asyncio.run(
-                                    HybridTranslationService.hybrid_translate(english_value, language)
-                                )
-                            except Exception as e:
-                                print(f"Translation error for {field}: {e}")
-                                translated_alert[field] = original_value
-                        # For unsupported languages, keep original data
-                
-                translated_alerts.append(translated_alert)
+            # Translate every field of every alert to the requested language
+            # (from any source language) in one batched call. Unsupported
+            # languages and failed terms keep the original data.
+            translated_alerts = HybridTranslationService.localize_fields(
+                alerts_data, language, ['market_name', 'commodity', 'variety', 'conditions']
+            )
             
             return jsonify({'status': 'success', 'data': translated_alerts})
         else:
@@ -2,8 +2,70 @@ from flask import Blueprint, jsonify, request
 from API.db_connect import get_db
 from API.app.translation_service import HybridTranslationService
 import asyncio
+from app.log import get_logger
 
 banner_bp = Blueprint('banner', __name__)
+logger = get_logger('api.banner')
+
+def _banner_dict(banner):
+    return {
+        'id': str(banner['id']),
+        'title': banner['title'],
+        'description': banner['description'],
+        'language': banner['language']
+    }
+
+async def _translate_banner_field(text, db_language, requested_language):
+    """
+    Translate one banner field to the requested language.
+    Returns (text, original_language), original_language None when unchanged.
+    """
+    # Always detect the actual language of content, regardless of database language field;
+    # if language detection fails, assume it's the database language
+    actual_lang = HybridTranslationService.detect_language_from_json(text) or db_language
+    result, original_language = text, None
+    
+    # Translate content if it's in English
+    if actual_lang == 'en' or HybridTranslationService.is_english_text(text):
+        try:
+            result = await HybridTranslationService.hybrid_translate(text, requested_language)
+            original_language = 'en'
+        except Exception as e:
+            # Keep original text if translation fails
+            logger.warning(f"Banner translation error: {e}")
+    
+    # If content is already in the requested language, keep it as is
+    # But if it's in a different non-English language, translate to requested language
+    if actual_lang not in ['en', requested_language]:
+        try:
+            # Translate from other language to English first, then to requested language
+            english = await HybridTranslationService.reverse_translate_to_english(text, actual_lang)
+            result = await HybridTranslationService.hybrid_translate(english, requested_language)
+            original_language = actual_lang
+        except Exception as e:
+            logger.warning(f"Banner translation error: {e}")
+    
+    return result, original_language
+
+async def _translate_banners(banners, requested_language):
+    processed_banners = [_banner_dict(banner) for banner in banners]
+    
+    # If user requested Hindi or Gujarati, translate content to that language
+    if requested_language not in ['hi', 'gu']:
+        return processed_banners
+    
+    fields = ['title', 'description']
+    results = await asyncio.gather(*[
+        _translate_banner_field(banner[field], banner['language'], requested_language)
+        for banner in banners for field in fields
+    ])
+    for i, banner_dict in enumerate(processed_banners):
+        for j, field in enumerate(fields):
+            text, original_language = results[i * len(fields) + j]
+            banner_dict[field] = text
+            if original_language:
+                banner_dict[f'original_{field}_language'] = original_language
+    return processed_banners
 
 @banner_bp.route('/API/banner', methods=['POST'])
 def banner():
@@ -24,83 +86,14 @@ def banner():
         return jsonify({'status': 'error', 'message': f'No banners found for language: {requested_language}'})
     
     # Step 2: Process the retrieved data and apply translation logic if needed
-    processed_banners = []
-    
-    for banner in banners:
-        banner_dict = {
-            'id': str(banner['id']),
-            'title': banner['title'],
-            'description': banner['description'],
-            'language': banner['language']
-        }
-        
-        # Always detect the actual language of content, regardless of database language field
-        title_actual_lang = HybridTranslationService.detect_language_from_json(banner['title'])
-        desc_actual_lang = HybridTranslationService.detect_language_from_json(banner['description'])
-        
-        # If language detection fails, assume it's the database language
-        if not title_actual_lang:
-            title_actual_lang = banner['language']
-        if not desc_actual_lang:
-            desc_actual_lang = banner['language']
-        
-        # If user requested Hindi or Gujarati, translate English content to that language
-        if requested_language in ['hi', 'gu']:
-            # Translate title if it's in English
-            if title_actual_lang == 'en' or HybridTranslationService.is_english_text(banner['title']):
-                try:
-                    translated_title = asyncio.run(
-                        HybridTranslationService.hybrid_translate(banner['title'], requested_language)
-                    )
-                    banner_dict['title'] = translated_title
-                    banner_dict['original_title_language'] = 'en'
-                except Exception as e:
-                    print(f"Title translation error: {e}")
-                    # Keep original title if translation fails
-            
-            # Translate description if it's in English
-            if desc_actual_lang == 'en' or HybridTranslationService.is_english_text(banner['description']):
-                try:
-                    translated_description = asyncio.run(
-                        HybridTranslationService.hybrid_translate(banner['description'], requested_language)
-                    )
-                    banner_dict['description'] = translated_description
-                    banner_dict['original_description_language'] = 'en'
-                except Exception as e:
-                    print(f"Description translation error: {e}")
-                    # Keep original description if translation fails
-            
-            # If content is already in the requested language, keep it as is
-            # But if it's in a different non-English language, translate to requested language
-            if title_actual_lang not in ['en', requested_language]:
-                try:
-                    # Translate from other language to English first, then to requested language
-                    english_title = asyncio.run(
-                        HybridTranslationService.reverse_translate_to_english(banner['title'], title_actual_lang)
-                    )
-                    translated_title = asyncio.run(
-                        HybridTranslationService.hybrid_translate(english_title, requested_language)
-                    )
-                    banner_dict['title'] = translated_title
-                    banner_dict['original_title_language'] = title_actual_lang
-                except Exception as e:
-                    print(f"Title translation error: {e}")
-            
-            if desc_actual_lang not in ['en', requested_language]:
-                try:
-                    # Translate from other language to English first, then to requested language
-                    english_description = asyncio.run(
-                        HybridTranslationService.reverse_translate_to_english(banner['description'], desc_actual_lang)
-                    )
-                    translated_description = asyncio.run(
-                        HybridTranslationService.hybrid_translate(english_description, requested_language)
-                    )
-                    banner_dict['description'] = translated_description
-                    banner_dict['original_description_language'] = desc_actual_lang
-                except Exception as e:
-                    print(f"Description translation error: {e}")
-        
-        processed_banners.append(banner_dict)
+    # (all banners and fields are translated in one call on the translation loop)
+    try:
+        processed_banners = HybridTranslationService.run(
+            _translate_banners(banners, requested_language)
+        )
+    except Exception as e:
+        logger.warning(f"Banner translation error: {e}")
+        processed_banners = [_banner_dict(banner) for banner in banners]
     
     return jsonify({
         'status': 'success', 
@@ -2,23 +2,11 @@ from flask import Blueprint, request, jsonify
 from API.db_connect import get_db
 from datetime import datetime, timedelta
 from API.app.translation_service import HybridTranslationService
-import asyncio
+from app.data.price_dates import format_price_date
+from app.log import get_logger
 
 commodity_stats_bp = Blueprint('commodity_stats', __name__)
-
-def format_price_date(date_str):
-    """Handle different date formats and return consistent format"""
-    try:
-        # Try to parse as YYYY-MM-DD format
-        if '-' in date_str and len(date_str.split('-')[0]) == 4:
-            date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-            return f"{date_obj.day} {date_obj.strftime('%b')}"
-        else:
-            # If it's already formatted like "27 Aug", return as is
-            return date_str
-    except:
-        # If parsing fails, return the original string
-        return date_str
+logger = get_logger('api.commodity_stats')
 
 @commodity_stats_bp.route('/API/commodity_stats', methods=['POST'])
 def commodity_stats():
@@ -43,19 +31,11 @@ def commodity_stats():
     
     # Always translate input to English for database query (regardless of input language)
     try:
-        # Create temporary data for translation
-        temp_data = [{'commodity': commodity, 'variety': variety}]
-        
-        # Auto-detect language and translate commodity to English for database query
-        translated_data = asyncio.run(
-            HybridTranslationService.batch_detect_and_translate_to_english(temp_data, 'commodity')
+        # Auto-detect language and translate commodity and variety to English for database query
+        translated_data = HybridTranslationService.fields_to_english(
+            [{'commodity': commodity, 'variety': variety}], ['commodity', 'variety']
         )
         commodity = translated_data[0]['commodity']
-        
-        # Auto-detect language and translate variety to English for database query
-        translated_data = asyncio.run(
-            HybridTranslationService.batch_detect_and_translate_to_english(temp_data, 'variety')
-        )
         variety = translated_data[0]['variety']
         
         # Debug logging (commented out for production)
@@ -63,21 +43,25 @@ def commodity_stats():
         # print(f"Translated input - Original: {original_variety} -> English: {variety}")
         
     except Exception as e:
-        print(f"Translation error for input parameters: {e}")
+        logger.warning(f"Translation error for input parameters: {e}")
         # If translation fails, use original values
         commodity = original_commodity
         variety = original_variety
 
-    from_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
-    to_date = datetime.now().strftime('%Y-%m-%d')
+    to_date = datetime.now().date()
+    from_date = to_date - timedelta(days=days)
 
     cursor = db.cursor()
     query = """
-        SELECT id, commodity, variety, modal_price, min_price, max_price, price_date
-        FROM commodity_prices
-        WHERE commodity = %s AND variety = %s AND market_id = %s
-          AND last_updated BETWEEN %s AND %s
-        ORDER BY last_updated ASC
+        SELECT cp.id, cp.commodity, cp.variety, cp.modal_price, cp.min_price, cp.max_price, cp.price_date, cp.price_day,
+               ct.name_hi AS commodity_hi, ct.name_gu AS commodity_gu,
+               vt.name_hi AS variety_hi, vt.name_gu AS variety_gu
+        FROM commodity_prices cp
+        LEFT JOIN name_translations ct ON ct.kind = 'commodity' AND ct.name = cp.commodity
+        LEFT JOIN name_translations vt ON vt.kind = 'variety' AND vt.name = cp.variety
+        WHERE cp.commodity = %s AND cp.variety = %s AND cp.market_id = %s
+          AND cp.price_day BETWEEN %s AND %s
+        ORDER BY cp.price_day ASC, cp.id ASC
     """
     cursor.execute(query, (commodity, variety, market_id, from_date, to_date))
     rows = cursor.fetchall()
@@ -96,7 +80,7 @@ def commodity_stats():
                 status = "decrease"
         
         # Use helper function for date formatting
-        formatted_date = format_price_date(row['price_date'])
+        formatted_date = format_price_date(row['price_day'], row['price_date'])
         
         temp_data.append({
             'id': str(row['id']),
@@ -106,7 +90,8 @@ def commodity_stats():
             'min_price': int(row['min_price'] / 5),      # Match PHP: divide by 5, no decimals
             'max_price': int(row['max_price'] / 5),      # Match PHP: divide by 5, no decimals
             'price_date': formatted_date,
-            'status': status
+            'status': status,
+            **{f'{field}_{lang}': row[f'{field}_{lang}'] for field in ('commodity', 'variety') for lang in ('hi', 'gu')}
         })
         prices.append(row['modal_price'])
         previous_price = row['modal_price']
@@ -124,35 +109,14 @@ def commodity_stats():
             'total_entries': len(prices)
         }
         
-        # Translate data if language is specified
-        if language in ['hi', 'gu'] and all_data:  # Hindi or Gujarati
-            # Use the HybridTranslationService for accurate translations
-            # First translate commodity names
-            data_with_translated_commodities = asyncio.run(
-                HybridTranslationService.batch_hybrid_translate(all_data, language, 'commodity')
-            )
-            # Then translate variety names
-            data_with_translated_varieties = asyncio.run(
-                HybridTranslationService.batch_hybrid_translate(data_with_translated_commodities, language, 'variety')
-            )
-            # Finally translate status messages
-            translated_data = asyncio.run(
-                HybridTranslationService.batch_hybrid_translate(data_with_translated_varieties, language, 'status')
-            )
-            
-            return jsonify({
-                'status': 'success',
-                'filter_days': days,
-                'summary': summary,
-                'data': translated_data
-            })
-        else:
-            # Return original data for English or unsupported languages
-            return jsonify({
-                'status': 'success',
-                'filter_days': days,
-                'summary': summary,
-                'data': all_data
-            })
+        # Use the precomputed Hindi/Gujarati names; names not localised yet and
+        # the status are translated by the HybridTranslationService in one batched call
+        all_data = HybridTranslationService.localize_rows(all_data, language, ['commodity', 'variety', 'status'])
+        return jsonify({
+            'status': 'success',
+            'filter_days': days,
+            'summary': summary,
+            'data': all_data
+        })
     else:
         return jsonify({'status': 'error', 'message': 'No data found for the selected filter'})
\ No newline at end of file
@@ -1,13 +1,12 @@
 from flask import Blueprint, request, jsonify
-from API.db_connect import get_db
+from app.data.locations import get_directory, localized_names
+from app.data.response_cache import response_cache
 from API.app.translation_service import HybridTranslationService
-import asyncio
 
 districtlist_bp = Blueprint('districtlist', __name__)
 
 @districtlist_bp.route('/API/districtlist', methods=['POST'])
 def districtlist():
-    db = get_db()
     data = request.get_json()
     state_id = data.get('state_id', '').strip()
     language = data.get('language', 'en').lower()  # Get language parameter
@@ -15,27 +14,26 @@ def districtlist():
     if not state_id:
         return jsonify({'status': 'error', 'message': 'State ID is required'})
 
-    cursor = db.cursor()
-    cursor.execute("SELECT id, name FROM districts WHERE state_id = %s ORDER BY name", (state_id,))
-    rows = cursor.fetchall()
+    # Served pre-serialised until the hierarchy changes
+    return response_cache.respond(
+        'districtlist', (state_id, language), lambda: render_districtlist(state_id, language)
+    )
+
+def render_districtlist(state_id, language):
+    rows = get_directory().districts(int(state_id)) if state_id.isdigit() else []
 
     if rows:
         districts = []
         for row in rows:
             districts.append({
                 'id': str(row['id']),
-                'name': row['name']
+                'name': row['name'],
+                **localized_names(row, 'name')
             })
 
-        # Translate districts if language is specified
-        if language in ['hi', 'gu'] and districts:  # Hindi or Gujarati
-            # Use the HybridTranslationService for accurate translations
-            translated_districts = asyncio.run(
-                HybridTranslationService.batch_hybrid_translate(districts, language, 'name')
-            )
-            return jsonify({'status': 'success', 'data': translated_districts})
-        else:
-            # Return original data for English or unsupported languages
-            return jsonify({'status': 'success', 'data': districts})
+        # Use the precomputed Hindi/Gujarati names (names not localised yet
+        # are translated by the HybridTranslationService)
+        districts = HybridTranslationService.localize_rows(districts, language, ['name'])
+        return {'status': 'success', 'data': districts}, 200
     else:
-        return jsonify({'status': 'error', 'message': 'No districts found'})
\ No newline at end of file
+        return {'status': 'error', 'message': 'No districts found'}, 200
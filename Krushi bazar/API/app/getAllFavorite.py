@@ -1,7 +1,6 @@
 from flask import Blueprint, request, jsonify
 from API.db_connect import get_db
 from API.app.translation_service import HybridTranslationService
-import asyncio
 import time
 
 getAllFavorite_bp = Blueprint('getAllFavorite', __name__)
@@ -18,7 +17,10 @@ def getAllFavorite():
 
     cursor = db.cursor()
     query = """
-        SELECT m.id AS market_id, m.name AS market_name, d.name AS district_name, s.name AS state_name
+        SELECT m.id AS market_id, m.name AS market_name, d.name AS district_name, s.name AS state_name,
+               m.name_hi AS market_name_hi, m.name_gu AS market_name_gu,
+               d.name_hi AS district_name_hi, d.name_gu AS district_name_gu,
+               s.name_hi AS state_name_hi, s.name_gu AS state_name_gu
         FROM favorite_markets fm
         LEFT JOIN markets m ON fm.marketid = m.id
         LEFT JOIN districts d ON m.district_id = d.id
@@ -34,24 +36,11 @@ def getAllFavorite():
         favorite['market_id'] = str(favorite['market_id'])
 
     if favorites:
-        # Translate data if language is specified
-        if language in ['hi', 'gu']:  # Hindi or Gujarati
-            # Use the HybridTranslationService for accurate translations
-            # First translate market names
-            data_with_translated_markets = asyncio.run(
-                HybridTranslationService.batch_hybrid_translate(favorites, language, 'market_name')
-            )
-            # Then translate district names
-            data_with_translated_districts = asyncio.run(
-                HybridTranslationService.batch_hybrid_translate(data_with_translated_markets, language, 'district_name')
-            )
-            # Finally translate state names
-            translated_data = asyncio.run(
-                HybridTranslationService.batch_hybrid_translate(data_with_translated_districts, language, 'state_name')
-            )
-            return jsonify({'status': 'success', 'data': translated_data})
-        else:
-            # Return original data for English or unsupported languages
-            return jsonify({'status': 'success', 'data': favorites})
+        # Use the precomputed Hindi/Gujarati names (names not localised yet
+        # are translated by the HybridTranslationService in one batched call)
+        favorites = HybridTranslationService.localize_rows(
+            favorites, language, ['market_name', 'district_name', 'state_name']
+        )
+        return jsonify({'status': 'success', 'data': favorites})
     else:
         return jsonify({'status': 'error', 'message': 'No favorites found'})
\ No newline at end of file
@@ -1,7 +1,6 @@
 from flask import Blueprint, request, jsonify
 from API.db_connect import get_db
 from API.app.translation_service import HybridTranslationService
-import asyncio
 import time
 
 getCommodityBasedOnmarket_bp = Blueprint('getCommodityBasedOnmarket', __name__)
@@ -18,11 +17,14 @@ def getCommodityBasedOnmarket():
 
     cursor = db.cursor()
     query = """
-        SELECT MIN(id) as id, commodity, variety
-        FROM commodity_prices
-        WHERE market_id = %s
-        GROUP BY commodity, variety
-        ORDER BY id DESC
+        SELECT lp.first_price_id AS id, lp.commodity, lp.variety,
+               ct.name_hi AS commodity_hi, ct.name_gu AS commodity_gu,
+               vt.name_hi AS variety_hi, vt.name_gu AS variety_gu
+        FROM latest_prices lp
+        LEFT JOIN name_translations ct ON ct.kind = 'commodity' AND ct.name = lp.commodity
+        LEFT JOIN name_translations vt ON vt.kind = 'variety' AND vt.name = lp.variety
+        WHERE lp.market_id = %s
+        ORDER BY lp.first_price_id DESC
     """
     cursor.execute(query, (market_id,))
     commodities_data = cursor.fetchall()  # DictCursor automatically returns dictionaries
@@ -31,18 +33,9 @@ def getCommodityBasedOnmarket():
     for commodity in commodities_data:
         commodity['id'] = str(commodity['id'])
 
-    # Translate data if language is specified
-    if language in ['hi', 'gu'] and commodities_data:  # Hindi or Gujarati
-        # Use the HybridTranslationService for accurate translations
-        # First translate commodity names
-        data_with_translated_commodities = asyncio.run(
-            HybridTranslationService.batch_hybrid_translate(commodities_data, language, 'commodity')
-        )
-        # Then translate variety names
-        translated_data = asyncio.run(
-            HybridTranslationService.batch_hybrid_translate(data_with_translated_commodities, language, 'variety')
-        )
-        return jsonify({'status': 'success', 'data': translated_data})
-    else:
-        # Return original data for English or unsupported languages
-        return jsonify({'status': 'success', 'data': commodities_data})
\ No newline at end of file
+    # Use the precomputed Hindi/Gujarati names (names not localised yet
+    # are translated by the HybridTranslationService in one batched call)
+    commodities_data = HybridTranslationService.localize_rows(
+        commodities_data, language, ['commodity', 'variety']
+    )
+    return jsonify({'status': 'success', 'data': commodities_data})
\ No newline at end of file
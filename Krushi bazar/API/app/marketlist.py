@@ -1,67 +1,52 @@
-from flask import Blueprint, request, jsonify
-from API.db_connect import get_db
+from flask import Blueprint, request
+from app.data.locations import get_directory, localized_names
+from app.data.response_cache import response_cache
 from API.app.translation_service import HybridTranslationService
-import asyncio
 
 marketlist_bp = Blueprint('marketlist', __name__)
 
 @marketlist_bp.route('/API/marketlist', methods=['POST'])
 def marketlist():
-    db = get_db()
     data = request.get_json()
     stateid = data.get('stateid', '').strip() if data.get('stateid') else None
     userid = data.get('userid', '').strip() if data.get('userid') else None
     language = data.get('language', 'en').lower()  # Get language parameter
 
-    cursor = db.cursor()
+    # Served pre-serialised until the hierarchy changes
+    return response_cache.respond(
+        'marketlist', (stateid, language), lambda: render_marketlist(stateid, language)
+    )
+
+def render_marketlist(stateid, language):
+    directory = get_directory()
     if stateid:
-        query = """
-            SELECT m.id AS market_id, m.name AS market_name, d.name AS district_name, s.name AS state_name
-            FROM markets m
-            JOIN districts d ON m.district_id = d.id
-            JOIN states s ON d.state_id = s.id
-            WHERE m.state_id = %s
-        """
-        cursor.execute(query, (stateid,))
+        markets = directory.markets(state_id=int(stateid)) if stateid.isdigit() else []
     else:
-        query = """
-            SELECT m.id AS market_id, m.name AS market_name, d.name AS district_name, s.name AS state_name
-            FROM markets m
-            JOIN districts d ON m.district_id = d.id
-            JOIN states s ON d.state_id = s.id
-        """
-        cursor.execute(query)
-    rows = cursor.fetchall()
+        markets = directory.markets()
+    rows = []
+    for market in markets:
+        district = directory.get_district(market['district_id'])
+        state = directory.get_state(market['state_id'])
+        if district and state:
+            rows.append({
+                'market_id': market['id'],
+                'market_name': market['name'],
+                'district_name': district['name'],
+                'state_name': state['name'],
+                **localized_names(market, 'market_name'),
+                **localized_names(district, 'district_name'),
+                **localized_names(state, 'state_name')
+            })
 
     if rows:
-        markets = []
         for row in rows:
-            markets.append({
-                'market_id': str(row['market_id']),
-                'market_name': row['market_name'],
-                'district_name': row['district_name'],
-                'state_name': row['state_name']
-            })
+            row['market_id'] = str(row['market_id'])
 
-        # Translate markets if language is specified
-        if language in ['hi', 'gu'] and markets:  # Hindi or Gujarati
-            # Use the HybridTranslationService for accurate translations
-            # First translate market names
-            data_with_translated_markets = asyncio.run(
-                HybridTranslationService.batch_hybrid_translate(markets, language, 'market_name')
-            )
-            # Then translate district names
-            data_with_translated_districts = asyncio.run(
-                HybridTranslationService.batch_hybrid_translate(data_with_translated_markets, language, 'district_name')
-            )
-            # Finally translate state names
-            translated_markets = asyncio.run(
-                HybridTranslationService.batch_hybrid_translate(data_with_translated_districts, language, 'state_name')
-            )
-            
-            return jsonify({'status': 'success', 'data': translated_markets})
-        else:
-            # Return original data for English or unsupported languages
-            return jsonify({'status': 'success', 'data': markets})
+        # Use the precomputed Hindi/Gujarati names (names not localised yet
+        # are translated by the HybridTranslationService in one batched call)
+        markets = HybridTranslationService.localize_rows(
+            rows, language, ['market_name', 'district_name', 'state_name']
+        )
+        return {'status': 'success', 'data': markets}, 200
     else:
-        return jsonify({'status': 'error', 'message': 'No markets found'})
\ No newline at end of file
+        return {'status': 'error', 'message': 'No markets found'}, 200
@@ -0,0 +1,213 @@
+# Translation cache for HybridTranslationService
+#
+# Translations are cached per term, keyed by (source_lang, target_lang, text).
+# Each process keeps a bounded LRU tier in memory in front of a SQLite file
+# that survives restarts and is shared by every worker on the host. Terms from
+# the JSON dictionaries never expire; machine translations expire after
+# TRANSLATION_CACHE_TTL seconds so Google fixes eventually reach the cache.
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from app.config import Config
+from app.log import get_logger
+
+logger = get_logger('translation_cache')
+
+ORIGIN_DICTIONARY = 'dictionary'
+ORIGIN_MACHINE = 'machine'
+ORIGIN_CUSTOM = 'custom'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS translations (
+    source_lang TEXT NOT NULL,
+    target_lang TEXT NOT NULL,
+    text TEXT NOT NULL,
+    translation TEXT NOT NULL,
+    origin TEXT NOT NULL,
+    expires_at REAL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (source_lang, target_lang, text)
+);
+CREATE TABLE IF NOT EXISTS cache_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class TranslationCache:
+    """
+    Two-tier (memory LRU + SQLite) cache of single-term translations.
+    Safe to use from several threads; each thread gets its own SQLite
+    connection.
+    """
+
+    def __init__(self, path=None, max_entries=None, ttl=None, memory_ttl=None):
+        self.path = path or Config.TRANSLATION_CACHE_PATH
+        self.max_entries = Config.TRANSLATION_CACHE_SIZE if max_entries is None else max_entries
+        self.ttl = Config.TRANSLATION_CACHE_TTL if ttl is None else ttl
+        self.memory_ttl = Config.TRANSLATION_CACHE_MEMORY_TTL if memory_ttl is None else memory_ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._metrics = {
+            'memory_hits': 0, 'store_hits': 0, 'misses': 0, 'writes': 0,
+            'evictions': 0, 'expirations': 0, 'store_errors': 0, 'prewarmed': 0
+        }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.executescript(_SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            # WAL lets readers in other workers proceed while one worker writes
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._metrics[key] += amount
+
+    # Memory tier
+
+    def _memory_get(self, key, now):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            translation, expires_at = entry
+            if expires_at is not None and expires_at <= now:
+                del self._memory[key]
+                self._metrics['expirations'] += 1
+                return None
+            self._memory.move_to_end(key)
+            self._metrics['memory_hits'] += 1
+            return translation
+
+    def _memory_put(self, key, translation, expires_at):
+        with self._lock:
+            self._memory[key] = (translation, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self._metrics['evictions'] += 1
+
+    def _memory_expiry(self, now, store_expiry):
+        # Entries are re-read from SQLite after memory_ttl so writes made by
+        # other workers (e.g. custom translations) become visible
+        expires_at = now + self.memory_ttl
+        return expires_at if store_expiry is None else min(expires_at, store_expiry)
+
+    # Public API
+
+    def get(self, source_lang, target_lang, text):
+        """Cached translation of text, or None"""
+        key = (source_lang, target_lang, text)
+        now = time.time()
+        translation = self._memory_get(key, now)
+        if translation is not None:
+            return translation
+        try:
+            row = self._connection().execute(
+                'SELECT translation, expires_at FROM translations '
+                'WHERE source_lang = ? AND target_lang = ? AND text = ?',
+                key
+            ).fetchone()
+        except sqlite3.Error as e:
+            self._count('store_errors')
+            logger.error(f"Error reading translation cache: {e}")
+            row = None
+        if row is not None and row[1] is not None and row[1] <= now:
+            self._count('expirations')
+            row = None
+        if row is None:
+            self._count('misses')
+            return None
+        self._count('store_hits')
+        self._memory_put(key, row[0], self._memory_expiry(now, row[1]))
+        return row[0]
+
+    def set(self, source_lang, target_lang, text, translation, origin=ORIGIN_MACHINE):
+        """Store a translation in both tiers; machine translations get a TTL"""
+        key = (source_lang, target_lang, text)
+        now = time.time()
+        expires_at = now + self.ttl if origin == ORIGIN_MACHINE else None
+        self._memory_put(key, translation, self._memory_expiry(now, expires_at))
+        try:
+            self._connection().execute(
+                'INSERT OR REPLACE INTO translations '
+                '(source_lang, target_lang, text, translation, origin, expires_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                key + (translation, origin, expires_at, now)
+            )
+            self._count('writes')
+        except sqlite3.Error as e:
+            self._count('store_errors')
+            logger.error(f"Error writing translation cache: {e}")
+
+    def prewarm(self, entries, signature):
+        """
+        Load dictionary translations ((source, target, text, translation)
+        tuples) into both tiers. The SQLite store is only rewritten when the
+        dictionaries changed since the last prewarm (compared by signature).
+        Custom translations are never overwritten.
+        """
+        entries = list(entries)
+        now = time.time()
+        conn = self._connection()
+        try:
+            stored = conn.execute("SELECT value FROM cache_meta WHERE key = 'dictionary_signature'").fetchone()
+            if stored is None or stored[0] != signature:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    conn.execute('DELETE FROM translations WHERE origin = ?', (ORIGIN_DICTIONARY,))
+                    conn.executemany(
+                        'INSERT INTO translations '
+                        '(source_lang, target_lang, text, translation, origin, expires_at, updated_at) '
+                        'VALUES (?, ?, ?, ?, ?, NULL, ?) '
+                        'ON CONFLICT (source_lang, target_lang, text) DO UPDATE SET '
+                        'translation = excluded.translation, origin = excluded.origin, '
+                        'expires_at = NULL, updated_at = excluded.updated_at '
+                        'WHERE translations.origin != ?',
+                        [entry + (ORIGIN_DICTIONARY, now, ORIGIN_CUSTOM) for entry in entries]
+                    )
+                    conn.execute(
+                        "INSERT OR REPLACE INTO cache_meta (key, value) VALUES ('dictionary_signature', ?)",
+                        (signature,)
+                    )
+                    conn.execute('COMMIT')
+                except Exception:
+                    conn.execute('ROLLBACK')
+                    raise
+                logger.info('Translation cache store prewarmed', extra={'entries': len(entries)})
+        except sqlite3.Error as e:
+            self._count('store_errors')
+            logger.error(f"Error prewarming translation cache: {e}")
+
+        for source_lang, target_lang, text, translation in entries[:self.max_entries]:
+            self._memory_put((source_lang, target_lang, text), translation, now + self.memory_ttl)
+        self._count('prewarmed', len(entries))
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['memory_entries'] = len(self._memory)
+        metrics['max_entries'] = self.max_entries
+        lookups = metrics['memory_hits'] + metrics['store_hits'] + metrics['misses']
+        metrics['hit_ratio'] = round((metrics['memory_hits'] + metrics['store_hits']) / lookups, 4) if lookups else None
+        try:
+            metrics['store_entries'] = self._connection().execute('SELECT COUNT(*) FROM translations').fetchone()[0]
+        except sqlite3.Error:
+            metrics['store_entries'] = None
+        return metrics
@@ -0,0 +1,102 @@
+# Long-lived event loop and HTTP session for translations
+#
+# Request handlers are synchronous, so translating used to mean asyncio.run()
+# (a new event loop) per field and a new aiohttp.ClientSession per term. The
+# client instead runs one event loop in a daemon thread with one pooled,
+# keep-alive session; handlers submit coroutines to it and wait for the result.
+# The loop is started lazily, so each gunicorn worker gets its own after fork.
+import asyncio
+import atexit
+import concurrent.futures
+import threading
+import aiohttp
+from app.config import Config
+from app.log import get_logger
+
+logger = get_logger('translation_client')
+
+
+class TranslationClient:
+    """Background event loop plus a shared aiohttp session"""
+
+    def __init__(self, connections=None, request_timeout=None):
+        self.connections = Config.TRANSLATION_HTTP_CONNECTIONS if connections is None else connections
+        self.request_timeout = Config.TRANSLATION_HTTP_TIMEOUT if request_timeout is None else request_timeout
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._lock = threading.Lock()
+        self._metrics = {'calls': 0, 'timeouts': 0, 'errors': 0}
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name='translation-loop', daemon=True)
+                thread.start()
+                self._loop = loop
+                self._thread = thread
+                logger.info('Translation client started', extra={'connections': self.connections})
+            return self._loop
+
+    def current_session(self):
+        """
+        The shared session when called from the client's loop, otherwise None
+        (aiohttp sessions must only be used on the loop that created them)
+        """
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        if running is not self._loop:
+            return None
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connections, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout)
+            )
+        return self._session
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the client loop and wait for its result"""
+        loop = self._ensure_started()
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        self._metrics['calls'] += 1
+        try:
+            return future.result(Config.TRANSLATION_TIMEOUT if timeout is None else timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            self._metrics['timeouts'] += 1
+            raise
+        except Exception:
+            self._metrics['errors'] += 1
+            raise
+
+    async def _close_session(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def close(self):
+        with self._lock:
+            loop = self._loop
+            if loop is None:
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self._close_session(), loop).result(5)
+            except Exception as e:
+                logger.warning(f"Error closing translation session: {e}")
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join(5)
+            self._loop = None
+            self._thread = None
+            self._session = None
+
+    def get_metrics(self):
+        metrics = dict(self._metrics)
+        metrics['running'] = self._loop is not None
+        metrics['session_open'] = self._session is not None and not self._session.closed
+        return metrics
+
+
+translation_client = TranslationClient()
+atexit.register(translation_client.close)
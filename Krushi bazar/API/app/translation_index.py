@@ -0,0 +1,171 @@
+# Hash index over the JSON translation dictionaries
+#
+# The five dictionaries (commodity, states, districts, markets, variety) are
+# compiled once into dicts keyed by English, Hindi and Gujarati text, so a
+# lookup is a dict access instead of a scan of every item of every file. The
+# compiled index is saved as a pickle next to the translation cache and reused
+# until one of the JSON files changes.
+#
+# Compile it ahead of a deploy (from the "Krushi bazar" directory):
+#   python -m API.app.translation_index
+import json
+import os
+import pickle
+import time
+from app.config import Config
+from app.log import get_logger
+
+logger = get_logger('translation_index')
+
+INDEX_FORMAT = 1
+LANGUAGE_FIELDS = {'en': 'english', 'hi': 'hindi', 'gu': 'gujarati'}
+
+
+def _empty_tables():
+    # 'hi' / 'gu': English -> Hindi / Gujarati
+    # 'en': Hindi or Gujarati -> English
+    # 'detect': Hindi or Gujarati text -> 'hi' / 'gu'
+    return {'hi': {}, 'gu': {}, 'en': {}, 'detect': {}}
+
+
+def _add_item(tables, item):
+    # setdefault keeps the first match, like the linear scan it replaces
+    english = item.get('english')
+    hindi = item.get('hindi')
+    gujarati = item.get('gujarati')
+    if english is not None:
+        tables['hi'].setdefault(english, hindi)
+        tables['gu'].setdefault(english, gujarati)
+    for text, lang in ((hindi, 'hi'), (gujarati, 'gu')):
+        if text is not None:
+            tables['en'].setdefault(text, english)
+            tables['detect'].setdefault(text, lang)
+
+
+def dictionary_signature(paths):
+    """Size and mtime of every dictionary file; the index is rebuilt when it changes"""
+    parts = []
+    for file_type, path in paths.items():
+        try:
+            stat = os.stat(path)
+            parts.append(f"{file_type}:{stat.st_size}:{int(stat.st_mtime)}")
+        except OSError:
+            parts.append(f"{file_type}:missing")
+    return ';'.join(parts)
+
+
+class TranslationIndex:
+    """
+    O(1) dictionary lookups. `paths` maps file type to JSON path, in lookup
+    precedence order.
+    """
+
+    def __init__(self, signature, files, combined):
+        self.signature = signature
+        self.files = files
+        self.combined = combined
+
+    @classmethod
+    def compile(cls, paths):
+        files = {}
+        combined = _empty_tables()
+        for file_type, path in paths.items():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except Exception as e:
+                logger.error(f"Error loading {file_type} JSON file: {e}")
+                continue
+            # The main array is under the first key (e.g. 'commodities')
+            tables = _empty_tables()
+            for item in data[list(data.keys())[0]]:
+                _add_item(tables, item)
+                _add_item(combined, item)
+            files[file_type] = tables
+        return cls(dictionary_signature(paths), files, combined)
+
+    @classmethod
+    def load(cls, paths, artefact_path=None):
+        """
+        Load the precompiled index, recompiling (and saving) it when it is
+        missing, unreadable or older than the JSON files
+        """
+        artefact_path = artefact_path or Config.TRANSLATION_INDEX_PATH
+        signature = dictionary_signature(paths)
+        started = time.perf_counter()
+        try:
+            with open(artefact_path, 'rb') as f:
+                payload = pickle.load(f)
+            if payload.get('format') == INDEX_FORMAT and payload.get('signature') == signature:
+                index = cls(signature, payload['files'], payload['combined'])
+                logger.info('Translation index loaded', extra={
+                    'terms': len(index.combined['en']) + len(index.combined['hi']),
+                    'load_ms': round((time.perf_counter() - started) * 1000, 3)
+                })
+                return index
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable translation index {artefact_path}: {e}")
+
+        index = cls.compile(paths)
+        try:
+            index.save(artefact_path)
+        except OSError as e:
+            logger.warning(f"Could not save translation index {artefact_path}: {e}")
+        logger.info('Translation index compiled', extra={
+            'terms': len(index.combined['en']) + len(index.combined['hi']),
+            'compile_ms': round((time.perf_counter() - started) * 1000, 3)
+        })
+        return index
+
+    def save(self, artefact_path):
+        os.makedirs(os.path.dirname(os.path.abspath(artefact_path)), exist_ok=True)
+        payload = {'format': INDEX_FORMAT, 'signature': self.signature, 'files': self.files, 'combined': self.combined}
+        # Write then rename so other workers never read a half-written file
+        tmp_path = f"{artefact_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, artefact_path)
+
+    def _tables(self, file_types):
+        if file_types is None:
+            return [self.combined]
+        return [self.files[file_type] for file_type in file_types if file_type in self.files]
+
+    def lookup(self, text, target_lang, file_types=None):
+        """Translation of text into target_lang ('en', 'hi' or 'gu'), or None"""
+        if target_lang not in LANGUAGE_FIELDS:
+            return None
+        for tables in self._tables(file_types):
+            table = tables[target_lang]
+            if text in table:
+                return table[text]
+        return None
+
+    def detect(self, text, file_types=None):
+        """'hi' or 'gu' when text is a dictionary term in that language"""
+        for tables in self._tables(file_types):
+            lang = tables['detect'].get(text)
+            if lang:
+                return lang
+        return None
+
+    def entries(self):
+        """(source_lang, target_lang, text, translation) for every non-empty term"""
+        for target_lang in ('hi', 'gu'):
+            for text, translation in self.combined[target_lang].items():
+                if text and translation:
+                    yield ('en', target_lang, text, translation)
+        for text, english in self.combined['en'].items():
+            if text and english:
+                yield (self.combined['detect'][text], 'en', text, english)
+
+
+if __name__ == '__main__':
+    from API.app.translation_service import HybridTranslationService
+    paths = HybridTranslationService.json_paths()
+    index = TranslationIndex.compile(paths)
+    index.save(Config.TRANSLATION_INDEX_PATH)
+    print(f"Wrote {Config.TRANSLATION_INDEX_PATH} ({len(index.combined['en'])} reverse terms, "
+          f"{len(index.combined['hi'])} English terms)")
@@ -2,9 +2,16 @@
 # Combines Google Translate with JSON file translations for accuracy
 import aiohttp
 import asyncio
+import concurrent.futures
+import threading
 import time
-import json
 import os
+from API.app.translation_cache import TranslationCache, ORIGIN_DICTIONARY, ORIGIN_CUSTOM
+from API.app.translation_index import TranslationIndex
+from API.app.translation_client import translation_client
+from app.log import get_logger
+
+logger = get_logger('translation')
 
 class HybridTranslationService:
     """Hybrid translation service combining Google Translate with JSON file data"""
@@ -18,80 +25,54 @@ class HybridTranslationService:
         'variety': 'variety.json'
     }
     
-    # Translation cache
-    translation_cache = {}
+    # Per-term translation cache (memory LRU + shared SQLite store), created on first use
+    _cache = None
+    _cache_lock = threading.Lock()
+    
+    # Hash index over the JSON files, loaded (or compiled) on first use
+    _index = None
+    _index_lock = threading.Lock()
     
-    # Loaded JSON data cache
-    _json_data_cache = {}
+    # Per-thread count of translations that fell back to the English text
+    _fallbacks = threading.local()
     
     @classmethod
-    def _load_json_file(cls, file_type):
-        """Load JSON file data with caching"""
-        if file_type in cls._json_data_cache:
-            return cls._json_data_cache[file_type]
-        
-        try:
-            # Get the directory where this file is located
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            # Go up one level to the API directory where JSON files are located
-            api_dir = os.path.dirname(current_dir)
-            json_file_path = os.path.join(api_dir, cls.JSON_FILES[file_type])
-            
-            with open(json_file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                cls._json_data_cache[file_type] = data
-                return data
-        except Exception as e:
-            print(f"Error loading {file_type} JSON file: {e}")
-            return None
+    def json_paths(cls):
+        """JSON file paths in lookup order; the files live in the API directory, one level above this file"""
+        api_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return {file_type: os.path.join(api_dir, name) for file_type, name in cls.JSON_FILES.items()}
+    
+    @classmethod
+    def get_index(cls):
+        """Return the process-wide dictionary index (precompiled artefact when up to date)"""
+        with cls._index_lock:
+            if cls._index is None:
+                cls._index = TranslationIndex.load(cls.json_paths())
+            return cls._index
+    
+    @classmethod
+    def get_cache(cls):
+        """Return the process-wide translation cache, prewarmed from the JSON files"""
+        with cls._cache_lock:
+            if cls._cache is None:
+                index = cls.get_index()
+                cache = TranslationCache()
+                cache.prewarm(index.entries(), index.signature)
+                cls._cache = cache
+            return cls._cache
     
     @classmethod
     def _get_translation_from_json(cls, text, target_lang, file_types=None):
-        """Get translation from JSON files"""
-        if file_types is None:
-            file_types = ['commodity', 'states', 'districts', 'markets', 'variety']
-        
-        # Map language codes to JSON field names
-        lang_map = {
-            'hi': 'hindi',
-            'gu': 'gujarati',
-            'en': 'english'
-        }
-        
-        target_field = lang_map.get(target_lang)
-        if not target_field:
-            return None
-        
-        # Search through specified JSON files
-        for file_type in file_types:
-            data = cls._load_json_file(file_type)
-            if not data:
-                continue
-            
-            # Get the main array from the JSON (e.g., 'commodities', 'states', etc.)
-            main_key = list(data.keys())[0]  # Get the first key (e.g., 'commodities')
-            items = data[main_key]
-            
-            # Search for the text in the appropriate field
-            for item in items:
-                if target_lang == 'en':
-                    # If target is English, search in hindi/gujarati fields
-                    if item.get('hindi') == text or item.get('gujarati') == text:
-                        return item.get('english')
-                else:
-                    # If target is Hindi/Gujarati, search in English field
-                    if item.get('english') == text:
-                        return item.get(target_field)
-        
-        return None
+        """Get translation from JSON files (hash lookup, first file in order wins)"""
+        return cls.get_index().lookup(text, target_lang, file_types)
     
     @classmethod
-    async def translate_text_async(cls, session, text, target_lang):
-        """Google Translate API call"""
+    async def _google_translate(cls, session, text, source_lang, target_lang):
+        """Google Translate API call; None on failure so errors are never cached"""
         url = "https://translate.googleapis.com/translate_a/single"
         params = {
             "client": "gtx",
-            "sl": "en",
+            "sl": source_lang,
             "tl": target_lang,
             "dt": "t",
             "q": text
@@ -102,8 +83,36 @@ class HybridTranslationService:
                 translated = "".join([item[0] for item in res[0]])
                 return translated
         except Exception as e:
-            print(f"Google Translate error for '{text}': {e}")
-            return text
+            logger.warning(f"Google Translate error for '{text}': {e}")
+            return None
+    
+    @classmethod
+    async def _cached_google_translate(cls, text, source_lang, target_lang, fallback=True):
+        """
+        Translate through the cache, falling back to Google and caching the
+        result. If Google fails, return text (or None when fallback is False).
+        """
+        cache = cls.get_cache()
+        cached = cache.get(source_lang, target_lang, text)
+        if cached is not None:
+            return cached
+        session = translation_client.current_session()
+        if session is not None:
+            translated = await cls._google_translate(session, text, source_lang, target_lang)
+        else:
+            # Called outside the shared client loop (e.g. asyncio.run)
+            async with aiohttp.ClientSession() as session:
+                translated = await cls._google_translate(session, text, source_lang, target_lang)
+        if translated is None:
+            return text if fallback else None
+        cache.set(source_lang, target_lang, text, translated)
+        return translated
+    
+    @classmethod
+    async def translate_text_async(cls, session, text, target_lang):
+        """Google Translate API call"""
+        translated = await cls._google_translate(session, text, "en", target_lang)
+        return text if translated is None else translated
     
     @classmethod
     def get_local_translation(cls, text, target_lang):
@@ -111,22 +120,27 @@ class HybridTranslationService:
         return cls._get_translation_from_json(text, target_lang)
     
     @classmethod
-    async def hybrid_translate(cls, text, target_lang):
+    async def hybrid_translate(cls, text, target_lang, fallback=True):
         """
-        Hybrid translation: First check JSON files, then Google Translate
+        Hybrid translation: First check JSON files, then Google Translate.
+        With fallback=False a failed translation returns None instead of text.
         """
         if target_lang not in ['hi', 'gu']:
             return text
         
-        # First check JSON file translations
+        # Cached terms (prewarmed with the JSON dictionaries) skip the file scan
+        cached = cls.get_cache().get('en', target_lang, text)
+        if cached is not None:
+            return cached
+        
+        # Then check JSON file translations
         json_translation = cls.get_local_translation(text, target_lang)
         if json_translation:
+            cls.get_cache().set('en', target_lang, text, json_translation, origin=ORIGIN_DICTIONARY)
             return json_translation
         
         # If not in JSON files, use Google Translate
-        async with aiohttp.ClientSession() as session:
-            google_translation = await cls.translate_text_async(session, text, target_lang)
-            return google_translation
+        return await cls._cached_google_translate(text, 'en', target_lang, fallback)
     
     @classmethod
     def get_reverse_local_translation(cls, text, source_lang):
@@ -144,29 +158,18 @@ class HybridTranslationService:
         if source_lang not in ['hi', 'gu']:
             return text
         
-        # First check JSON files for reverse lookup
+        cached = cls.get_cache().get(source_lang, 'en', text)
+        if cached is not None:
+            return cached
+        
+        # Then check JSON files for reverse lookup
         json_reverse = cls.get_reverse_local_translation(text, source_lang)
         if json_reverse:
+            cls.get_cache().set(source_lang, 'en', text, json_reverse, origin=ORIGIN_DICTIONARY)
             return json_reverse
         
         # If not in JSON files, use Google Translate (Hindi/Gujarati to English)
-        async with aiohttp.ClientSession() as session:
-            url = "https://translate.googleapis.com/translate_a/single"
-            params = {
-                "client": "gtx",
-                "sl": source_lang,  # Source language (hi or gu)
-                "tl": "en",         # Target language (English)
-                "dt": "t",
-                "q": text
-            }
-            try:
-                async with session.get(url, params=params) as response:
-                    res = await response.json()
-                    translated = "".join([item[0] for item in res[0]])
-                    return translated
-            except Exception as e:
-                print(f"Google Translate error for '{text}': {e}")
-                return text
+        return await cls._cached_google_translate(text, source_lang, 'en')
     
     @classmethod
     async def detect_language_and_translate_to_english(cls, text):
@@ -184,23 +187,7 @@ class HybridTranslationService:
             return await cls.reverse_translate_to_english(text, detected_lang)
         
         # If not found in JSON files, try Google Translate with auto-detection
-        async with aiohttp.ClientSession() as session:
-            url = "https://translate.googleapis.com/translate_a/single"
-            params = {
-                "client": "gtx",
-                "sl": "auto",  # Auto-detect source language
-                "tl": "en",    # Target language (English)
-                "dt": "t",
-                "q": text
-            }
-            try:
-                async with session.get(url, params=params) as response:
-                    res = await response.json()
-                    translated = "".join([item[0] for item in res[0]])
-                    return translated
-            except Exception as e:
-                print(f"Google Translate error for '{text}': {e}")
-                return text
+        return await cls._cached_google_translate(text, 'auto', 'en')
     
     @classmethod
     def is_english_text(cls, text):
@@ -212,57 +199,62 @@ class HybridTranslationService:
     @classmethod
     def detect_language_from_json(cls, text):
         """Detect language by checking JSON files"""
-        # Check if text exists in Hindi translations
-        for file_type in ['commodity', 'states', 'districts', 'markets', 'variety']:
-            data = cls._load_json_file(file_type)
-            if not data:
-                continue
-            
-            main_key = list(data.keys())[0]
-            items = data[main_key]
-            
-            for item in items:
-                if item.get('hindi') == text:
-                    return 'hi'
-                if item.get('gujarati') == text:
-                    return 'gu'
-        
-        return None
+        return cls.get_index().detect(text)
     
     @classmethod
-    async def batch_detect_and_translate_to_english(cls, items, name_field='name'):
+    async def localize_text(cls, text, language):
         """
-        Batch auto-detect language and translate to English for database queries
-        Works with Hindi, Gujarati, or English input
+        Translate text in any supported language into `language`: to English
+        via detection, then from English to Hindi/Gujarati when requested
         """
-        # Check cache first
-        cache_key = f"detect_translate_{','.join([str(item.get(name_field, '')) for item in items])}"
-        if cache_key in cls.translation_cache:
-            return cls.translation_cache[cache_key]
-        
-        # Extract unique texts for translation
-        unique_texts = list(set([item.get(name_field, '') for item in items if item.get(name_field, '')]))
-        
-        # Create async session and translate all unique texts
-        async with aiohttp.ClientSession() as session:
-            tasks = [cls.detect_language_and_translate_to_english(text) for text in unique_texts]
-            translated_texts = await asyncio.gather(*tasks)
+        if language not in ['en', 'hi', 'gu']:
+            return text
+        english = await cls.detect_language_and_translate_to_english(text)
+        if language == 'en':
+            return english
+        return await cls.hybrid_translate(english, language)
+    
+    @classmethod
+    async def _translate_unique(cls, texts, translate):
+        """Translate each text once; a failing term keeps its original value"""
+        async def safe(text):
+            try:
+                return await translate(text)
+            except Exception as e:
+                logger.warning(f"Translation error for '{text}': {e}")
+                return text
         
-        # Create translation dictionary
-        translation_dict = dict(zip(unique_texts, translated_texts))
+        unique_texts = list(texts)
+        translated_texts = await asyncio.gather(*[safe(text) for text in unique_texts])
+        return dict(zip(unique_texts, translated_texts))
+    
+    @classmethod
+    async def batch_translate_fields(cls, items, fields, translate):
+        """
+        Apply `translate` (a coroutine function of one text) to every listed
+        field of every item, translating each distinct value once
+        """
+        unique_texts = {item[field] for item in items for field in fields
+                        if isinstance(item.get(field), str) and item.get(field)}
+        translation_dict = await cls._translate_unique(unique_texts, translate)
         
-        # Apply translations to items
         translated_items = []
         for item in items:
             translated_item = item.copy()
-            if name_field in item:
-                translated_item[name_field] = translation_dict.get(item[name_field], item[name_field])
+            for field in fields:
+                if field in item and isinstance(item[field], str):
+                    translated_item[field] = translation_dict.get(item[field], item[field])
             translated_items.append(translated_item)
-        
-        # Cache the result
-        cls.translation_cache[cache_key] = translated_items
         return translated_items
     
+    @classmethod
+    async def batch_detect_and_translate_to_english(cls, items, name_field='name'):
+        """
+        Batch auto-detect language and translate to English for database queries
+        Works with Hindi, Gujarati, or English input
+        """
+        return await cls.batch_translate_fields(items, [name_field], cls.detect_language_and_translate_to_english)
+    
     @classmethod
     async def batch_hybrid_translate(cls, items, target_lang, name_field='name'):
         """
@@ -270,34 +262,9 @@ class HybridTranslationService:
         """
         if target_lang not in ['hi', 'gu']:
             return items
-        
-        # Check cache first
-        cache_key = f"hybrid_{target_lang}_{','.join([str(item.get(name_field, '')) for item in items])}"
-        if cache_key in cls.translation_cache:
-            return cls.translation_cache[cache_key]
-        
-        # Extract unique texts for translation
-        unique_texts = list(set([item.get(name_field, '') for item in items if item.get(name_field, '')]))
-        
-        # Create async session and translate all unique texts
-        async with aiohttp.ClientSession() as session:
-            tasks = [cls.hybrid_translate(text, target_lang) for text in unique_texts]
-            translated_texts = await asyncio.gather(*tasks)
-        
-        # Create translation dictionary
-        translation_dict = dict(zip(unique_texts, translated_texts))
-        
-        # Apply translations to items
-        translated_items = []
-        for item in items:
-            translated_item = item.copy()
-            if name_field in item:
-                translated_item[name_field] = translation_dict.get(item[name_field], item[name_field])
-            translated_items.append(translated_item)
-        
-        # Cache the result
-        cls.translation_cache[cache_key] = translated_items
-        return translated_items
+        return await cls.batch_translate_fields(
+            items, [name_field], lambda text: cls.hybrid_translate(text, target_lang)
+        )
     
     @classmethod
     async def batch_reverse_translate_to_english(cls, items, source_lang, name_field='name'):
@@ -306,34 +273,122 @@ class HybridTranslationService:
         """
         if source_lang not in ['hi', 'gu']:
             return items
+        return await cls.batch_translate_fields(
+            items, [name_field], lambda text: cls.reverse_translate_to_english(text, source_lang)
+        )
+    
+    # Synchronous facade for request handlers. Everything runs on the shared
+    # translation client loop, one call per response rather than one per field.
+    
+    @classmethod
+    def run(cls, coro):
+        """Run a translation coroutine on the shared client loop"""
+        return translation_client.run(coro)
+    
+    @classmethod
+    def _note_fallback(cls):
+        cls._fallbacks.count = cls.fallback_count() + 1
+    
+    @classmethod
+    def fallback_count(cls):
+        """
+        Translation calls on this thread that returned untranslated text
+        (timeouts and failed Google lookups); callers compare it before and
+        after rendering to tell whether a response is fully translated
+        """
+        return getattr(cls._fallbacks, 'count', 0)
+    
+    @classmethod
+    def _run_or_original(cls, coro, items):
+        try:
+            return translation_client.run(coro)
+        except concurrent.futures.TimeoutError:
+            logger.warning('Translation timed out, returning untranslated data', extra={'items': len(items)})
+            cls._note_fallback()
+            return items
+    
+    @classmethod
+    def translate_fields(cls, items, target_lang, fields):
+        """English -> Hindi/Gujarati for the given fields of every item"""
+        if target_lang not in ['hi', 'gu'] or not items:
+            return items
+        failed = []
         
-        # Check cache first
-        cache_key = f"reverse_{source_lang}_{','.join([str(item.get(name_field, '')) for item in items])}"
-        if cache_key in cls.translation_cache:
-            return cls.translation_cache[cache_key]
-        
-        # Extract unique texts for translation
-        unique_texts = list(set([item.get(name_field, '') for item in items if item.get(name_field, '')]))
-        
-        # Create async session and translate all unique texts
-        async with aiohttp.ClientSession() as session:
-            tasks = [cls.reverse_translate_to_english(text, source_lang) for text in unique_texts]
-            translated_texts = await asyncio.gather(*tasks)
-        
-        # Create translation dictionary
-        translation_dict = dict(zip(unique_texts, translated_texts))
+        async def translate(text):
+            translated = await cls.hybrid_translate(text, target_lang, fallback=False)
+            if translated is None:
+                failed.append(text)
+                return text
+            return translated
         
-        # Apply translations to items
-        translated_items = []
+        translated_items = cls._run_or_original(cls.batch_translate_fields(items, fields, translate), items)
+        if failed:
+            cls._note_fallback()
+        return translated_items
+    
+    @classmethod
+    def fields_to_english(cls, items, fields):
+        """Any supported language -> English for the given fields of every item"""
+        if not items:
+            return items
+        return cls._run_or_original(
+            cls.batch_translate_fields(items, fields, cls.detect_language_and_translate_to_english),
+            items
+        )
+    
+    @classmethod
+    def translate_terms(cls, texts, target_lang):
+        """
+        English -> Hindi/Gujarati for a set of terms; returns {text: translation}
+        without the terms that could not be translated
+        """
+        async def translate_all():
+            return await cls._translate_unique(
+                set(texts), lambda text: cls.hybrid_translate(text, target_lang, fallback=False)
+            )
+        if target_lang not in ['hi', 'gu'] or not texts:
+            return {}
+        translations = translation_client.run(translate_all())
+        return {text: translation for text, translation in translations.items() if translation}
+    
+    @classmethod
+    def localize_rows(cls, items, language, fields):
+        """
+        Pick precomputed names for the given fields: rows carry `<field>_hi`
+        and `<field>_gu` (e.g. from name_hi/name_gu columns). Values without a
+        precomputed name are translated in one batched call. The `_hi`/`_gu`
+        keys are removed from the returned rows.
+        """
+        rows = []
+        pending = []
         for item in items:
-            translated_item = item.copy()
-            if name_field in item:
-                translated_item[name_field] = translation_dict.get(item[name_field], item[name_field])
-            translated_items.append(translated_item)
+            row = dict(item)
+            for field in fields:
+                localized = {lang: row.pop(f'{field}_{lang}', None) for lang in ('hi', 'gu')}
+                if language not in ['hi', 'gu'] or not isinstance(row.get(field), str):
+                    continue
+                if localized[language]:
+                    row[field] = localized[language]
+                elif row[field]:
+                    pending.append((row, field))
+            rows.append(row)
         
-        # Cache the result
-        cls.translation_cache[cache_key] = translated_items
-        return translated_items
+        if pending:
+            texts = [{'text': row[field]} for row, field in pending]
+            translated = cls.translate_fields(texts, language, ['text'])
+            for (row, field), text in zip(pending, translated):
+                row[field] = text['text']
+        return rows
+    
+    @classmethod
+    def localize_fields(cls, items, language, fields):
+        """Any supported language -> `language` for the given fields of every item"""
+        if language not in ['en', 'hi', 'gu'] or not items:
+            return items
+        return cls._run_or_original(
+            cls.batch_translate_fields(items, fields, lambda text: cls.localize_text(text, language)),
+            items
+        )
     
     @classmethod
     def get_supported_languages(cls):
@@ -356,7 +411,7 @@ class HybridTranslationService:
         Add custom translation to cache
         Useful for adding new terms discovered during usage
         """
-        cache_key = f"custom_{target_lang}_{text}"
-        cls.translation_cache[cache_key] = translation
-        print(f"Added custom translation: {text} -> {translation} ({target_lang})")
+        source_lang = 'auto' if target_lang == 'en' else 'en'
+        cls.get_cache().set(source_lang, target_lang, text, translation, origin=ORIGIN_CUSTOM)
+        logger.info(f"Added custom translation: {text} -> {translation} ({target_lang})")
         return True
@@ -1,23 +1,17 @@
-import os
-from dotenv import load_dotenv
-import pymysql
-
-# Load environment variables from .env file
-load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
-
-DB_HOST = os.getenv('DB_HOST')
-DB_PORT = int(os.getenv('DB_PORT', 3306))
-DB_NAME = os.getenv('DB_NAME')
-DB_USER = os.getenv('DB_USER')
-DB_PASSWORD = os.getenv('DB_PASSWORD')
+from flask import g
+from app.data.pool import get_pool
 
 def get_db():
-    return pymysql.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        database=DB_NAME,
-        charset='utf8mb4',
-        cursorclass=pymysql.cursors.DictCursor
-    )
\ No newline at end of file
+    """Borrow a pooled connection for the current request, returned by close_db on teardown"""
+    if 'db' not in g:
+        pool = get_pool()
+        g.db = pool.borrow(exclusive=True)
+        # Helpers that borrow during this request reuse it instead of taking a second connection
+        pool.attach_request(g.db)
+    return g.db
+
+def close_db(exception=None):
+    db = g.pop('db', None)
+    if db is not None:
+        get_pool().detach_request()
+        db.close()
@@ -1,11 +1,14 @@
 # Flask app initialization
 from flask import Flask, render_template
 from .config import Config
+from .log import get_logger
+from .data.migrations import run_migrations
 from .scraping.api import scraping_bp
 from .data.api import data_bp
 from .yard.api import yard_bp
 from .automated_api import automated_bp
 from .scheduler_api import scheduler_bp
+from .jobs.api import jobs_bp
 
 from API.app.addtofavorite import addtofavorite_bp
 from API.app.alerts import alerts_bp
@@ -19,11 +22,28 @@ from API.app.login import login_bp
 from API.app.marketlist import marketlist_bp
 from API.app.send_alert_notification import send_alert_notification_bp
 from API.app.statelist import statelist_bp
+from API.db_connect import close_db
+
+
+logger = get_logger('app')
 
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    logger.info(f"Loaded config: DB_HOST={Config.DB_HOST}, DB_NAME={Config.DB_NAME}, DB_USER={Config.DB_USER}")
+
+    # Bring the schema up to date once per process, before any traffic
+    if Config.AUTO_MIGRATE:
+        try:
+            run_migrations()
+        except Exception as e:
+            logger.error(f"Database migrations failed: {e}")
+
+    @app.cli.command('migrate')
+    def migrate_command():
+        """Apply pending database schema migrations"""
+        run_migrations(force=True)
 
     # Register blueprints
     app.register_blueprint(scraping_bp)
@@ -31,6 +51,7 @@ def create_app():
     app.register_blueprint(yard_bp)
     app.register_blueprint(automated_bp)
     app.register_blueprint(scheduler_bp)
+    app.register_blueprint(jobs_bp)
     app.register_blueprint(addtofavorite_bp)
     app.register_blueprint(alerts_bp)
     app.register_blueprint(banner_bp)
@@ -44,6 +65,16 @@ def create_app():
     app.register_blueprint(send_alert_notification_bp)
     app.register_blueprint(statelist_bp)
 
+    # Return pooled connections borrowed by /API/* handlers
+    app.teardown_appcontext(close_db)
+
+    # Start the background job workers (scrape jobs queued by the API and scheduler)
+    try:
+        from .jobs.queue import job_queue
+        job_queue.start()
+    except Exception as e:
+        logger.error(f"Failed to start job queue: {e}")
+
     # Auto-start scheduler when app starts
     with app.app_context():
         try:
@@ -51,13 +82,13 @@ def create_app():
             # Start scheduler automatically
             success = scheduler.start_scheduler()
             if success:
-                print("[INFO]  Scheduler auto-started successfully")
-                print(f"[INFO]  Will run daily at {scheduler.get_scheduler_status()['schedule_time']}")
-                print(f"[INFO]   Scheduled states: {scheduler.get_scheduler_status()['scheduled_states']}")
+                logger.info("Scheduler auto-started successfully")
+                logger.info(f"Will run daily at {scheduler.get_scheduler_status()['schedule_time']}")
+                logger.info(f"Scheduled states: {scheduler.get_scheduler_status()['scheduled_states']}")
             else:
-                print("[WARNING]   Scheduler auto-start failed (may be disabled in config)")
+                logger.warning("Scheduler auto-start failed (may be disabled in config)")
         except Exception as e:
-            print(f"[ERROR]  Failed to auto-start scheduler: {e}")
+            logger.error(f"Failed to auto-start scheduler: {e}")
 
     # Home, about, contact, and API docs routes
     @app.route('/')
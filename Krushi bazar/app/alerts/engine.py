@@ -0,0 +1,219 @@
+# Set-based price alert evaluation
+#
+# Alerts are read in chunks of ALERT_EVAL_CHUNK, each joined in one query with
+# the latest price of its market/commodity (latest_prices), the user's push
+# token (login) and the price it last notified about (alert_notifications).
+# An alert fires when its condition holds for a price it has not already
+# notified about, so a repeat run does not repeat notifications. Firing alerts
+# are grouped into one notification per user and sent in batches by the
+# notifier; only alerts whose notification was delivered are marked notified.
+from app.alerts.notifier import get_notifier
+from app.config import Config
+from app.data.pool import get_pool
+from app.log import get_logger, RunCounters
+
+logger = get_logger('alerts.engine')
+
+# Alert columns, the newest price of the market/commodity (across varieties,
+# like the per-alert query this replaces), the token and the last notification
+EVALUATION_SQL = '''
+    WITH chunk AS (
+        SELECT id, userid, marketid, commodity, conditions, amount
+        FROM alerts
+        WHERE id > %s {alert_filter}
+        ORDER BY id
+        LIMIT %s
+    ),
+    latest AS (
+        SELECT lp.market_id, lp.commodity, lp.modal_price, lp.price_id,
+               ROW_NUMBER() OVER (PARTITION BY lp.market_id, lp.commodity
+                                  ORDER BY lp.price_day DESC, lp.last_updated DESC) AS rn
+        FROM latest_prices lp
+        WHERE lp.market_id IN (SELECT marketid FROM chunk)
+    )
+    SELECT c.id, c.userid, c.marketid, c.commodity, c.conditions, c.amount,
+           l.modal_price, l.price_id, lg.token,
+           n.price_id AS notified_price_id, n.modal_price AS notified_modal_price
+    FROM chunk c
+    LEFT JOIN latest l ON l.market_id = c.marketid AND l.commodity = c.commodity AND l.rn = 1
+    LEFT JOIN login lg ON lg.id = c.userid
+    LEFT JOIN alert_notifications n ON n.alert_id = c.id
+    ORDER BY c.id
+'''
+
+MARK_NOTIFIED_SQL = '''
+    INSERT INTO alert_notifications (alert_id, price_id, modal_price, notified_at)
+    VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+    ON DUPLICATE KEY UPDATE
+        price_id = VALUES(price_id),
+        modal_price = VALUES(modal_price),
+        notified_at = CURRENT_TIMESTAMP
+'''
+
+# State rows of deleted alerts
+PRUNE_SQL = '''
+    DELETE n FROM alert_notifications n
+    LEFT JOIN alerts a ON a.id = n.alert_id
+    WHERE a.id IS NULL
+'''
+
+
+def alert_price(modal_price):
+    # Alerts are set in the app's unit: modal price / 5, truncated (matching PHP)
+    return int(modal_price / 5)
+
+
+def condition_met(condition, price, amount):
+    try:
+        amount = float(amount)
+    except (TypeError, ValueError):
+        return False
+    if condition == 'greater':
+        return price > amount
+    if condition == 'less':
+        return price < amount
+    return False
+
+
+def evaluate(row, counters):
+    """The firing alert for an evaluation row, or None"""
+    if row['modal_price'] is None:
+        counters.incr('no_price')
+        return None
+    price = alert_price(row['modal_price'])
+    if not condition_met(row['conditions'], price, row['amount']):
+        counters.incr('condition_not_met')
+        return None
+    if row['notified_price_id'] == row['price_id'] and row['notified_modal_price'] == row['modal_price']:
+        counters.incr('already_notified')
+        return None
+    if not row['token']:
+        counters.incr('no_token')
+        return None
+    return {
+        'alert_id': row['id'],
+        'userid': row['userid'],
+        'token': row['token'],
+        'marketid': row['marketid'],
+        'commodity': row['commodity'],
+        'condition': row['conditions'],
+        'amount': row['amount'],
+        'price': price,
+        'price_id': row['price_id'],
+        'modal_price': row['modal_price']
+    }
+
+
+def _alert_line(alert):
+    return (f"Price of {alert['commodity']} in market {alert['marketid']} is Rs.{alert['price']} "
+            f"(your alert: {alert['condition']} {alert['amount']})")
+
+
+def build_notifications(fired):
+    """One notification per user and token, listing every alert that fired for them"""
+    grouped = {}
+    for alert in fired:
+        grouped.setdefault((alert['userid'], alert['token']), []).append(alert)
+    notifications = []
+    for (userid, token), alerts in grouped.items():
+        notifications.append({
+            'token': token,
+            'title': 'Price Alert' if len(alerts) == 1 else f'{len(alerts)} Price Alerts',
+            'body': '\n'.join(_alert_line(alert) for alert in alerts),
+            'data': {'alert_ids': ','.join(str(alert['alert_id']) for alert in alerts)},
+            'alerts': alerts
+        })
+    return notifications
+
+
+def _fired_alerts(cursor, counters, alert_ids=None):
+    """Evaluate alerts chunk by chunk (all alerts, or only alert_ids)"""
+    chunk_size = Config.ALERT_EVAL_CHUNK
+    alert_filter = ''
+    filter_params = []
+    if alert_ids is not None:
+        alert_ids = sorted(set(alert_ids))
+        if not alert_ids:
+            return []
+    fired = []
+    last_id = 0
+    while True:
+        if alert_ids is not None:
+            # Only the ids above last_id are left; pass one chunk of them at a time
+            remaining = [alert_id for alert_id in alert_ids if alert_id > last_id][:chunk_size]
+            if not remaining:
+                break
+            alert_filter = f"AND id IN ({', '.join(['%s'] * len(remaining))})"
+            filter_params = remaining
+        cursor.execute(EVALUATION_SQL.format(alert_filter=alert_filter), [last_id] + filter_params + [chunk_size])
+        rows = cursor.fetchall()
+        counters.incr('alerts', len(rows))
+        for row in rows:
+            alert = evaluate(row, counters)
+            if alert:
+                fired.append(alert)
+        if alert_ids is not None:
+            # Ids of deleted alerts return no row, so move past the whole chunk
+            last_id = remaining[-1]
+        elif len(rows) < chunk_size:
+            break
+        else:
+            last_id = rows[-1]['id']
+    return fired
+
+
+def _mark_notified(delivered, prune):
+    if not delivered and not prune:
+        return 0
+    conn = get_pool().borrow()
+    try:
+        cursor = conn.cursor()
+        for start in range(0, len(delivered), Config.ALERT_EVAL_CHUNK):
+            cursor.executemany(MARK_NOTIFIED_SQL, [
+                (alert['alert_id'], alert['price_id'], alert['modal_price'])
+                for alert in delivered[start:start + Config.ALERT_EVAL_CHUNK]
+            ])
+        pruned = 0
+        if prune:
+            cursor.execute(PRUNE_SQL)
+            pruned = cursor.rowcount
+        conn.commit()
+        return pruned
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def run_alerts(alert_ids=None, notifier=None):
+    """
+    Evaluate alerts (every alert, or only alert_ids), send one notification per
+    user for those that fired and record what was notified. Returns the counters.
+    """
+    notifier = notifier or get_notifier()
+    counters = RunCounters('alert_evaluation', scope='all' if alert_ids is None else 'selected')
+    conn = get_pool().borrow()
+    try:
+        fired = _fired_alerts(conn.cursor(), counters, alert_ids)
+    finally:
+        conn.close()
+    counters.incr('fired', len(fired))
+
+    # No connection is held while sending
+    notifications = build_notifications(fired)
+    results = notifier.send([{key: n[key] for key in ('token', 'title', 'body', 'data')} for n in notifications])
+    delivered = []
+    for notification, result in zip(notifications, results):
+        if result['ok']:
+            counters.incr('notifications_sent')
+            delivered.extend(notification['alerts'])
+        else:
+            counters.incr('notifications_failed')
+            if result['invalid_token']:
+                counters.incr('invalid_tokens')
+    counters.incr('alerts_notified', len(delivered))
+
+    # Failed sends are not marked, so the next run tries them again
+    counters.incr('states_pruned', _mark_notified(delivered, prune=alert_ids is None))
+    return counters.log_summary(logger)
@@ -0,0 +1,193 @@
+# Batched push notification senders for price alerts
+#
+# A notification is a dict with token, title, body and optional data. send()
+# splits them into batches of ALERT_BATCH_SIZE (FCM's send_each limit is 500),
+# sends up to ALERT_SEND_WORKERS batches concurrently and retries transient
+# failures with exponential backoff. Results come back in input order.
+#
+# FCMNotifier sends through firebase_admin; StubNotifier records notifications
+# in memory and can be told to fail, for local runs and tests
+# (ALERT_NOTIFIER=stub).
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.config import Config
+from app.log import get_logger
+
+try:
+    import firebase_admin
+    from firebase_admin import credentials, exceptions as firebase_exceptions, messaging
+    FIREBASE_AVAILABLE = True
+except ImportError:
+    FIREBASE_AVAILABLE = False
+
+logger = get_logger('alerts.notifier')
+
+
+def _result(ok, error=None, retryable=False, invalid_token=False):
+    return {'ok': ok, 'error': error, 'retryable': retryable, 'invalid_token': invalid_token}
+
+
+class Notifier:
+    """Batching, concurrency and retries; subclasses implement _send_batch"""
+
+    def __init__(self, batch_size=None, workers=None, retries=None, backoff=None):
+        self.batch_size = batch_size or Config.ALERT_BATCH_SIZE
+        self.workers = workers or Config.ALERT_SEND_WORKERS
+        self.retries = Config.ALERT_SEND_RETRIES if retries is None else retries
+        self.backoff = Config.ALERT_SEND_BACKOFF if backoff is None else backoff
+        self._lock = threading.Lock()
+        self._metrics = {'batches': 0, 'sent': 0, 'failed': 0, 'retries': 0, 'invalid_tokens': 0}
+
+    def _send_batch(self, batch):
+        """Send one batch; returns one _result() per notification"""
+        raise NotImplementedError
+
+    def _send_with_retries(self, batch):
+        results = [None] * len(batch)
+        pending = list(range(len(batch)))
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+                with self._lock:
+                    self._metrics['retries'] += len(pending)
+            try:
+                batch_results = self._send_batch([batch[i] for i in pending])
+            except Exception as e:
+                # The whole request failed (network, auth); retry all of it
+                logger.warning(f"Notification batch failed: {e}", extra={'size': len(pending), 'attempt': attempt + 1})
+                batch_results = [_result(False, str(e), retryable=True)] * len(pending)
+            with self._lock:
+                self._metrics['batches'] += 1
+            retry = []
+            for index, result in zip(pending, batch_results):
+                results[index] = result
+                if not result['ok'] and result['retryable']:
+                    retry.append(index)
+            pending = retry
+            if not pending:
+                break
+
+        with self._lock:
+            for result in results:
+                self._metrics['sent' if result['ok'] else 'failed'] += 1
+                if result['invalid_token']:
+                    self._metrics['invalid_tokens'] += 1
+        return results
+
+    def send(self, notifications):
+        """Send every notification; returns their results in the same order"""
+        if not notifications:
+            return []
+        batches = [notifications[i:i + self.batch_size] for i in range(0, len(notifications), self.batch_size)]
+        if len(batches) == 1:
+            return self._send_with_retries(batches[0])
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(batches)), thread_name_prefix='alert-send') as pool:
+            return [result for batch_results in pool.map(self._send_with_retries, batches) for result in batch_results]
+
+    def get_metrics(self):
+        with self._lock:
+            return dict(self._metrics)
+
+
+def initialize_firebase():
+    """Initialize the Firebase Admin SDK from FIREBASE_CREDENTIALS once per process"""
+    if not FIREBASE_AVAILABLE:
+        logger.error('firebase_admin is not installed; push notifications are disabled')
+        return False
+    try:
+        if firebase_admin._apps:
+            return True
+        if not os.path.exists(Config.FIREBASE_CREDENTIALS):
+            logger.error(f"Firebase config file not found at: {Config.FIREBASE_CREDENTIALS}")
+            return False
+        cred = credentials.Certificate(Config.FIREBASE_CREDENTIALS)
+        firebase_admin.initialize_app(cred)
+        logger.info('Firebase Admin SDK initialized', extra={
+            'project': cred.project_id, 'service_account': cred.service_account_email
+        })
+        return True
+    except Exception as e:
+        logger.error(f"Error initializing Firebase: {e}")
+        return False
+
+
+def fcm_message(notification):
+    """messaging.Message for a notification dict"""
+    return messaging.Message(
+        notification=messaging.Notification(title=notification['title'], body=notification['body']),
+        data={
+            'title': notification['title'],
+            'body': notification['body'],
+            'timestamp': str(int(time.time())),
+            'source': 'khedut-bazaar',
+            'click_action': 'FLUTTER_NOTIFICATION_CLICK',
+            **notification.get('data', {})
+        },
+        token=notification['token']
+    )
+
+
+class FCMNotifier(Notifier):
+    """Sends through firebase_admin's messaging.send_each"""
+
+    if FIREBASE_AVAILABLE:
+        RETRYABLE = (messaging.QuotaExceededError, firebase_exceptions.UnavailableError, firebase_exceptions.InternalError)
+        INVALID_TOKEN = (messaging.UnregisteredError, messaging.SenderIdMismatchError)
+
+    def _send_batch(self, batch):
+        if not initialize_firebase():
+            return [_result(False, 'Firebase is not configured')] * len(batch)
+        response = messaging.send_each([fcm_message(notification) for notification in batch])
+        results = []
+        for send_response in response.responses:
+            if send_response.success:
+                results.append(_result(True))
+                continue
+            error = send_response.exception
+            results.append(_result(
+                False, str(error),
+                retryable=isinstance(error, self.RETRYABLE),
+                invalid_token=isinstance(error, self.INVALID_TOKEN)
+            ))
+        return results
+
+
+class StubNotifier(Notifier):
+    """
+    Records notifications instead of sending them. `failures` maps a token to
+    'invalid', 'error' or a number of transient failures before it succeeds.
+    """
+
+    def __init__(self, failures=None, **kwargs):
+        kwargs.setdefault('backoff', 0)
+        super().__init__(**kwargs)
+        self.failures = dict(failures or {})
+        self.sent = []
+        self.batch_sizes = []
+
+    def _send_batch(self, batch):
+        results = []
+        with self._lock:
+            self.batch_sizes.append(len(batch))
+            for notification in batch:
+                failure = self.failures.get(notification['token'])
+                if failure == 'invalid':
+                    results.append(_result(False, 'Token is not registered', invalid_token=True))
+                elif failure == 'error':
+                    results.append(_result(False, 'Rejected by stub'))
+                elif failure:
+                    self.failures[notification['token']] = failure - 1
+                    results.append(_result(False, 'Unavailable (stub)', retryable=True))
+                else:
+                    self.sent.append(notification)
+                    results.append(_result(True))
+        return results
+
+
+def get_notifier():
+    """Notifier selected by ALERT_NOTIFIER ('fcm' or 'stub')"""
+    if Config.ALERT_NOTIFIER == 'stub':
+        return StubNotifier()
+    return FCMNotifier()
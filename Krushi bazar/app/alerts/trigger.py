@@ -0,0 +1,109 @@
+# Event-driven alert evaluation after price writes
+#
+# upsert_commodity_prices reports every (market_id, commodity) whose latest
+# modal price it changed. The trigger collects those keys for
+# ALERT_TRIGGER_DELAY seconds (so a district page or a run of market pages
+# becomes one evaluation), looks up the alerts on them through the
+# (marketid, commodity) index on alerts, and evaluates only those alerts.
+# Work therefore follows the number of changed prices, not the number of
+# alerts. Keys still pending when a process exits are picked up by the next
+# full evaluation (/API/send_alert_notification), which skips anything
+# already notified.
+import os
+import threading
+import time
+from app.alerts.engine import run_alerts
+from app.config import Config
+from app.data.pool import get_pool
+from app.log import get_logger
+
+logger = get_logger('alerts.trigger')
+
+# (marketid, commodity) pairs per alert lookup query
+KEY_CHUNK = 500
+
+
+class AlertTrigger:
+    """Background thread that evaluates the alerts on changed prices"""
+
+    def __init__(self, delay=None, enabled=None):
+        self.delay = Config.ALERT_TRIGGER_DELAY if delay is None else delay
+        self.enabled = Config.ALERT_TRIGGER_ENABLED if enabled is None else enabled
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = set()
+        self._thread = None
+        self._pid = None
+        self._metrics = {'events': 0, 'keys': 0, 'runs': 0, 'alerts_evaluated': 0, 'errors': 0}
+
+    def _ensure_started(self):
+        # Called with the lock held; a forked worker starts its own thread
+        if self._thread is None or self._pid != os.getpid():
+            self._thread = threading.Thread(target=self._run, name='alert-trigger', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def prices_changed(self, keys):
+        """Queue (market_id, commodity) pairs whose latest modal price changed"""
+        if not self.enabled or not keys:
+            return
+        with self._lock:
+            self._pending.update(keys)
+            self._metrics['events'] += 1
+            self._ensure_started()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            # Let the rest of the scrape's writes arrive before evaluating
+            time.sleep(self.delay)
+            self._wakeup.clear()
+            with self._lock:
+                keys, self._pending = self._pending, set()
+            if keys:
+                try:
+                    self.evaluate(keys)
+                except Exception as e:
+                    with self._lock:
+                        self._metrics['errors'] += 1
+                    logger.exception(f"Error evaluating alerts for {len(keys)} changed prices: {e}")
+
+    def alert_ids(self, keys):
+        """Ids of the alerts on any of the (market_id, commodity) keys"""
+        keys = sorted(keys)
+        ids = []
+        conn = get_pool().borrow()
+        try:
+            cursor = conn.cursor()
+            for start in range(0, len(keys), KEY_CHUNK):
+                chunk = keys[start:start + KEY_CHUNK]
+                cursor.execute(
+                    f"SELECT id FROM alerts WHERE (marketid, commodity) IN ({', '.join(['(%s, %s)'] * len(chunk))})",
+                    [value for key in chunk for value in key]
+                )
+                ids.extend(row['id'] for row in cursor.fetchall())
+        finally:
+            conn.close()
+        return ids
+
+    def evaluate(self, keys):
+        alert_ids = self.alert_ids(keys)
+        with self._lock:
+            self._metrics['keys'] += len(keys)
+            self._metrics['alerts_evaluated'] += len(alert_ids)
+        if not alert_ids:
+            return None
+        with self._lock:
+            self._metrics['runs'] += 1
+        return run_alerts(alert_ids)
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['pending'] = len(self._pending)
+            metrics['enabled'] = self.enabled
+        return metrics
+
+
+alert_trigger = AlertTrigger()
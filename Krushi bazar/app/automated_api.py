@@ -2,6 +2,7 @@
 from flask import Blueprint, jsonify, request
 from datetime import datetime
 from app.automated_scraper import AutomatedScraper
+from app.jobs.api import job_accepted
 
 automated_bp = Blueprint('automated', __name__, url_prefix='/automated')
 
@@ -9,10 +10,12 @@ automated_bp = Blueprint('automated', __name__, url_prefix='/automated')
 def scrape_district_automated(district_id):
     """
     Automatically scrape all markets for a specific district
+    Pass ?force=true to re-download pages even if they have not changed
     """
     try:
+        force = request.args.get('force', 'false').lower() == 'true'
         scraper = AutomatedScraper()
-        result = scraper.scrape_district_by_id(district_id)
+        result = scraper.scrape_district_by_id(district_id, force=force)
         
         return jsonify(result), 200 if result['status'] in ['success', 'partial_success'] else 400
         
@@ -26,13 +29,14 @@ def scrape_district_automated(district_id):
 @automated_bp.route('/scrape/state/<int:state_id>', methods=['GET'])
 def scrape_state_automated(state_id):
     """
-    Automatically scrape all districts and markets for a specific state
+    Queue a background scrape of all districts and markets for a specific state
+    Returns a job ID immediately; poll /jobs/<job_id> for progress
+    Pass ?force=true to re-download pages even if they have not changed
     """
     try:
-        scraper = AutomatedScraper()
-        result = scraper.scrape_state_by_id(state_id)
-        
-        return jsonify(result), 200 if result['status'] in ['success', 'partial_success'] else 400
+        force = request.args.get('force', 'false').lower() == 'true'
+        job, created = AutomatedScraper().enqueue_state(state_id, force=force)
+        return job_accepted(job, created, f'Scraping of state {state_id} queued')
         
     except Exception as e:
         return jsonify({
@@ -62,7 +66,8 @@ def get_automated_status():
 @automated_bp.route('/scrape/bulk', methods=['POST'])
 def bulk_scrape():
     """
-    Bulk scraping with multiple district IDs
+    Queue a background scrape of multiple district IDs
+    Returns a job ID immediately; poll /jobs/<job_id> for progress
     """
     try:
         data = request.get_json()
@@ -81,40 +86,9 @@ def bulk_scrape():
                 'timestamp': datetime.now().isoformat()
             }), 400
         
-        scraper = AutomatedScraper()
-        results = []
-        
-        for district_id in district_ids:
-            try:
-                result = scraper.scrape_district_by_id(district_id)
-                results.append(result)
-            except Exception as e:
-                results.append({
-                    'status': 'error',
-                    'message': f'Error scraping district {district_id}: {str(e)}',
-                    'district_id': district_id,
-                    'timestamp': datetime.now().isoformat()
-                })
-        
-        # Calculate overall status
-        successful = sum(1 for r in results if r['status'] == 'success')
-        partial = sum(1 for r in results if r['status'] == 'partial_success')
-        failed = sum(1 for r in results if r['status'] == 'error')
-        
-        overall_status = 'success' if failed == 0 else 'partial_success' if successful > 0 else 'error'
-        
-        return jsonify({
-            'status': overall_status,
-            'message': f'Bulk scraping completed: {successful} successful, {partial} partial, {failed} failed',
-            'results': results,
-            'summary': {
-                'total': len(district_ids),
-                'successful': successful,
-                'partial_success': partial,
-                'failed': failed
-            },
-            'timestamp': datetime.now().isoformat()
-        }), 200
+        force = bool(data.get('force', False))
+        job, created = AutomatedScraper().enqueue_bulk(district_ids, force=force)
+        return job_accepted(job, created, f'Scraping of {len(district_ids)} districts queued')
         
     except Exception as e:
         return jsonify({
@@ -1,97 +1,132 @@
 # Automated Scraping Functionality
+import hashlib
 import time
-import traceback
 from datetime import datetime
 from app.scraping.scraper import AgriplusScraper
+from app.scraping.pipeline import IngestPipeline
 from app.data.database import Database
+from app.data.locations import get_directory
+from app.data.localization import enqueue_localization
+from app.jobs.queue import job_queue
+from app.log import get_logger, RunCounters
+
+logger = get_logger('automated_scraper')
 
 class AutomatedScraper:
-    def __init__(self):
+    def __init__(self, max_workers=None):
         self.db = Database()
         self.scraper = AgriplusScraper()
+        self.max_workers = max_workers
+    
+    def _make_pipeline(self):
+        return IngestPipeline(AgriplusScraper, fetch_workers=self.max_workers)
     
-    def scrape_district_by_id(self, district_id):
+    @staticmethod
+    def _count_pages(results):
+        """Count pages by fetch outcome: changed, unchanged, not_modified, failed or cancelled"""
+        counts = {'changed': 0, 'unchanged': 0, 'not_modified': 0, 'failed': 0, 'cancelled': 0}
+        for result in results:
+            status = result.get('status', 'changed' if result['success'] else 'failed')
+            counts[status] = counts.get(status, 0) + 1
+        counts['skipped'] = counts['unchanged'] + counts['not_modified']
+        return counts
+
+    @staticmethod
+    def _engine_callbacks(counters, job=None):
+        """
+        Engine / pipeline callbacks that add each finished page to the run counters and,
+        when running as a background job, report it to the job
+        """
+        def on_result(result):
+            status = result.get('status', 'changed' if result['success'] else 'failed')
+            counters.incr(f'pages_{status}')
+            counters.incr('rows', result.get('rows', 0))
+            counters.update({f'rows_{key}': value for key, value in (result.get('counts') or {}).items()})
+            if job:
+                failed = status == 'failed'
+                job.advance(rows=result.get('rows', 0), errors=1 if failed else 0,
+                            error=result['error'] or (f"{result['name']} failed" if failed else None))
+        return ((lambda: job.cancelled) if job else None), on_result
+
+    def enqueue_state(self, state_id, force=False):
+        """Queue a background scrape of a state; returns (job, created)"""
+        return job_queue.submit('scrape_state', {'state_id': state_id, 'force': force},
+                                dedup_key=f'scrape_state:{state_id}')
+
+    def enqueue_district(self, district_id, force=False):
+        """Queue a background scrape of a district; returns (job, created)"""
+        return job_queue.submit('scrape_district', {'district_id': district_id, 'force': force},
+                                dedup_key=f'scrape_district:{district_id}')
+
+    def enqueue_bulk(self, district_ids, force=False):
+        """Queue a background scrape of several districts; returns (job, created)"""
+        key = ','.join(str(d) for d in sorted(set(district_ids)))
+        return job_queue.submit('scrape_bulk', {'district_ids': district_ids, 'force': force},
+                                dedup_key='scrape_bulk:' + hashlib.sha1(key.encode()).hexdigest())
+
+    def scrape_district_by_id(self, district_id, force=False, job=None):
         """
-        Scrape all data for a specific district by ID
+        Scrape all data for a specific district by ID.
+        `job` is the JobContext when running as a background job.
         """
         try:
-            print(f"[INFO] Starting automated scraping for district ID: {district_id}")
+            logger.info(f"Starting automated scraping for district ID: {district_id}")
             
             # Get district information
-            districts = self.db.get_all_districts()
-            district = None
-            state = None
+            district = get_directory().get_district(district_id)
+            state = get_directory().get_state(district['state_id']) if district else None
             
-            for d in districts:
-                if d['id'] == district_id:
-                    district = d
-                    state = self.db.get_state_by_id(d['state_id'])
-                    break
-            
-            if not district:
-                print(f"[ERROR] District with ID {district_id} not found")
+            if not district or not state:
+                logger.error(f"District with ID {district_id} not found")
                 return {
                     'status': 'error',
                     'message': f'District with ID {district_id} not found',
                     'timestamp': datetime.now().isoformat()
                 }
             
-            print(f"[INFO] Found district: {district['name']} in state: {state['name']}")
             
             # Get all markets for this district
             markets = self.db.get_markets_by_state_and_district(state['id'], district_id)
             if not markets:
-                print(f"[WARNING] No markets found for district {district['name']}")
+                logger.warning(f"No markets found for district {district['name']}")
                 return {
                     'status': 'warning',
                     'message': f'No markets found for district {district["name"]}',
                     'timestamp': datetime.now().isoformat()
                 }
             
-            print(f"[INFO] Found {len(markets)} markets for district {district['name']}")
-            
-            # Scrape data for each market
-            successful_markets = []
-            failed_markets = []
-            total_commodities = 0
+            logger.info('Scraping district markets', extra={
+                'district_id': district_id, 'district': district['name'], 'state': state['name'], 'markets': len(markets)
+            })
             
+            # Scrape data for each market concurrently
+            state_slug = self.scraper.normalize_name_for_url(state['name'])
+            district_slug = self.scraper.normalize_name_for_url(district['name'])
+            tasks = []
             for market in markets:
-                try:
-                    print(f"[INFO] Scraping market: {market['name']}")
-                    
-                    # Format URL using the scraper's normalize function
-                    state_slug = self.scraper.normalize_name_for_url(state['name'])
-                    district_slug = self.scraper.normalize_name_for_url(district['name'])
-                    market_slug = self.scraper.normalize_name_for_url(market['name'])
-                    
-                    url = f"https://agriplus.in/prices/all/{state_slug}/{district_slug}/{market_slug}"
-                    print(f"[INFO] Requesting URL: {url}")
-                    
-                    # Scrape the market data
-                    success = self.scraper.scrape_yard_data(
-                        state['name'], 
-                        district['name'], 
-                        market['name']
-                    )
-                    
-                    if success:
-                        successful_markets.append(market['name'])
-                        print(f"[SUCCESS] Scraped data for market: {market['name']}")
-                    else:
-                        failed_markets.append(market['name'])
-                        print(f"[ERROR] Failed to scrape data for market: {market['name']}")
-                    
-                    # Add delay to avoid overwhelming the server
-                    time.sleep(2)
-                    
-                except Exception as e:
-                    print(f"[ERROR] Error scraping market {market['name']}: {e}")
-                    failed_markets.append(market['name'])
-                    traceback.print_exc()
-                    continue
+                market_slug = self.scraper.normalize_name_for_url(market['name'])
+                tasks.append({
+                    'name': market['name'],
+                    'url': f"https://agriplus.in/prices/all/{state_slug}/{district_slug}/{market_slug}",
+                    'state_id': state['id'],
+                    'district_id': district_id,
+                    'market_id': market['id']
+                })
             
-            # Get updated stats
-            stats = self.db.get_stats()
+            if job:
+                job.set_total(len(tasks))
+            counters = RunCounters('district_scrape', district_id=district_id, district=district['name'])
+            should_stop, on_result = self._engine_callbacks(counters, job)
+            started = time.perf_counter()
+            results, stages = self._make_pipeline().run(tasks, force=force, should_stop=should_stop, on_result=on_result)
+            elapsed = time.perf_counter() - started
+            
+            successful_markets = [r['name'] for r in results if r['success']]
+            failed_markets = [r['name'] for r in results if not r['success'] and r.get('status') != 'cancelled']
+            run_counters = counters.log_summary(logger)
+            if run_counters.get('rows_inserted'):
+                # New rows may carry commodity/variety names that are not localised yet
+                enqueue_localization()
             
             return {
                 'status': 'success' if successful_markets else 'partial_success' if failed_markets else 'error',
@@ -103,90 +138,82 @@ class AutomatedScraper:
                 'successful_markets': successful_markets,
                 'failed_markets': failed_markets,
                 'total_markets': len(markets),
-                'stats': stats,
+                'pages': self._count_pages(results),
+                'market_latencies': results,
+                'pipeline': stages,
+                'elapsed_seconds': round(elapsed, 3),
+                'counters': run_counters,
                 'timestamp': datetime.now().isoformat()
             }
             
         except Exception as e:
-            print(f"[ERROR] Error in automated scraping: {e}")
-            traceback.print_exc()
+            logger.exception(f"Error in automated scraping: {e}")
             return {
                 'status': 'error',
                 'message': f'Error in automated scraping: {str(e)}',
                 'timestamp': datetime.now().isoformat()
             }
     
-    def scrape_state_by_id(self, state_id):
+    def scrape_state_by_id(self, state_id, force=False, job=None):
         """
-        Scrape all districts and markets for a specific state by ID
+        Scrape all districts and markets for a specific state by ID.
+        `job` is the JobContext when running as a background job.
         """
         try:
-            print(f"[INFO] Starting automated scraping for state ID: {state_id}")
+            logger.info(f"Starting automated scraping for state ID: {state_id}")
             
             # Get state information
             state = self.db.get_state_by_id(state_id)
             if not state:
-                print(f"[ERROR] State with ID {state_id} not found")
+                logger.error(f"State with ID {state_id} not found")
                 return {
                     'status': 'error',
                     'message': f'State with ID {state_id} not found',
                     'timestamp': datetime.now().isoformat()
                 }
             
-            print(f"[INFO] Found state: {state['name']}")
             
             # Get all districts for this state
             districts = self.db.get_districts_by_state(state_id)
             if not districts:
-                print(f"[WARNING] No districts found for state {state['name']}")
+                logger.warning(f"No districts found for state {state['name']}")
                 return {
                     'status': 'warning',
                     'message': f'No districts found for state {state["name"]}',
                     'timestamp': datetime.now().isoformat()
                 }
             
-            print(f"[INFO] Found {len(districts)} districts for state {state['name']}")
-            
-            # Scrape data for each district
-            successful_districts = []
-            failed_districts = []
-            total_commodities = 0
             
+            # Scrape data for each district concurrently
+            state_slug = self.scraper.normalize_name_for_url(state['name'])
+            tasks = []
             for district in districts:
-                try:
-                    print(f"[INFO] Scraping district: {district['name']}")
-                    
-                    # Format URL using the scraper's normalize function
-                    state_slug = self.scraper.normalize_name_for_url(state['name'])
-                    district_slug = self.scraper.normalize_name_for_url(district['name'])
-                    
-                    url = f"https://agriplus.in/prices/all/{state_slug}/{district_slug}"
-                    print(f"[INFO] Requesting URL: {url}")
-                    
-                    # Scrape the district data
-                    success = self.scraper.scrape_district_data(
-                        state['name'], 
-                        district['name']
-                    )
-                    
-                    if success:
-                        successful_districts.append(district['name'])
-                        print(f"[SUCCESS] Scraped data for district: {district['name']}")
-                    else:
-                        failed_districts.append(district['name'])
-                        print(f"[ERROR] Failed to scrape data for district: {district['name']}")
-                    
-                    # Add delay to avoid overwhelming the server
-                    time.sleep(3)
-                    
-                except Exception as e:
-                    print(f"[ERROR] Error scraping district {district['name']}: {e}")
-                    failed_districts.append(district['name'])
-                    traceback.print_exc()
-                    continue
+                district_slug = self.scraper.normalize_name_for_url(district['name'])
+                tasks.append({
+                    'name': district['name'],
+                    'url': f"https://agriplus.in/prices/all/{state_slug}/{district_slug}",
+                    'state_id': state_id,
+                    'district_id': district['id']
+                })
             
-            # Get updated stats
-            stats = self.db.get_stats()
+            pipeline = self._make_pipeline()
+            logger.info('Scraping state districts', extra={
+                'state_id': state_id, 'state': state['name'], 'districts': len(tasks), 'workers': pipeline.max_workers
+            })
+            if job:
+                job.set_total(len(tasks))
+            counters = RunCounters('state_scrape', state_id=state_id, state=state['name'])
+            should_stop, on_result = self._engine_callbacks(counters, job)
+            started = time.perf_counter()
+            results, stages = pipeline.run(tasks, force=force, should_stop=should_stop, on_result=on_result)
+            elapsed = time.perf_counter() - started
+            
+            successful_districts = [r['name'] for r in results if r['success']]
+            failed_districts = [r['name'] for r in results if not r['success'] and r.get('status') != 'cancelled']
+            run_counters = counters.log_summary(logger)
+            if run_counters.get('rows_inserted'):
+                # New rows may carry commodity/variety names that are not localised yet
+                enqueue_localization()
             
             return {
                 'status': 'success' if successful_districts else 'partial_success' if failed_districts else 'error',
@@ -196,13 +223,16 @@ class AutomatedScraper:
                 'successful_districts': successful_districts,
                 'failed_districts': failed_districts,
                 'total_districts': len(districts),
-                'stats': stats,
+                'pages': self._count_pages(results),
+                'district_latencies': results,
+                'pipeline': stages,
+                'elapsed_seconds': round(elapsed, 3),
+                'counters': run_counters,
                 'timestamp': datetime.now().isoformat()
             }
             
         except Exception as e:
-            print(f"[ERROR] Error in automated state scraping: {e}")
-            traceback.print_exc()
+            logger.exception(f"Error in automated state scraping: {e}")
             return {
                 'status': 'error',
                 'message': f'Error in automated state scraping: {str(e)}',
@@ -226,14 +256,14 @@ class AutomatedScraper:
                     })
             
             if changes:
-                print(f"[INFO] Changes detected: {changes}")
+                logger.info(f"Changes detected: {changes}")
                 return True, changes
             else:
-                print(f"[INFO] No changes detected")
+                logger.info(f"No changes detected")
                 return False, []
                 
         except Exception as e:
-            print(f"[ERROR] Error comparing data: {e}")
+            logger.error(f"Error comparing data: {e}")
             return False, []
     
     def get_scraping_status(self):
@@ -245,6 +275,7 @@ class AutomatedScraper:
             return {
                 'status': 'success',
                 'stats': stats,
+                'active_jobs': job_queue.list_jobs('running') + job_queue.list_jobs('queued'),
                 'last_updated': datetime.now().isoformat(),
                 'message': 'Scraping system is operational'
             }
@@ -12,9 +12,105 @@ class Config:
     DB_NAME = os.getenv('DB_NAME', 'khedutbazaar')
     DB_USER = os.getenv('DB_USER', 'root')
     DB_PASSWORD = os.getenv('DB_PASSWORD', 'SorathiyaRooT@123')
+    # Price table parser: 'lxml', 'stream' or 'bs4'; empty picks lxml when installed
+    PARSER_BACKEND = os.getenv('PARSER_BACKEND', '')
+    # Scrape ingestion pipeline: parser processes (0 parses in threads), pages
+    # buffered between stages, and the rows / milliseconds after which the
+    # writer commits the pages it has collected
+    PIPELINE_PARSE_PROCESSES = int(os.getenv('PIPELINE_PARSE_PROCESSES', 2))
+    PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', 8))
+    PIPELINE_BATCH_ROWS = int(os.getenv('PIPELINE_BATCH_ROWS', 500))
+    PIPELINE_FLUSH_MS = int(os.getenv('PIPELINE_FLUSH_MS', 2000))
+    # Hierarchy refresh: threads fetching district/market option lists and the
+    # minimum gap in seconds between two of their requests
+    HIERARCHY_CRAWL_WORKERS = int(os.getenv('HIERARCHY_CRAWL_WORKERS', 4))
+    HIERARCHY_CRAWL_INTERVAL = float(os.getenv('HIERARCHY_CRAWL_INTERVAL', 0.5))
+    # Removals a hierarchy refresh may apply on its own. Deletes cascade to
+    # prices, so more than this many, or more than this fraction of the stored
+    # locations in scope, are held and logged for manual review
+    HIERARCHY_MAX_REMOVALS = int(os.getenv('HIERARCHY_MAX_REMOVALS', 5))
+    HIERARCHY_MAX_REMOVAL_RATIO = float(os.getenv('HIERARCHY_MAX_REMOVAL_RATIO', 0.05))
+    # Raw price page archive for offline re-parsing: off by default; segment
+    # size, total size budget and retention (days) of its directory
+    PAGE_ARCHIVE_ENABLED = os.getenv('PAGE_ARCHIVE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    ARCHIVE_PATH = os.getenv(
+        'ARCHIVE_PATH',
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'page_archive')
+    )
+    ARCHIVE_SEGMENT_MB = int(os.getenv('ARCHIVE_SEGMENT_MB', 64))
+    ARCHIVE_MAX_MB = int(os.getenv('ARCHIVE_MAX_MB', 2048))
+    ARCHIVE_RETENTION_DAYS = int(os.getenv('ARCHIVE_RETENTION_DAYS', 30))
+    ARCHIVE_ZSTD_LEVEL = int(os.getenv('ARCHIVE_ZSTD_LEVEL', 3))
+    AUTO_MIGRATE = os.getenv('AUTO_MIGRATE', 'true').lower() in ('1', 'true', 'yes')
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+    DB_POOL_MAX_LIFETIME = int(os.getenv('DB_POOL_MAX_LIFETIME', 3600))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    DB_POOL_HEALTH_CHECK_IDLE = int(os.getenv('DB_POOL_HEALTH_CHECK_IDLE', 5))
+    # Seconds before the in-memory state/district/market directory is reloaded
+    LOCATION_DIRECTORY_TTL = int(os.getenv('LOCATION_DIRECTORY_TTL', 600))
+    # Pre-serialised state/district/market responses kept per worker, how
+    # often (seconds) a worker checks the shared hierarchy version, and how
+    # long a response whose names could not all be translated is kept
+    RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 512))
+    RESPONSE_CACHE_VERSION_CHECK = int(os.getenv('RESPONSE_CACHE_VERSION_CHECK', 5))
+    RESPONSE_CACHE_FALLBACK_TTL = int(os.getenv('RESPONSE_CACHE_FALLBACK_TTL', 60))
+    # /api/database/search: default and maximum results per kind
+    SEARCH_RESULT_LIMIT = int(os.getenv('SEARCH_RESULT_LIMIT', 20))
+    SEARCH_MAX_RESULT_LIMIT = int(os.getenv('SEARCH_MAX_RESULT_LIMIT', 100))
+    # Seconds a worker serves its snapshot of the table_counts row counts
+    STATS_CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', 10))
+    # /api/database/yard: default and maximum rows per JSON page, and rows
+    # fetched per round trip when streaming NDJSON/CSV
+    YARD_PAGE_SIZE = int(os.getenv('YARD_PAGE_SIZE', 100))
+    YARD_MAX_PAGE_SIZE = int(os.getenv('YARD_MAX_PAGE_SIZE', 1000))
+    YARD_STREAM_BATCH = int(os.getenv('YARD_STREAM_BATCH', 500))
+    # Price alerts: 'fcm' or 'stub' notifier, alerts evaluated per query,
+    # notifications per FCM send_each call (max 500), concurrent batches,
+    # retries of transient failures and the first retry delay (seconds)
+    ALERT_NOTIFIER = os.getenv('ALERT_NOTIFIER', 'fcm').lower()
+    ALERT_EVAL_CHUNK = int(os.getenv('ALERT_EVAL_CHUNK', 5000))
+    ALERT_BATCH_SIZE = min(int(os.getenv('ALERT_BATCH_SIZE', 500)), 500)
+    ALERT_SEND_WORKERS = int(os.getenv('ALERT_SEND_WORKERS', 4))
+    ALERT_SEND_RETRIES = int(os.getenv('ALERT_SEND_RETRIES', 3))
+    ALERT_SEND_BACKOFF = float(os.getenv('ALERT_SEND_BACKOFF', 1))
+    # Evaluate the alerts on changed prices right after scrape writes, after
+    # collecting changes for this many seconds
+    ALERT_TRIGGER_ENABLED = os.getenv('ALERT_TRIGGER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    ALERT_TRIGGER_DELAY = float(os.getenv('ALERT_TRIGGER_DELAY', 2))
+    FIREBASE_CREDENTIALS = os.getenv(
+        'FIREBASE_CREDENTIALS',
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'API', 'firebase.json')
+    )
+    # Background scrape jobs: concurrent jobs per process, queue poll interval,
+    # and seconds without a heartbeat before a running job is considered dead
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+    JOB_POLL_INTERVAL = int(os.getenv('JOB_POLL_INTERVAL', 5))
+    JOB_STALE_SECONDS = int(os.getenv('JOB_STALE_SECONDS', 600))
+    # Logging: DEBUG/INFO/WARNING/ERROR, 'json' or 'text', optional file next to stdout
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()
+    LOG_FILE = os.getenv('LOG_FILE', '')
+    # Translation cache: SQLite file shared by all workers on the host, entries
+    # kept in memory per process, lifetime of machine translations (seconds)
+    # and how long a worker trusts its memory copy before re-reading the file
+    TRANSLATION_CACHE_PATH = os.getenv(
+        'TRANSLATION_CACHE_PATH',
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'translation_cache.sqlite3')
+    )
+    TRANSLATION_CACHE_SIZE = int(os.getenv('TRANSLATION_CACHE_SIZE', 50000))
+    TRANSLATION_CACHE_TTL = int(os.getenv('TRANSLATION_CACHE_TTL', 30 * 24 * 3600))
+    TRANSLATION_CACHE_MEMORY_TTL = int(os.getenv('TRANSLATION_CACHE_MEMORY_TTL', 3600))
+    # Translation client: pooled keep-alive connections to Google Translate,
+    # per-request HTTP timeout and how long a handler waits for a whole response
+    TRANSLATION_HTTP_CONNECTIONS = int(os.getenv('TRANSLATION_HTTP_CONNECTIONS', 20))
+    TRANSLATION_HTTP_TIMEOUT = int(os.getenv('TRANSLATION_HTTP_TIMEOUT', 10))
+    TRANSLATION_TIMEOUT = int(os.getenv('TRANSLATION_TIMEOUT', 30))
+    # Precompiled hash index of the API/*.json translation dictionaries
+    TRANSLATION_INDEX_PATH = os.getenv(
+        'TRANSLATION_INDEX_PATH',
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'translation_index.pickle')
+    )
 
-    print(f"Loaded config: DB_HOST={DB_HOST}, DB_NAME={DB_NAME}, DB_USER={DB_USER}, DB_PASSWORD={DB_PASSWORD}")
-    
     @staticmethod
     def get_db_connection_params():
         return {
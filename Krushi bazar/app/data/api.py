@@ -1,12 +1,24 @@
 # Data retrieval API endpoints
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
 from datetime import datetime
+from app.alerts.trigger import alert_trigger
+from app.config import Config
+from app.data import price_query
 from app.data.database import Database
+from app.data.pool import get_pool
+from app.data.locations import get_directory
+from app.data.response_cache import response_cache
+from app.data.search_index import search_index
+from app.jobs.queue import job_queue
+from app.scraping.archive import page_archive
+from app.scraping.pipeline import pipeline_metrics
 
 data_bp = Blueprint('data', __name__, url_prefix='/api/database')
 
 db = Database()
 
+YARD_FORMATS = ('json', 'ndjson', 'csv')
+
 @data_bp.route('/health')
 def health_check():
     return jsonify({
@@ -20,10 +32,40 @@ def health_check():
             'markets': '/api/database/states/district/markets',
             'stats': '/api/database/stats',
             'search': '/api/database/search',
-            'yard': '/api/database/yard'
+            'yard': '/api/database/yard',
+            'metrics': '/api/database/metrics'
         }
     })
 
+@data_bp.route('/metrics')
+def get_metrics():
+    # Imported here: API.app imports app.*, so a module-level import is circular
+    from API.app.translation_service import HybridTranslationService
+    from API.app.translation_client import translation_client
+    try:
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'pool': get_pool().get_metrics(),
+                'locations': get_directory().get_metrics(),
+                'jobs': job_queue.get_metrics(),
+                'alert_trigger': alert_trigger.get_metrics(),
+                'response_cache': response_cache.get_metrics(),
+                'search_index': search_index.get_metrics(),
+                'ingest_pipeline': pipeline_metrics.get_metrics(),
+                'page_archive': page_archive.get_metrics(),
+                'translations': HybridTranslationService.get_cache().get_metrics(),
+                'translation_client': translation_client.get_metrics()
+            },
+            'timestamp': datetime.now().isoformat()
+        })
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
 @data_bp.route('/stats')
 def get_stats():
     try:
@@ -42,14 +84,18 @@ def get_stats():
 
 @data_bp.route('/states', methods=['GET'])
 def get_states():
-    try:
+    # Served pre-serialised until the hierarchy changes (timestamp is the render time)
+    def render():
         states = db.get_all_states()
-        return jsonify({
+        return {
             'status': 'success',
             'data': states,
             'count': len(states),
             'timestamp': datetime.now().isoformat()
-        })
+        }, 200
+
+    try:
+        return response_cache.respond('database_states', (), render)
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -166,7 +212,16 @@ def search_locations():
                 'message': 'Query parameter "q" is required',
                 'timestamp': datetime.now().isoformat()
             }), 400
-        results = db.search_locations(query.lower())
+        try:
+            limit = price_query.parse_limit(request.args.get('limit'), Config.SEARCH_RESULT_LIMIT,
+                                            Config.SEARCH_MAX_RESULT_LIMIT)
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e),
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        results = db.search_locations(query, limit)
         return jsonify({
             'status': 'success',
             'data': results,
@@ -270,41 +325,54 @@ def get_commodity_prices():
                     'timestamp': datetime.now().isoformat()
                 }), 400
 
-        # Build dynamic query with JOINs to get names
-        query = '''
-            SELECT cp.id, s.name as state_name, d.name as district_name, m.name as market_name, 
-                   cp.commodity, cp.variety, cp.min_price, cp.max_price, 
-                   cp.modal_price, cp.price_date, cp.state_id, cp.district_id, cp.market_id, 
-                   cp.last_updated, cp.created_at
-            FROM commodity_prices cp
-            JOIN states s ON cp.state_id = s.id
-            JOIN districts d ON cp.district_id = d.id
-            JOIN markets m ON cp.market_id = m.id
-            WHERE 1=1
-        '''
-        params = []
-        if state_id:
-            query += ' AND state_id = %s'
-            params.append(state_id)
-        if district_id:
-            query += ' AND district_id = %s'
-            params.append(district_id)
-        if market_id:
-            query += ' AND market_id = %s'
-            params.append(market_id)
-        query += ' ORDER BY created_at DESC'
+        # Projection, date range, page size and cursor
+        try:
+            fields = price_query.parse_fields(request.args.get('fields', ''))
+            filters = {
+                'state_id': state_id,
+                'district_id': district_id,
+                'market_id': market_id,
+                'from_date': price_query.parse_date(request.args.get('from_date'), 'from_date'),
+                'to_date': price_query.parse_date(request.args.get('to_date'), 'to_date'),
+                'after': price_query.decode_cursor(request.args.get('cursor'))
+            }
+            output = request.args.get('format', 'json').lower()
+            if output not in YARD_FORMATS:
+                raise ValueError(f'Invalid format: must be one of {", ".join(YARD_FORMATS)}')
+            if output == 'json':
+                limit = price_query.parse_limit(request.args.get('limit'), Config.YARD_PAGE_SIZE, Config.YARD_MAX_PAGE_SIZE)
+            else:
+                # Streams are unbounded unless a limit is asked for
+                limit = price_query.parse_limit(request.args.get('limit'), None, None)
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e),
+                'data': [],
+                'count': 0,
+                'timestamp': datetime.now().isoformat()
+            }), 400
+
+        if output != 'json':
+            # Rows go to the client as MySQL sends them, never held as a list
+            rows = price_query.stream_rows(fields, limit=limit, **filters)
+            if output == 'ndjson':
+                body = price_query.ndjson_lines(rows, current_app.json.dumps)
+                return Response(stream_with_context(body), mimetype='application/x-ndjson')
+            body = price_query.csv_lines(rows, fields)
+            return Response(stream_with_context(body), mimetype='text/csv', headers={
+                'Content-Disposition': 'attachment; filename=commodity_prices.csv'
+            })
 
-        # Execute query
-        conn = db.get_connection()
-        cursor = conn.cursor()
         try:
-            cursor.execute(query, params)
-            results = cursor.fetchall()
+            results, next_cursor = price_query.fetch_page(fields, limit, **filters)
             return jsonify({
                 'status': 'success',
                 'message': f'Retrieved {len(results)} commodity price records',
                 'data': results,
                 'count': len(results),
+                'next_cursor': next_cursor,
+                'limit': limit,
                 'state_id': state_id if state_id else None,
                 'district_id': district_id if district_id else None,
                 'market_id': market_id if market_id else None,
@@ -318,8 +386,6 @@ def get_commodity_prices():
                 'count': 0,
                 'timestamp': datetime.now().isoformat()
             }), 500
-        finally:
-            conn.close()
 
     except Exception as e:
         return jsonify({
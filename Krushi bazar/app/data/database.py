@@ -1,437 +1,388 @@
 # Database operations
-import pymysql
-from pymysql import cursors
 from datetime import datetime
+import pymysql
+from app.alerts.trigger import alert_trigger
 from app.config import Config
+from app.data.latest_prices import update_latest_prices
+from app.data.pool import get_pool
+from app.data.price_dates import parse_price_date
+from app.data.locations import get_directory
+from app.data.response_cache import bump_hierarchy_version
+from app.data.search_index import search_index
+from app.data import stats
+from app.log import get_logger
+
+logger = get_logger('database')
+
+UPSERT_COMMODITY_PRICE_SQL = '''
+    INSERT INTO commodity_prices
+    (state_id, district_id, market_id, commodity, variety, min_price, max_price, modal_price, price_date, price_day)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        min_price = VALUES(min_price),
+        max_price = VALUES(max_price),
+        modal_price = VALUES(modal_price),
+        price_date = VALUES(price_date),
+        price_day = VALUES(price_day),
+        last_updated = CURRENT_TIMESTAMP
+'''
+
+# Columns written per hierarchy level by apply_hierarchy_changes
+HIERARCHY_COLUMNS = {
+    'states': ('id', 'name'),
+    'districts': ('id', 'name', 'state_id'),
+    'markets': ('id', 'name', 'district_id', 'state_id')
+}
 
 class Database:
     def __init__(self):
+        # Cheap handle: the schema is created by app.data.migrations at process start
         self.config = Config
-        self.init_database()
     
     def get_connection(self):
-        try:
-            conn = pymysql.connect(**self.config.get_db_connection_params(), cursorclass=cursors.DictCursor)
-            return conn
-        except Exception as e:
-            print(f"[ERROR] Database connection error: {e}")
-            raise
+        # Borrowed from the shared pool, conn.close() returns it
+        return get_pool().borrow()
     
-    def init_database(self):
+    @staticmethod
+    def _write_rows(cursor, sql, rows, args, kind, failed):
+        """
+        Run `sql` for every row; on a unique or foreign key error, run the
+        rows one by one instead and add the ones that keep failing to
+        `failed` (InnoDB undoes only the failing statement, not the
+        transaction). Rows that fail are retried while others succeed, so
+        a rename that needs another row's old name goes through once that
+        row is renamed. Returns the number of rows written.
+        """
         try:
-            # Connect without specifying database to create it if needed
-            conn = pymysql.connect(
-                host=self.config.DB_HOST,
-                port=self.config.DB_PORT,
-                user=self.config.DB_USER,
-                password=self.config.DB_PASSWORD,
-                charset='utf8mb4',
-                cursorclass=cursors.DictCursor
-            )
-            cursor = conn.cursor()
-            try:
-                # Create database if it doesn't exist
-                cursor.execute(f'CREATE DATABASE IF NOT EXISTS {self.config.DB_NAME}')
-                cursor.execute(f'USE {self.config.DB_NAME}')
-                
-                # Create states table
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS states (
-                        id INT PRIMARY KEY,
-                        name VARCHAR(255) NOT NULL UNIQUE,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        INDEX idx_state_name (name)
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-                ''')
-                print("[SUCCESS] States table initialized")
-
-                # Create districts table
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS districts (
-                        id INT PRIMARY KEY,
-                        name VARCHAR(255) NOT NULL,
-                        state_id INT NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (state_id) REFERENCES states (id) ON DELETE CASCADE,
-                        UNIQUE KEY unique_district_state (name, state_id),
-                        INDEX idx_district_name (name)
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-                ''')
-                print("[SUCCESS] Districts table initialized")
-
-                # Create markets table
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS markets (
-                        id INT PRIMARY KEY,
-                        name VARCHAR(255) NOT NULL,
-                        district_id INT NOT NULL,
-                        state_id INT NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (district_id) REFERENCES districts (id) ON DELETE CASCADE,
-                        FOREIGN KEY (state_id) REFERENCES states (id) ON DELETE CASCADE,
-                        UNIQUE KEY unique_market_district (name, district_id),
-                        INDEX idx_market_name (name)
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-                ''')
-                print("[SUCCESS] Markets table initialized")
-
-                # Create commodity_prices table with state_id, district_id, market_id and last_updated
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS commodity_prices (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        state_id INT NOT NULL,
-                        district_id INT NOT NULL,
-                        market_id INT NOT NULL,
-                        commodity VARCHAR(100) NOT NULL,
-                        variety VARCHAR(100) NOT NULL,
-                        min_price INT NOT NULL,
-                        max_price INT NOT NULL,
-                        modal_price INT NOT NULL,
-                        price_date VARCHAR(50) NOT NULL,
-                        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (state_id) REFERENCES states (id) ON DELETE CASCADE,
-                        FOREIGN KEY (district_id) REFERENCES districts (id) ON DELETE CASCADE,
-                        FOREIGN KEY (market_id) REFERENCES markets (id) ON DELETE CASCADE,
-                        INDEX idx_commodity_market (market_id, commodity),
-                        UNIQUE KEY unique_price (state_id, district_id, market_id, commodity, variety, price_date)
-                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-                ''')
-                print("[SUCCESS] Commodity prices table initialized")
-
-                # Check if old columns exist and migrate data if needed
-                cursor.execute("SHOW COLUMNS FROM commodity_prices LIKE 'state'")
-                if cursor.fetchone():
-                    print("[INFO] Migrating old commodity_prices table structure...")
-                    # Add new columns if they don't exist
-                    cursor.execute("SHOW COLUMNS FROM commodity_prices LIKE 'state_id'")
-                    if not cursor.fetchone():
-                        cursor.execute("ALTER TABLE commodity_prices ADD COLUMN state_id INT")
-                        cursor.execute("ALTER TABLE commodity_prices ADD COLUMN district_id INT")
-                        cursor.execute("ALTER TABLE commodity_prices ADD COLUMN market_id INT")
-                        cursor.execute("ALTER TABLE commodity_prices ADD COLUMN last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP")
-                        
-                        # Update existing records with IDs
-                        cursor.execute("""
-                            UPDATE commodity_prices cp 
-                            JOIN states s ON LOWER(cp.state) = LOWER(s.name)
-                            SET cp.state_id = s.id
-                        """)
-                        
-                        cursor.execute("""
-                            UPDATE commodity_prices cp 
-                            JOIN districts d ON LOWER(cp.district) = LOWER(d.name) AND cp.state_id = d.state_id
-                            SET cp.district_id = d.id
-                        """)
-                        
-                        cursor.execute("""
-                            UPDATE commodity_prices cp 
-                            JOIN markets m ON LOWER(cp.market) = LOWER(m.name) AND cp.district_id = m.district_id
-                            SET cp.market_id = m.id
-                        """)
-                        
-                        # Drop old unique key first to avoid conflicts
-                        try:
-                            cursor.execute("ALTER TABLE commodity_prices DROP INDEX unique_price")
-                        except:
-                            pass  # Index might not exist
-                        
-                        # Drop old columns
-                        cursor.execute("ALTER TABLE commodity_prices DROP COLUMN state")
-                        cursor.execute("ALTER TABLE commodity_prices DROP COLUMN district")
-                        cursor.execute("ALTER TABLE commodity_prices DROP COLUMN market")
-                        
-                        # Add foreign key constraints
-                        cursor.execute("ALTER TABLE commodity_prices ADD CONSTRAINT fk_commodity_state FOREIGN KEY (state_id) REFERENCES states (id) ON DELETE CASCADE")
-                        cursor.execute("ALTER TABLE commodity_prices ADD CONSTRAINT fk_commodity_district FOREIGN KEY (district_id) REFERENCES districts (id) ON DELETE CASCADE")
-                        cursor.execute("ALTER TABLE commodity_prices ADD CONSTRAINT fk_commodity_market FOREIGN KEY (market_id) REFERENCES markets (id) ON DELETE CASCADE")
-                        
-                        # Add new unique key
-                        cursor.execute("ALTER TABLE commodity_prices ADD UNIQUE KEY unique_price (state_id, district_id, market_id, commodity, variety, price_date)")
-                        
-                        print("[SUCCESS] Migration completed")
-
-                conn.commit()
-                print("[SUCCESS] All database tables initialized successfully")
-            except Exception as e:
-                print(f"[ERROR] Error initializing database tables: {e}")
-                conn.rollback()
-                raise
-            finally:
-                conn.close()
-        except Exception as e:
-            print(f"[ERROR] Error connecting to database: {e}")
-            raise
+            cursor.executemany(sql, [args(row) for row in rows])
+            return len(rows)
+        except pymysql.err.IntegrityError:
+            pass
+        written = 0
+        pending = rows
+        while True:
+            retry = []
+            for row in pending:
+                try:
+                    cursor.execute(sql, args(row))
+                    written += 1
+                except pymysql.err.IntegrityError as e:
+                    retry.append((row, e))
+            if not retry or len(retry) == len(pending):
+                break
+            pending = [row for row, _ in retry]
+        for row, error in retry:
+            logger.warning(f"Could not apply {kind} {row['name']} ({row['id']}): {error}")
+            failed.append(dict(row, kind=kind, error=str(error)))
+        return written
     
-    def insert_state(self, state_id, name):
+    def apply_hierarchy_changes(self, level, changes):
+        """
+        Apply a hierarchy diff (app/scraping/hierarchy.py) to the states,
+        districts or markets table in one transaction: rename the renamed
+        locations (their localised names are cleared so they are translated
+        again), delete the removed ones, which cascades to their children
+        and prices, then insert the added ones. Renames and removals go
+        first so a new location can take a name they free up. A row that
+        hits a unique or foreign key error is skipped and reported instead
+        of rolling back the level. Returns {'writes', 'failed'}, or None
+        on error.
+        """
+        columns = HIERARCHY_COLUMNS[level]
+        failed = []
         conn = self.get_connection()
         cursor = conn.cursor()
         try:
-            cursor.execute(
-                'INSERT INTO states (id, name) VALUES (%s, %s) ON DUPLICATE KEY UPDATE name = VALUES(name)',
-                (state_id, name.strip())
+            conn.begin()
+            renamed = self._write_rows(
+                cursor, f'UPDATE {level} SET name = %s, name_hi = NULL, name_gu = NULL WHERE id = %s',
+                changes['renamed'], lambda row: (row['name'], row['id']), 'renamed', failed
             )
-            conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error inserting state {name}: {e}")
-            conn.rollback()
-            return False
-        finally:
-            conn.close()
-    
-    def insert_district(self, district_id, name, state_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute(
-                'INSERT INTO districts (id, name, state_id) VALUES (%s, %s, %s) ON DUPLICATE KEY UPDATE name = VALUES(name)',
-                (district_id, name.strip(), state_id)
+            removed_ids = sorted(row['id'] for row in changes['removed'])
+            for start in range(0, len(removed_ids), 500):
+                chunk = removed_ids[start:start + 500]
+                cursor.execute(f"DELETE FROM {level} WHERE id IN ({', '.join(['%s'] * len(chunk))})", chunk)
+            added = self._write_rows(
+                cursor, f"INSERT INTO {level} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+                changes['added'], lambda row: tuple(row[column] for column in columns), 'added', failed
             )
+            if removed_ids:
+                # The deletes cascade to the tables below, so recount them all
+                stats.reconcile(cursor)
+            else:
+                stats.add_rows(cursor, level, added)
             conn.commit()
-            return True
         except Exception as e:
-            print(f"Error inserting district {name}: {e}")
+            logger.error(f"Error applying {level} changes: {e}")
             conn.rollback()
-            return False
+            return None
         finally:
             conn.close()
+        writes = added + renamed + len(removed_ids)
+        if removed_ids:
+            stats.stats_cache.invalidate()
+        if writes:
+            bump_hierarchy_version()
+        return {'writes': writes, 'failed': failed}
     
-    def insert_market(self, market_id, name, district_id, state_id):
+    def insert_commodity_price(self, state_id, district_id, market_id, commodity, variety, min_price, max_price, modal_price, price_date):
+        record = (state_id, district_id, market_id, commodity.strip(), variety.strip(),
+                  min_price, max_price, modal_price, price_date.strip(), parse_price_date(price_date))
         conn = self.get_connection()
         cursor = conn.cursor()
         try:
-            cursor.execute(
-                'INSERT INTO markets (id, name, district_id, state_id) VALUES (%s, %s, %s, %s) ON DUPLICATE KEY UPDATE name = VALUES(name)',
-                (market_id, name.strip(), district_id, state_id)
-            )
+            # One transaction, so latest_prices is read under lock and written with the price
+            conn.begin()
+            cursor.execute(UPSERT_COMMODITY_PRICE_SQL, record)
+            if cursor.rowcount == 1:
+                stats.add_rows(cursor, 'commodities', 1)
+            modal_changed = update_latest_prices(cursor, self._read_back(cursor, [record]))
             conn.commit()
+            alert_trigger.prices_changed(modal_changed)
             return True
         except Exception as e:
-            print(f"Error inserting market {name}: {e}")
+            logger.error(f"Error inserting commodity price {commodity} ({variety}): {e}")
             conn.rollback()
             return False
         finally:
             conn.close()
     
-    def insert_commodity_price(self, state_id, district_id, market_id, commodity, variety, min_price, max_price, modal_price, price_date):
+    @staticmethod
+    def _price_key(state_id, district_id, market_id, commodity, variety, price_date):
+        # Mirrors the unique_price key; the table collation is case-insensitive
+        return (int(state_id), int(district_id), int(market_id), commodity.lower(), variety.lower(), price_date.lower())
+    
+    def upsert_commodity_prices(self, rows, market_counts=None):
+        """
+        Upsert a whole page of commodity prices in one transaction on one connection.
+        Each row is a dict with state_id, district_id, market_id, commodity, variety,
+        min_price, max_price, modal_price and price_date, plus price_day when the
+        scraper already parsed it. Rows whose prices are already stored are not
+        written at all. When `market_counts` is a dict it also receives the
+        counts per market_id (the ingest pipeline writes several pages at once).
+        Returns {'inserted': n, 'updated': n, 'unchanged': n}, or None on error.
+        """
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        if not rows:
+            return counts
+        
+        # De-duplicate on the unique key, the last row wins like sequential upserts would
+        batch = {}
+        for row in rows:
+            record = (
+                row['state_id'], row['district_id'], row['market_id'],
+                row['commodity'].strip(), row['variety'].strip(),
+                row['min_price'], row['max_price'], row['modal_price'],
+                row['price_date'].strip(),
+                row['price_day'] if 'price_day' in row else parse_price_date(row['price_date'])
+            )
+            key = self._price_key(record[0], record[1], record[2], record[3], record[4], record[8])
+            batch[key] = record
+        
         conn = self.get_connection()
         cursor = conn.cursor()
         try:
+            conn.begin()
+            # Load the stored prices for every market/date on the page in one query
+            market_ids = sorted({record[2] for record in batch.values()})
+            price_dates = sorted({record[8] for record in batch.values()})
             cursor.execute(
-                '''
-                INSERT INTO commodity_prices
-                (state_id, district_id, market_id, commodity, variety, min_price, max_price, modal_price, price_date)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                    min_price = VALUES(min_price),
-                    max_price = VALUES(max_price),
-                    modal_price = VALUES(modal_price),
-                    price_date = VALUES(price_date),
-                    last_updated = CURRENT_TIMESTAMP
+                f'''
+                SELECT state_id, district_id, market_id, commodity, variety, price_date,
+                       min_price, max_price, modal_price, price_day
+                FROM commodity_prices
+                WHERE market_id IN ({', '.join(['%s'] * len(market_ids))})
+                  AND price_date IN ({', '.join(['%s'] * len(price_dates))})
                 ''',
-                (state_id, district_id, market_id, commodity.strip(), variety.strip(),
-                 min_price, max_price, modal_price, price_date.strip())
+                market_ids + price_dates
             )
+            existing = {}
+            for stored in cursor.fetchall():
+                key = self._price_key(stored['state_id'], stored['district_id'], stored['market_id'],
+                                      stored['commodity'], stored['variety'], stored['price_date'])
+                existing[key] = (stored['min_price'], stored['max_price'], stored['modal_price'], stored['price_day'])
+            
+            to_write = []
+            by_market = {}
+            for key, record in batch.items():
+                prices = existing.get(key)
+                if prices is None:
+                    outcome = 'inserted'
+                elif prices != (record[5], record[6], record[7], record[9]):
+                    outcome = 'updated'
+                else:
+                    outcome = 'unchanged'
+                counts[outcome] += 1
+                market = by_market.setdefault(record[2], {'inserted': 0, 'updated': 0, 'unchanged': 0})
+                market[outcome] += 1
+                if outcome != 'unchanged':
+                    to_write.append(record)
+            
+            modal_changed = set()
+            if to_write:
+                cursor.executemany(UPSERT_COMMODITY_PRICE_SQL, to_write)
+                modal_changed = update_latest_prices(cursor, self._read_back(cursor, to_write))
+                # Last, so the table_counts row lock is held only until the commit
+                stats.add_rows(cursor, 'commodities', counts['inserted'])
             conn.commit()
-            return True
+            if market_counts is not None:
+                market_counts.update(by_market)
+            # Evaluate the alerts on prices that moved, seconds after the scrape
+            alert_trigger.prices_changed(modal_changed)
+            return counts
         except Exception as e:
-            print(f"Error inserting commodity price {commodity} ({variety}): {e}")
+            logger.error(f"Error upserting {len(batch)} commodity prices: {e}")
             conn.rollback()
-            return False
+            return None
         finally:
             conn.close()
     
-    def get_state_id_by_name(self, state_name):
+    def _read_back(self, cursor, records):
+        """Written price records as dicts with their row id and last_updated"""
+        market_ids = sorted({record[2] for record in records})
+        price_dates = sorted({record[8] for record in records})
+        cursor.execute(
+            f'''
+            SELECT id, state_id, district_id, market_id, commodity, variety, price_date, last_updated
+            FROM commodity_prices
+            WHERE market_id IN ({', '.join(['%s'] * len(market_ids))})
+              AND price_date IN ({', '.join(['%s'] * len(price_dates))})
+            ''',
+            market_ids + price_dates
+        )
+        stored = {
+            self._price_key(row['state_id'], row['district_id'], row['market_id'],
+                            row['commodity'], row['variety'], row['price_date']): row
+            for row in cursor.fetchall()
+        }
+        written = []
+        for record in records:
+            row = stored.get(self._price_key(record[0], record[1], record[2], record[3], record[4], record[8]))
+            if row is None:
+                continue
+            written.append({
+                'state_id': record[0], 'district_id': record[1], 'market_id': record[2],
+                'commodity': record[3], 'variety': record[4],
+                'min_price': record[5], 'max_price': record[6], 'modal_price': record[7],
+                'price_date': record[8], 'price_day': record[9],
+                'price_id': row['id'], 'last_updated': row['last_updated']
+            })
+        return written
+    
+    def get_page_fingerprint(self, url):
+        """Validators and hashes stored for a price page on its last successful scrape"""
         conn = self.get_connection()
         cursor = conn.cursor()
         try:
-            cursor.execute('SELECT id FROM states WHERE LOWER(name) = LOWER(%s)', (state_name.strip(),))
-            result = cursor.fetchone()
-            return result['id'] if result else None
+            cursor.execute(
+                'SELECT url, etag, last_modified, body_hash, table_hash FROM page_fingerprints WHERE url = %s',
+                (url,)
+            )
+            return cursor.fetchone()
         except Exception as e:
-            print(f"Error getting state ID for {state_name}: {e}")
+            logger.error(f"Error getting page fingerprint for {url}: {e}")
             return None
         finally:
             conn.close()
 
-    def get_district_id_by_name(self, district_name, state_id):
+    def save_page_fingerprint(self, url, etag, last_modified, body_hash, table_hash):
         conn = self.get_connection()
         cursor = conn.cursor()
         try:
-            cursor.execute(
-                'SELECT id FROM districts WHERE LOWER(name) = LOWER(%s) AND state_id = %s',
-                (district_name.strip(), state_id)
-            )
-            result = cursor.fetchone()
-            return result['id'] if result else None
+            cursor.execute('''
+                INSERT INTO page_fingerprints (url, etag, last_modified, body_hash, table_hash, checked_at, changed_at)
+                VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                ON DUPLICATE KEY UPDATE
+                    changed_at = IF(table_hash <=> VALUES(table_hash), changed_at, CURRENT_TIMESTAMP),
+                    etag = VALUES(etag),
+                    last_modified = VALUES(last_modified),
+                    body_hash = VALUES(body_hash),
+                    table_hash = VALUES(table_hash),
+                    checked_at = CURRENT_TIMESTAMP
+            ''', (url, etag, last_modified, body_hash, table_hash))
+            conn.commit()
         except Exception as e:
-            print(f"Error getting district ID for {district_name}: {e}")
-            return None
+            logger.error(f"Error saving page fingerprint for {url}: {e}")
+            conn.rollback()
         finally:
             conn.close()
 
-    def get_market_id_by_name(self, market_name, district_id):
+    def touch_page_fingerprint(self, url):
+        """Record that a page was checked and the server answered 304 Not Modified"""
         conn = self.get_connection()
         cursor = conn.cursor()
         try:
-            cursor.execute(
-                'SELECT id FROM markets WHERE LOWER(name) = LOWER(%s) AND district_id = %s',
-                (market_name.strip(), district_id)
-            )
-            result = cursor.fetchone()
-            return result['id'] if result else None
+            cursor.execute('UPDATE page_fingerprints SET checked_at = CURRENT_TIMESTAMP WHERE url = %s', (url,))
+            conn.commit()
         except Exception as e:
-            print(f"Error getting market ID for {market_name}: {e}")
-            return None
+            logger.error(f"Error updating page fingerprint for {url}: {e}")
+            conn.rollback()
         finally:
             conn.close()
-    
+
+    # Hierarchy lookups are served from the in-memory location directory
+    def get_state_id_by_name(self, state_name):
+        return get_directory().state_id(state_name)
+
+    def get_district_id_by_name(self, district_name, state_id):
+        return get_directory().district_id(district_name, state_id)
+
+    def get_market_id_by_name(self, market_name, district_id):
+        return get_directory().market_id(market_name, district_id)
+
     def get_all_states(self):
-        conn = self.get_connection()
-        cursor = conn.cursor(pymysql.cursors.DictCursor)
-        try:
-            cursor.execute('SELECT id, name FROM states ORDER BY name')
-            return cursor.fetchall()
-        except Exception as e:
-            print(f"Error getting states: {e}")
-            return []
-        finally:
-            conn.close()
+        return get_directory().states()
 
     def get_state_by_id(self, state_id):
-        conn = self.get_connection()
-        cursor = conn.cursor(pymysql.cursors.DictCursor)
-        try:
-            cursor.execute('SELECT id, name FROM states WHERE id = %s', (state_id,))
-            return cursor.fetchone()
-        except Exception as e:
-            print(f"Error getting state by ID: {e}")
-            return None
-        finally:
-            conn.close()
-    
+        return get_directory().get_state(state_id)
+
     def get_districts_by_state(self, state_id):
-        conn = self.get_connection()
-        cursor = conn.cursor(pymysql.cursors.DictCursor)
-        try:
-            cursor.execute(
-                'SELECT id, name FROM districts WHERE state_id = %s ORDER BY name',
-                (state_id,)
-            )
-            return cursor.fetchall()
-        except Exception as e:
-            print(f"Error getting districts: {e}")
-            return []
-        finally:
-            conn.close()
-    
+        return [{'id': d['id'], 'name': d['name']} for d in get_directory().districts(state_id)]
+
     def get_markets_by_district(self, district_id):
-        conn = self.get_connection()
-        cursor = conn.cursor(pymysql.cursors.DictCursor)
-        try:
-            cursor.execute(
-                'SELECT id, name FROM markets WHERE district_id = %s ORDER BY name',
-                (district_id,)
-            )
-            return cursor.fetchall()
-        except Exception as e:
-            print(f"Error getting markets: {e}")
-            return []
-        finally:
-            conn.close()
-    
+        return [{'id': m['id'], 'name': m['name']} for m in get_directory().markets(district_id=district_id)]
+
     def get_markets_by_state_and_district(self, state_id, district_id):
-        conn = self.get_connection()
-        cursor = conn.cursor(pymysql.cursors.DictCursor)
-        try:
-            cursor.execute(
-                'SELECT id, name FROM markets WHERE state_id = %s AND district_id = %s ORDER BY name',
-                (state_id, district_id)
-            )
-            return cursor.fetchall()
-        except Exception as e:
-            print(f"Error getting markets: {e}")
-            return []
-        finally:
-            conn.close()
-    
+        markets = get_directory().markets(district_id=district_id, state_id=state_id)
+        return [{'id': m['id'], 'name': m['name']} for m in markets]
+
     def get_markets_by_state(self, state_id):
-        conn = self.get_connection()
-        cursor = conn.cursor(pymysql.cursors.DictCursor)
-        try:
-            cursor.execute('''
-                SELECT m.id, m.name, m.district_id, m.state_id, d.name as district_name
-                FROM markets m
-                JOIN districts d ON m.district_id = d.id
-                WHERE m.state_id = %s
-                ORDER BY d.name, m.name
-            ''', (state_id,))
-            return cursor.fetchall()
-        except Exception as e:
-            print(f"Error getting markets by state: {e}")
-            return []
-        finally:
-            conn.close()
-    
+        directory = get_directory()
+        markets = []
+        for district in directory.districts(state_id):
+            for market in directory.markets(district_id=district['id'], state_id=state_id):
+                market['district_name'] = district['name']
+                markets.append(market)
+        return markets
+
     def get_all_districts(self):
-        conn = self.get_connection()
-        cursor = conn.cursor(pymysql.cursors.DictCursor)
-        try:
-            cursor.execute('SELECT id, name, state_id FROM districts ORDER BY name')
-            return cursor.fetchall()
-        except Exception as e:
-            print(f"Error getting all districts: {e}")
-            return []
-        finally:
-            conn.close()
-    
-    def search_locations(self, query):
-        conn = self.get_connection()
-        cursor = conn.cursor(pymysql.cursors.DictCursor)
+        return get_directory().districts()
+
+    def search_locations(self, query, limit=None):
+        """Ranked state/district/market matches from the in-memory search index"""
         try:
-            results = {'states': [], 'districts': [], 'markets': []}
-            # Search states
-            cursor.execute('SELECT id, name FROM states WHERE name LIKE %s ORDER BY name', (f'%{query}%',))
-            results['states'] = cursor.fetchall()
-            # Search districts
-            cursor.execute('''
-                SELECT d.id, d.name, d.state_id, s.name as state_name
-                FROM districts d
-                JOIN states s ON d.state_id = s.id
-                WHERE d.name LIKE %s
-                ORDER BY d.name
-            ''', (f'%{query}%',))
-            results['districts'] = cursor.fetchall()
-            # Search markets
-            cursor.execute('''
-                SELECT m.id, m.name, m.district_id, m.state_id, d.name as district_name, s.name as state_name
-                FROM markets m
-                JOIN districts d ON m.district_id = d.id
-                JOIN states s ON m.state_id = s.id
-                WHERE m.name LIKE %s
-                ORDER BY m.name
-            ''', (f'%{query}%',))
-            results['markets'] = cursor.fetchall()
-            return results
+            return search_index.search(query, limit)
         except Exception as e:
-            print(f"Error searching locations: {e}")
+            logger.error(f"Error searching locations: {e}")
             return {'states': [], 'districts': [], 'markets': []}
-        finally:
-            conn.close()
     
     def clear_all_data(self):
         conn = self.get_connection()
         cursor = conn.cursor()
         try:
+            cursor.execute('DELETE FROM latest_prices')
             cursor.execute('DELETE FROM commodity_prices')
+            cursor.execute('DELETE FROM page_fingerprints')
             cursor.execute('DELETE FROM markets')
             cursor.execute('DELETE FROM districts')
             cursor.execute('DELETE FROM states')
+            stats.reconcile(cursor)
             conn.commit()
-            print("[SUCCESS] All data cleared from database")
+            stats.stats_cache.invalidate()
+            bump_hierarchy_version()
+            logger.info("All data cleared from database")
         except Exception as e:
-            print(f"Error clearing data: {e}")
+            logger.error(f"Error clearing data: {e}")
             conn.rollback()
         finally:
             conn.close()
@@ -441,10 +392,14 @@ class Database:
         cursor = conn.cursor()
         try:
             cursor.execute('DELETE FROM states')
+            # The delete cascades to the tables below it, so recount them all
+            stats.reconcile(cursor)
             conn.commit()
-            print("[SUCCESS] States data cleared from database")
+            stats.stats_cache.invalidate()
+            bump_hierarchy_version()
+            logger.info("States data cleared from database")
         except Exception as e:
-            print(f"Error clearing states: {e}")
+            logger.error(f"Error clearing states: {e}")
             conn.rollback()
         finally:
             conn.close()
@@ -454,10 +409,14 @@ class Database:
         cursor = conn.cursor()
         try:
             cursor.execute('DELETE FROM districts')
+            # The delete cascades to the tables below it, so recount them all
+            stats.reconcile(cursor)
             conn.commit()
-            print("[SUCCESS] Districts data cleared from database")
+            stats.stats_cache.invalidate()
+            bump_hierarchy_version()
+            logger.info("Districts data cleared from database")
         except Exception as e:
-            print(f"Error clearing districts: {e}")
+            logger.error(f"Error clearing districts: {e}")
             conn.rollback()
         finally:
             conn.close()
@@ -467,10 +426,14 @@ class Database:
         cursor = conn.cursor()
         try:
             cursor.execute('DELETE FROM markets')
+            # The delete cascades to the tables below it, so recount them all
+            stats.reconcile(cursor)
             conn.commit()
-            print("[SUCCESS] Markets data cleared from database")
+            stats.stats_cache.invalidate()
+            bump_hierarchy_version()
+            logger.info("Markets data cleared from database")
         except Exception as e:
-            print(f"Error clearing markets: {e}")
+            logger.error(f"Error clearing markets: {e}")
             conn.rollback()
         finally:
             conn.close()
@@ -479,35 +442,20 @@ class Database:
         conn = self.get_connection()
         cursor = conn.cursor()
         try:
+            cursor.execute('DELETE FROM latest_prices')
             cursor.execute('DELETE FROM commodity_prices')
+            # Forget page fingerprints so the next scrape re-downloads everything
+            cursor.execute('DELETE FROM page_fingerprints')
+            stats.reconcile(cursor)
             conn.commit()
-            print("[SUCCESS] Commodity prices data cleared from database")
+            stats.stats_cache.invalidate()
+            logger.info("Commodity prices data cleared from database")
         except Exception as e:
-            print(f"Error clearing commodity prices: {e}")
+            logger.error(f"Error clearing commodity prices: {e}")
             conn.rollback()
         finally:
             conn.close()
     
     def get_stats(self):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute('SELECT COUNT(*) as count FROM states')
-            states_count = cursor.fetchone()['count']
-            cursor.execute('SELECT COUNT(*) as count FROM districts')
-            districts_count = cursor.fetchone()['count']
-            cursor.execute('SELECT COUNT(*) as count FROM markets')
-            markets_count = cursor.fetchone()['count']
-            cursor.execute('SELECT COUNT(*) as count FROM commodity_prices')
-            commodities_count = cursor.fetchone()['count']
-            return {
-                'states': states_count,
-                'districts': districts_count,
-                'markets': markets_count,
-                'commodities': commodities_count
-            }
-        except Exception as e:
-            print(f"Error getting stats: {e}")
-            return {'states': 0, 'districts': 0, 'markets': 0, 'commodities': 0}
-        finally:
-            conn.close()
\ No newline at end of file
+        """Row counts from table_counts, cached per process for STATS_CACHE_TTL seconds"""
+        return stats.stats_cache.get()
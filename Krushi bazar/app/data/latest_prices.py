@@ -0,0 +1,182 @@
+# Latest and previous price per (market, commodity, variety)
+#
+# latest_prices holds, for every market/commodity/variety, the newest and the
+# second-newest commodity_prices row (newest by price_day, then last_updated)
+# and the trend between them. The market page, the commodity list and price
+# alerts read it instead of ranking the whole price history per request.
+#
+# It is maintained incrementally inside upsert_commodity_prices: each written
+# row is compared with the stored latest/previous pair for its key, so keeping
+# it current costs the same however long the history is. rebuild() recomputes
+# it from commodity_prices (used by the migration that creates it).
+from datetime import date
+
+ENTRY_FIELDS = ('price_id', 'min_price', 'max_price', 'modal_price', 'price_date', 'price_day', 'last_updated')
+
+UPSERT_LATEST_PRICE_SQL = '''
+    INSERT INTO latest_prices
+    (market_id, commodity, variety, state_id, district_id, first_price_id,
+     price_id, min_price, max_price, modal_price, price_date, price_day, last_updated,
+     prev_price_id, prev_min_price, prev_max_price, prev_modal_price, prev_price_date, prev_price_day,
+     prev_last_updated, status)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        price_id = VALUES(price_id),
+        min_price = VALUES(min_price),
+        max_price = VALUES(max_price),
+        modal_price = VALUES(modal_price),
+        price_date = VALUES(price_date),
+        price_day = VALUES(price_day),
+        last_updated = VALUES(last_updated),
+        prev_price_id = VALUES(prev_price_id),
+        prev_min_price = VALUES(prev_min_price),
+        prev_max_price = VALUES(prev_max_price),
+        prev_modal_price = VALUES(prev_modal_price),
+        prev_price_date = VALUES(prev_price_date),
+        prev_price_day = VALUES(prev_price_day),
+        prev_last_updated = VALUES(prev_last_updated),
+        status = VALUES(status)
+'''
+
+REBUILD_SQL = '''
+    INSERT INTO latest_prices
+    (market_id, commodity, variety, state_id, district_id, first_price_id,
+     price_id, min_price, max_price, modal_price, price_date, price_day, last_updated,
+     prev_price_id, prev_min_price, prev_max_price, prev_modal_price, prev_price_date, prev_price_day,
+     prev_last_updated, status)
+    WITH ranked AS (
+        SELECT cp.*,
+               ROW_NUMBER() OVER w AS rn,
+               MIN(cp.id) OVER (PARTITION BY cp.market_id, cp.commodity, cp.variety) AS first_price_id
+        FROM commodity_prices cp
+        WINDOW w AS (PARTITION BY cp.market_id, cp.commodity, cp.variety
+                     ORDER BY cp.price_day DESC, cp.last_updated DESC, cp.id DESC)
+    )
+    SELECT l.market_id, l.commodity, l.variety, l.state_id, l.district_id, l.first_price_id,
+           l.id, l.min_price, l.max_price, l.modal_price, l.price_date, l.price_day, l.last_updated,
+           p.id, p.min_price, p.max_price, p.modal_price, p.price_date, p.price_day, p.last_updated,
+           CASE WHEN p.id IS NULL OR l.modal_price = p.modal_price THEN 'stable'
+                WHEN l.modal_price > p.modal_price THEN 'increase'
+                ELSE 'decrease' END
+    FROM ranked l
+    LEFT JOIN ranked p ON p.market_id = l.market_id AND p.commodity = l.commodity
+                      AND p.variety = l.variety AND p.rn = 2
+    WHERE l.rn = 1
+'''
+
+
+def price_key(market_id, commodity, variety):
+    # Mirrors the latest_prices primary key; the table collation is case-insensitive
+    return (int(market_id), commodity.lower(), variety.lower())
+
+
+def trend_status(latest, previous):
+    """'increase', 'decrease' or 'stable' from the previous to the latest modal price"""
+    if previous is None or latest['modal_price'] == previous['modal_price']:
+        return 'stable'
+    return 'increase' if latest['modal_price'] > previous['modal_price'] else 'decrease'
+
+
+def _rank(entry):
+    # Rows without a parsed date sort after every dated row, like ORDER BY price_day DESC
+    return entry['price_day'] or date.min
+
+
+def _same_row(entry, written):
+    # Same unique_price row: the market/commodity/variety match, so compare the date text
+    return entry['price_date'].lower() == written['price_date'].lower()
+
+
+def apply_written(state, written):
+    """
+    Fold a just-written price row into a {'latest', 'previous'} pair. The
+    written row has the newest last_updated, so it wins ties on price_day.
+    """
+    candidates = [
+        (entry, order) for order, entry in ((1, state['latest']), (0, state['previous']))
+        if entry is not None and not _same_row(entry, written)
+    ]
+    candidates.append((written, 2))
+    candidates.sort(key=lambda candidate: (_rank(candidate[0]), candidate[1]), reverse=True)
+    return {
+        'latest': candidates[0][0],
+        'previous': candidates[1][0] if len(candidates) > 1 else None
+    }
+
+
+def _stored_state(row):
+    latest = {field: row[field] for field in ENTRY_FIELDS}
+    previous = None
+    if row['prev_price_id'] is not None:
+        previous = {field: row[f'prev_{field}'] for field in ENTRY_FIELDS}
+    return {'latest': latest, 'previous': previous}
+
+
+def update_latest_prices(cursor, written):
+    """
+    Update latest_prices for price rows just written on this cursor's
+    transaction. Each row is a dict with state_id, district_id, market_id,
+    commodity, variety, the prices, price_date, price_day, price_id and
+    last_updated (read back after the write). Returns the (market_id,
+    commodity) pairs whose latest modal price changed, for price alerts.
+    The caller must have started the transaction (conn.begin()): the
+    stored rows are read with FOR UPDATE, so a concurrent writer for the
+    same markets waits for the commit instead of folding into stale state.
+    """
+    if not written:
+        return set()
+    market_ids = sorted({row['market_id'] for row in written})
+    # Locks the markets' rows (and the gaps where new keys would go) until commit
+    cursor.execute(
+        f"SELECT * FROM latest_prices WHERE market_id IN ({', '.join(['%s'] * len(market_ids))}) "
+        "ORDER BY market_id, commodity, variety FOR UPDATE",
+        market_ids
+    )
+    states = {}
+    # Key columns and first_price_id per key, as stored or from its first written row
+    identity = {}
+    for row in cursor.fetchall():
+        key = price_key(row['market_id'], row['commodity'], row['variety'])
+        states[key] = _stored_state(row)
+        identity[key] = row
+    stored = set(identity)
+    modal_before = {key: state['latest']['modal_price'] for key, state in states.items()}
+
+    changed = set()
+    # Oldest first, so several dates of one commodity on a page fold in order
+    for row in sorted(written, key=_rank):
+        key = price_key(row['market_id'], row['commodity'], row['variety'])
+        entry = {field: row[field] for field in ENTRY_FIELDS}
+        states[key] = apply_written(states.get(key, {'latest': None, 'previous': None}), entry)
+        if key not in stored:
+            # first_price_id is the key's oldest row (commodity list order), set once
+            first = identity.get(key)
+            if first is None or row['price_id'] < first['first_price_id']:
+                identity[key] = dict(row, first_price_id=row['price_id'])
+        changed.add(key)
+
+    records = []
+    modal_changed = set()
+    # Sorted so concurrent writers lock rows in the same order
+    for key in sorted(changed):
+        ident = identity[key]
+        latest, previous = states[key]['latest'], states[key]['previous']
+        if modal_before.get(key) != latest['modal_price']:
+            modal_changed.add((ident['market_id'], ident['commodity']))
+        previous_values = [previous[field] for field in ENTRY_FIELDS] if previous else [None] * len(ENTRY_FIELDS)
+        records.append(
+            [ident['market_id'], ident['commodity'], ident['variety'], ident['state_id'],
+             ident['district_id'], ident['first_price_id']]
+            + [latest[field] for field in ENTRY_FIELDS]
+            + previous_values
+            + [trend_status(latest, previous)]
+        )
+    cursor.executemany(UPSERT_LATEST_PRICE_SQL, records)
+    return modal_changed
+
+
+def rebuild(cursor):
+    """Recompute latest_prices from the whole price history"""
+    cursor.execute('DELETE FROM latest_prices')
+    cursor.execute(REBUILD_SQL)
+    return cursor.rowcount
@@ -0,0 +1,138 @@
+# Offline localisation of state, district, market, commodity and variety names
+#
+# Names only change when the scraper runs, so instead of translating them on
+# every Hindi/Gujarati request they are translated once by a background job
+# ('localize_names') queued after hierarchy scrapes and after yard scrapes that
+# insert rows. State/district/market translations go into name_hi/name_gu on
+# their tables; commodity and variety names, which only exist as strings on
+# the price rows, go into name_translations (the names are read from
+# latest_prices, not the whole history). Only missing names are
+# translated, so a run with nothing new does no translation at all.
+from app.data.pool import get_pool
+from app.data.response_cache import bump_hierarchy_version
+from app.jobs.queue import job_queue
+from app.log import get_logger, RunCounters
+
+logger = get_logger('localization')
+
+LANGUAGES = ('hi', 'gu')
+HIERARCHY_TABLES = ('states', 'districts', 'markets')
+PRICE_NAME_KINDS = ('commodity', 'variety')
+# Terms per call to the translation client
+TRANSLATION_CHUNK = 200
+
+
+def enqueue_localization():
+    """Queue a localisation run unless one is already queued or running"""
+    try:
+        return job_queue.submit('localize_names', {}, dedup_key='localize_names')
+    except Exception as e:
+        logger.error(f"Error queueing name localisation: {e}")
+        return None, False
+
+
+def _translate(texts, language):
+    # Imported here: API.app imports app.*, so a module-level import is circular
+    from API.app.translation_service import HybridTranslationService
+    texts = sorted(texts)
+    translations = {}
+    for start in range(0, len(texts), TRANSLATION_CHUNK):
+        translations.update(HybridTranslationService.translate_terms(texts[start:start + TRANSLATION_CHUNK], language))
+    return translations
+
+
+def _fill_missing(rows, counters, kind):
+    """Translate the missing name_hi/name_gu of rows in place; returns the rows that changed"""
+    changed = []
+    translations = {}
+    for language in LANGUAGES:
+        column = f'name_{language}'
+        missing = {row['name'] for row in rows if not row[column]}
+        translations[language] = _translate(missing, language) if missing else {}
+        counters.incr(f'{kind}_failed', len(missing) - len(translations[language]))
+    for row in rows:
+        updated = False
+        for language in LANGUAGES:
+            column = f'name_{language}'
+            if not row[column] and row['name'] in translations[language]:
+                row[column] = translations[language][row['name']]
+                updated = True
+        if updated:
+            changed.append(row)
+    counters.incr(f'{kind}_translated', len(changed))
+    return changed
+
+
+def _localize_table(conn, table, counters):
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT id, name, name_hi, name_gu FROM {table} WHERE name_hi IS NULL OR name_gu IS NULL')
+    changed = _fill_missing(cursor.fetchall(), counters, table)
+    if changed:
+        # The name guard skips rows renamed while we were translating
+        cursor.executemany(
+            f'UPDATE {table} SET name_hi = %s, name_gu = %s WHERE id = %s AND name = %s',
+            [(row['name_hi'], row['name_gu'], row['id'], row['name']) for row in changed]
+        )
+        conn.commit()
+    return len(changed)
+
+
+def _localize_price_names(conn, kind, counters):
+    cursor = conn.cursor()
+    # latest_prices has a row for every (market, commodity, variety) ever
+    # priced, so it lists every name without scanning the price history
+    cursor.execute(f'''
+        SELECT DISTINCT lp.{kind} AS name, nt.name_hi, nt.name_gu
+        FROM latest_prices lp
+        LEFT JOIN name_translations nt ON nt.kind = %s AND nt.name = lp.{kind}
+        WHERE nt.name IS NULL OR nt.name_hi IS NULL OR nt.name_gu IS NULL
+    ''', (kind,))
+    changed = _fill_missing(cursor.fetchall(), counters, kind)
+    if changed:
+        cursor.executemany('''
+            INSERT INTO name_translations (kind, name, name_hi, name_gu)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                name_hi = COALESCE(VALUES(name_hi), name_hi),
+                name_gu = COALESCE(VALUES(name_gu), name_gu)
+        ''', [(kind, row['name'], row['name_hi'], row['name_gu']) for row in changed])
+        conn.commit()
+    return len(changed)
+
+
+def localize_names(job=None):
+    """
+    Translate every state/district/market/commodity/variety name that has no
+    Hindi or Gujarati name yet. Returns per-kind counts of names translated.
+    """
+    counters = RunCounters('name_localization')
+    steps = [(table, _localize_table) for table in HIERARCHY_TABLES] + \
+            [(kind, _localize_price_names) for kind in PRICE_NAME_KINDS]
+    if job:
+        job.set_total(len(steps))
+    translated = {}
+    conn = get_pool().borrow()
+    try:
+        for kind, step in steps:
+            if job and job.cancelled:
+                break
+            try:
+                translated[kind] = step(conn, kind, counters)
+                if job:
+                    job.advance(rows=translated[kind])
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Error localising {kind} names: {e}")
+                if job:
+                    job.advance(errors=1, error=f'{kind}: {e}')
+    finally:
+        conn.close()
+
+    if any(translated.get(table) for table in HIERARCHY_TABLES):
+        bump_hierarchy_version()
+    counters.log_summary(logger)
+    return {
+        'status': 'success' if len(translated) == len(steps) else 'partial_success',
+        'translated': translated,
+        'counters': counters.snapshot()
+    }
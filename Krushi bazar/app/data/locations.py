@@ -0,0 +1,244 @@
+# In-memory state/district/market directory
+#
+# The whole hierarchy is only a few thousand rows, so it is loaded once and
+# indexed by ID, by normalised name and by URL slug. Lookups never touch the
+# database; the directory reloads itself when it is invalidated, when it is
+# older than LOCATION_DIRECTORY_TTL, or (rate limited) when a name is missing.
+import re
+import threading
+import time
+from app.config import Config
+from app.data.pool import get_pool
+from app.log import get_logger
+
+logger = get_logger('locations')
+
+
+def normalize_name(name):
+    """Key used for case and whitespace insensitive name lookups"""
+    return ' '.join(str(name).split()).lower()
+
+def slugify(name):
+    """Normalize name for URL formation, handling special characters"""
+    # Handle parentheses by replacing them with hyphens and removing extra spaces
+    # Example: "Vadodara(Baroda)" → "Vadodara-Baroda"
+    name = re.sub(r'\(([^)]*)\)', r'-\1', name)
+    # Replace spaces and special characters with hyphens
+    name = re.sub(r'[^\w\s-]', '', name)
+    name = re.sub(r'[-\s]+', '-', name)
+    # Convert to lowercase and remove leading/trailing hyphens
+    return name.lower().strip('-')
+
+def localized_names(record, prefix):
+    """
+    {'<prefix>_hi': ..., '<prefix>_gu': ...} from a record's name_hi/name_gu
+    columns, for HybridTranslationService.localize_rows
+    """
+    return {f'{prefix}_hi': record.get('name_hi'), f'{prefix}_gu': record.get('name_gu')}
+
+def _sort_key(row):
+    return row['name'].lower()
+
+
+class _Snapshot:
+    """Immutable set of indexes built from one load of the hierarchy"""
+
+    def __init__(self, states, districts, markets):
+        self.states = sorted(states, key=_sort_key)
+        self.states_by_id = {s['id']: s for s in self.states}
+        self.state_keys = {}
+        for s in self.states:
+            self.state_keys.setdefault(normalize_name(s['name']), s['id'])
+            self.state_keys.setdefault(slugify(s['name']), s['id'])
+
+        self.districts_by_id = {}
+        self.districts_by_state = {}
+        self.district_keys = {}
+        for d in sorted(districts, key=_sort_key):
+            self.districts_by_id[d['id']] = d
+            self.districts_by_state.setdefault(d['state_id'], []).append(d)
+            self.district_keys.setdefault((d['state_id'], normalize_name(d['name'])), d['id'])
+            self.district_keys.setdefault((d['state_id'], slugify(d['name'])), d['id'])
+
+        self.markets_by_id = {}
+        self.markets_by_district = {}
+        self.markets_by_state = {}
+        self.market_keys = {}
+        for m in sorted(markets, key=_sort_key):
+            self.markets_by_id[m['id']] = m
+            self.markets_by_district.setdefault(m['district_id'], []).append(m)
+            self.markets_by_state.setdefault(m['state_id'], []).append(m)
+            self.market_keys.setdefault((m['district_id'], normalize_name(m['name'])), m['id'])
+            self.market_keys.setdefault((m['district_id'], slugify(m['name'])), m['id'])
+
+
+class LocationDirectory:
+    """
+    Resolves states, districts and markets by ID, name or slug in O(1).
+    Readers use an immutable snapshot, so a reload never blocks lookups that
+    are already running.
+    """
+
+    MISS_RELOAD_INTERVAL = 60
+
+    def __init__(self, ttl=None):
+        self.ttl = Config.LOCATION_DIRECTORY_TTL if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._loaded_at = 0.0
+        self._stale = True
+        self._metrics = {'loads': 0, 'lookups': 0, 'misses': 0, 'load_errors': 0, 'last_load_ms': 0.0}
+
+    def _load(self):
+        conn = get_pool().borrow()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, name, name_hi, name_gu FROM states')
+            states = cursor.fetchall()
+            cursor.execute('SELECT id, name, name_hi, name_gu, state_id FROM districts')
+            districts = cursor.fetchall()
+            cursor.execute('SELECT id, name, name_hi, name_gu, district_id, state_id FROM markets')
+            markets = cursor.fetchall()
+        finally:
+            conn.close()
+        return _Snapshot(states, districts, markets)
+
+    def refresh(self, since=None):
+        """
+        Reload the hierarchy from the database. With `since`, skip the reload if
+        another thread already loaded a fresh snapshot after that moment.
+        """
+        with self._lock:
+            if since is not None and self._snapshot is not None and not self._stale and self._loaded_at >= since:
+                return self._snapshot
+            started = time.perf_counter()
+            try:
+                snapshot = self._load()
+            except Exception as e:
+                self._metrics['load_errors'] += 1
+                logger.error(f"Error loading location directory: {e}")
+                if self._snapshot is None:
+                    raise
+                return self._snapshot
+            self._snapshot = snapshot
+            self._loaded_at = time.monotonic()
+            self._stale = False
+            self._metrics['loads'] += 1
+            self._metrics['last_load_ms'] = round((time.perf_counter() - started) * 1000, 3)
+            logger.info('Location directory loaded', extra={
+                'states': len(snapshot.states),
+                'districts': len(snapshot.districts_by_id),
+                'markets': len(snapshot.markets_by_id),
+                'load_ms': self._metrics['last_load_ms']
+            })
+            return snapshot
+
+    def invalidate(self):
+        """Mark the directory stale; the next lookup reloads it"""
+        self._stale = True
+
+    def _current(self):
+        snapshot = self._snapshot
+        if snapshot is None or self._stale or time.monotonic() - self._loaded_at > self.ttl:
+            return self.refresh(since=time.monotonic())
+        return snapshot
+
+    def snapshot(self):
+        """
+        The current immutable snapshot. A new object after every reload, so
+        derived indexes (app/data/search_index.py) can tell when to update.
+        """
+        return self._current()
+
+    @staticmethod
+    def _find(index, keys):
+        for key in keys:
+            found = index.get(key)
+            if found is not None:
+                return found
+        return None
+
+    def _resolve(self, index_name, *keys):
+        """Look keys up in one index, reloading once on a miss if the snapshot is not fresh"""
+        found = self._find(getattr(self._current(), index_name), keys)
+        self._metrics['lookups'] += 1
+        if found is None:
+            self._metrics['misses'] += 1
+            # The hierarchy may have been updated by another process
+            if time.monotonic() - self._loaded_at > self.MISS_RELOAD_INTERVAL:
+                found = self._find(getattr(self.refresh(since=time.monotonic()), index_name), keys)
+        return found
+
+    # Name / slug → ID
+
+    def state_id(self, name):
+        return self._resolve('state_keys', normalize_name(name), slugify(name))
+
+    def district_id(self, name, state_id):
+        return self._resolve('district_keys', (state_id, normalize_name(name)), (state_id, slugify(name)))
+
+    def market_id(self, name, district_id):
+        return self._resolve('market_keys', (district_id, normalize_name(name)), (district_id, slugify(name)))
+
+    # ID → record (copies, so callers cannot corrupt the indexes)
+
+    def get_state(self, state_id):
+        state = self._resolve('states_by_id', state_id)
+        return dict(state) if state else None
+
+    def get_district(self, district_id):
+        district = self._resolve('districts_by_id', district_id)
+        return dict(district) if district else None
+
+    def get_market(self, market_id):
+        market = self._resolve('markets_by_id', market_id)
+        return dict(market) if market else None
+
+    # Listings, sorted by name like the SQL they replace
+
+    def states(self):
+        return [dict(s) for s in self._current().states]
+
+    def districts(self, state_id=None):
+        snapshot = self._current()
+        if state_id is None:
+            rows = sorted(snapshot.districts_by_id.values(), key=_sort_key)
+        else:
+            rows = snapshot.districts_by_state.get(state_id, [])
+        return [dict(d) for d in rows]
+
+    def markets(self, district_id=None, state_id=None):
+        snapshot = self._current()
+        if district_id is not None:
+            rows = snapshot.markets_by_district.get(district_id, [])
+            if state_id is not None:
+                rows = [m for m in rows if m['state_id'] == state_id]
+        elif state_id is not None:
+            rows = snapshot.markets_by_state.get(state_id, [])
+        else:
+            rows = sorted(snapshot.markets_by_id.values(), key=_sort_key)
+        return [dict(m) for m in rows]
+
+    def get_metrics(self):
+        snapshot = self._snapshot
+        metrics = dict(self._metrics)
+        metrics.update({
+            'loaded': snapshot is not None,
+            'age_seconds': round(time.monotonic() - self._loaded_at, 1) if snapshot else None,
+            'states': len(snapshot.states) if snapshot else 0,
+            'districts': len(snapshot.districts_by_id) if snapshot else 0,
+            'markets': len(snapshot.markets_by_id) if snapshot else 0
+        })
+        return metrics
+
+
+_directory = None
+_directory_lock = threading.Lock()
+
+def get_directory():
+    """Return the process-wide location directory"""
+    global _directory
+    with _directory_lock:
+        if _directory is None:
+            _directory = LocationDirectory()
+        return _directory
@@ -0,0 +1,426 @@
+# Versioned schema migrations
+#
+# Run once per process from create_app(), or on demand with
+#   python -m app.data.migrations      (or: flask --app app migrate)
+# Applied versions are recorded in the schema_migrations table, so later
+# runs only execute migrations that have not been applied yet.
+import threading
+import pymysql
+from pymysql import cursors
+from app.config import Config
+from app.data import latest_prices, stats
+from app.data.price_dates import parse_price_date
+from app.log import get_logger
+
+logger = get_logger('migrations')
+
+MIGRATIONS = []
+LOCK_NAME = 'khedutbazaar_schema_migrations'
+LOCK_TIMEOUT = 120
+# Rows per primary-key batch of the price_day backfill (migration 8)
+PRICE_DAY_BATCH = 5000
+
+_lock = threading.Lock()
+_completed = False
+
+
+class MigrationDeferred(Exception):
+    """
+    Raised by a migration whose prerequisites are missing. It is left
+    unrecorded, so the next run retries it; later migrations still run.
+    """
+
+def migration(version, description):
+    """Register a schema migration; versions must be unique and are applied in order"""
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return register
+
+
+@migration(1, 'Create states, districts, markets and commodity_prices tables')
+def create_base_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS states (
+            id INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_state_name (name)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS districts (
+            id INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            state_id INT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (state_id) REFERENCES states (id) ON DELETE CASCADE,
+            UNIQUE KEY unique_district_state (name, state_id),
+            INDEX idx_district_name (name)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS markets (
+            id INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            district_id INT NOT NULL,
+            state_id INT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (district_id) REFERENCES districts (id) ON DELETE CASCADE,
+            FOREIGN KEY (state_id) REFERENCES states (id) ON DELETE CASCADE,
+            UNIQUE KEY unique_market_district (name, district_id),
+            INDEX idx_market_name (name)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS commodity_prices (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            state_id INT NOT NULL,
+            district_id INT NOT NULL,
+            market_id INT NOT NULL,
+            commodity VARCHAR(100) NOT NULL,
+            variety VARCHAR(100) NOT NULL,
+            min_price INT NOT NULL,
+            max_price INT NOT NULL,
+            modal_price INT NOT NULL,
+            price_date VARCHAR(50) NOT NULL,
+            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (state_id) REFERENCES states (id) ON DELETE CASCADE,
+            FOREIGN KEY (district_id) REFERENCES districts (id) ON DELETE CASCADE,
+            FOREIGN KEY (market_id) REFERENCES markets (id) ON DELETE CASCADE,
+            INDEX idx_commodity_market (market_id, commodity),
+            UNIQUE KEY unique_price (state_id, district_id, market_id, commodity, variety, price_date)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    ''')
+
+
+@migration(2, 'Replace legacy state/district/market name columns on commodity_prices with IDs')
+def migrate_legacy_commodity_prices(cursor):
+    cursor.execute("SHOW COLUMNS FROM commodity_prices LIKE 'state'")
+    if not cursor.fetchone():
+        return
+    cursor.execute("SHOW COLUMNS FROM commodity_prices LIKE 'state_id'")
+    if cursor.fetchone():
+        return
+
+    logger.info("Migrating old commodity_prices table structure...")
+    cursor.execute("ALTER TABLE commodity_prices ADD COLUMN state_id INT")
+    cursor.execute("ALTER TABLE commodity_prices ADD COLUMN district_id INT")
+    cursor.execute("ALTER TABLE commodity_prices ADD COLUMN market_id INT")
+    cursor.execute("ALTER TABLE commodity_prices ADD COLUMN last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP")
+
+    # Update existing records with IDs
+    cursor.execute("""
+        UPDATE commodity_prices cp
+        JOIN states s ON LOWER(cp.state) = LOWER(s.name)
+        SET cp.state_id = s.id
+    """)
+    cursor.execute("""
+        UPDATE commodity_prices cp
+        JOIN districts d ON LOWER(cp.district) = LOWER(d.name) AND cp.state_id = d.state_id
+        SET cp.district_id = d.id
+    """)
+    cursor.execute("""
+        UPDATE commodity_prices cp
+        JOIN markets m ON LOWER(cp.market) = LOWER(m.name) AND cp.district_id = m.district_id
+        SET cp.market_id = m.id
+    """)
+
+    # Drop old unique key first to avoid conflicts
+    try:
+        cursor.execute("ALTER TABLE commodity_prices DROP INDEX unique_price")
+    except Exception:
+        pass  # Index might not exist
+
+    cursor.execute("ALTER TABLE commodity_prices DROP COLUMN state")
+    cursor.execute("ALTER TABLE commodity_prices DROP COLUMN district")
+    cursor.execute("ALTER TABLE commodity_prices DROP COLUMN market")
+
+    cursor.execute("ALTER TABLE commodity_prices ADD CONSTRAINT fk_commodity_state FOREIGN KEY (state_id) REFERENCES states (id) ON DELETE CASCADE")
+    cursor.execute("ALTER TABLE commodity_prices ADD CONSTRAINT fk_commodity_district FOREIGN KEY (district_id) REFERENCES districts (id) ON DELETE CASCADE")
+    cursor.execute("ALTER TABLE commodity_prices ADD CONSTRAINT fk_commodity_market FOREIGN KEY (market_id) REFERENCES markets (id) ON DELETE CASCADE")
+    cursor.execute("ALTER TABLE commodity_prices ADD UNIQUE KEY unique_price (state_id, district_id, market_id, commodity, variety, price_date)")
+
+
+@migration(3, 'Create page_fingerprints table for conditional price page fetches')
+def create_page_fingerprints(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS page_fingerprints (
+            url VARCHAR(500) PRIMARY KEY,
+            etag VARCHAR(255),
+            last_modified VARCHAR(64),
+            body_hash CHAR(64) NOT NULL,
+            table_hash CHAR(64),
+            checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    ''')
+
+
+@migration(4, 'Create scrape_jobs table for the background job queue')
+def create_scrape_jobs(cursor):
+    # active_key holds the dedup key while a job is queued or running and is
+    # cleared when it finishes, so the unique index only blocks live duplicates
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scrape_jobs (
+            id CHAR(32) PRIMARY KEY,
+            job_type VARCHAR(50) NOT NULL,
+            params TEXT NOT NULL,
+            dedup_key VARCHAR(191),
+            active_key VARCHAR(191),
+            status VARCHAR(20) NOT NULL DEFAULT 'queued',
+            progress_done INT NOT NULL DEFAULT 0,
+            progress_total INT,
+            rows_written INT NOT NULL DEFAULT 0,
+            error_count INT NOT NULL DEFAULT 0,
+            last_error TEXT,
+            result MEDIUMTEXT,
+            cancel_requested TINYINT(1) NOT NULL DEFAULT 0,
+            worker VARCHAR(100),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP NULL,
+            finished_at TIMESTAMP NULL,
+            heartbeat_at TIMESTAMP NULL,
+            UNIQUE KEY unique_active_job (active_key),
+            INDEX idx_job_status (status, created_at)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    ''')
+
+
+
+@migration(5, 'Add Hindi/Gujarati name columns and the name_translations table')
+def add_localized_names(cursor):
+    # Filled by the offline localisation stage (app/data/localization.py)
+    for table in ('states', 'districts', 'markets'):
+        for column in ('name_hi', 'name_gu'):
+            cursor.execute(f"SHOW COLUMNS FROM {table} LIKE '{column}'")
+            if not cursor.fetchone():
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} VARCHAR(255) NULL AFTER name")
+    # Commodity and variety names only exist as strings on commodity_prices
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS name_translations (
+            kind VARCHAR(20) NOT NULL,
+            name VARCHAR(100) NOT NULL,
+            name_hi VARCHAR(255),
+            name_gu VARCHAR(255),
+            translated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (kind, name)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    ''')
+
+
+@migration(6, 'Create cache_versions table for the hierarchy response cache')
+def create_cache_versions(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            name VARCHAR(50) PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    ''')
+    cursor.execute("INSERT IGNORE INTO cache_versions (name, version) VALUES ('hierarchy', 0)")
+
+
+@migration(7, 'Index commodity_prices by (created_at, id) for keyset pagination')
+def add_created_at_index(cursor):
+    cursor.execute("SHOW INDEX FROM commodity_prices WHERE Key_name = 'idx_created_id'")
+    if not cursor.fetchone():
+        cursor.execute('ALTER TABLE commodity_prices ADD INDEX idx_created_id (created_at, id)')
+
+
+@migration(8, 'Add typed price_day column and time-series index to commodity_prices')
+def add_price_day(cursor):
+    cursor.execute("SHOW COLUMNS FROM commodity_prices LIKE 'price_day'")
+    if not cursor.fetchone():
+        cursor.execute('ALTER TABLE commodity_prices ADD COLUMN price_day DATE NULL AFTER price_date')
+    # Year-less dates ("5 Aug") are resolved against the day the row was
+    # scraped. Rows are read in primary-key batches, parsed here and written
+    # back by id, so the backfill never scans the table once per date
+    last_id = 0
+    filled = 0
+    parsed = {}
+    unparseable = set()
+    while True:
+        cursor.execute('''
+            SELECT id, price_date, created_at FROM commodity_prices
+            WHERE id > %s AND price_day IS NULL ORDER BY id LIMIT %s
+        ''', (last_id, PRICE_DAY_BATCH))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        by_day = {}
+        for row in rows:
+            key = (row['price_date'], row['created_at'].date() if row['created_at'] else None)
+            if key not in parsed:
+                parsed[key] = parse_price_date(*key)
+            if parsed[key]:
+                by_day.setdefault(parsed[key], []).append(row['id'])
+            else:
+                unparseable.add(row['price_date'])
+        for price_day, ids in by_day.items():
+            cursor.execute(
+                f"UPDATE commodity_prices SET price_day = %s WHERE id IN ({', '.join(['%s'] * len(ids))})",
+                [price_day] + ids
+            )
+            filled += len(ids)
+    for price_date in sorted(unparseable):
+        logger.warning(f"Unparseable price_date left without price_day: {price_date!r}")
+    logger.info(f"Backfilled price_day for {filled} price row(s)")
+    cursor.execute("SHOW INDEX FROM commodity_prices WHERE Key_name = 'idx_market_commodity_day'")
+    if not cursor.fetchone():
+        cursor.execute(
+            'ALTER TABLE commodity_prices '
+            'ADD INDEX idx_market_commodity_day (market_id, commodity, variety, price_day)'
+        )
+
+
+@migration(9, 'Create latest_prices table and fill it from commodity_prices')
+def create_latest_prices(cursor):
+    # Maintained by upsert_commodity_prices (app/data/latest_prices.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS latest_prices (
+            market_id INT NOT NULL,
+            commodity VARCHAR(100) NOT NULL,
+            variety VARCHAR(100) NOT NULL,
+            state_id INT NOT NULL,
+            district_id INT NOT NULL,
+            first_price_id INT NOT NULL,
+            price_id INT NOT NULL,
+            min_price INT NOT NULL,
+            max_price INT NOT NULL,
+            modal_price INT NOT NULL,
+            price_date VARCHAR(50) NOT NULL,
+            price_day DATE NULL,
+            last_updated TIMESTAMP NULL DEFAULT NULL,
+            prev_price_id INT NULL,
+            prev_min_price INT NULL,
+            prev_max_price INT NULL,
+            prev_modal_price INT NULL,
+            prev_price_date VARCHAR(50) NULL,
+            prev_price_day DATE NULL,
+            prev_last_updated TIMESTAMP NULL DEFAULT NULL,
+            status VARCHAR(10) NOT NULL DEFAULT 'stable',
+            PRIMARY KEY (market_id, commodity, variety),
+            FOREIGN KEY (market_id) REFERENCES markets (id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    ''')
+    logger.info(f"Filled latest_prices with {latest_prices.rebuild(cursor)} row(s)")
+
+
+@migration(10, 'Create alert_notifications table for alert de-duplication')
+def create_alert_notifications(cursor):
+    # The price each alert last notified about (app/alerts/engine.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS alert_notifications (
+            alert_id INT PRIMARY KEY,
+            price_id INT NOT NULL,
+            modal_price INT NOT NULL,
+            notified_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    ''')
+
+
+@migration(11, 'Index alerts by (marketid, commodity) for event-driven evaluation')
+def add_alert_price_index(cursor):
+    # alerts (like login) is not created by these migrations; index it once it exists
+    cursor.execute("SHOW TABLES LIKE 'alerts'")
+    if not cursor.fetchone():
+        raise MigrationDeferred('alerts table not found; its (marketid, commodity) index is added on a later run')
+    cursor.execute("SHOW INDEX FROM alerts WHERE Key_name = 'idx_alert_market_commodity'")
+    if not cursor.fetchone():
+        cursor.execute('ALTER TABLE alerts ADD INDEX idx_alert_market_commodity (marketid, commodity)')
+
+
+@migration(12, 'Create table_counts summary table for database stats')
+def create_table_counts(cursor):
+    # Kept current by the write paths (app/data/stats.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS table_counts (
+            name VARCHAR(50) PRIMARY KEY,
+            row_count BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    ''')
+    stats.reconcile(cursor)
+
+
+def _connect():
+    # Connect without selecting the database so it can be created if needed
+    return pymysql.connect(
+        host=Config.DB_HOST,
+        port=Config.DB_PORT,
+        user=Config.DB_USER,
+        password=Config.DB_PASSWORD,
+        charset='utf8mb4',
+        autocommit=True,
+        cursorclass=cursors.DictCursor
+    )
+
+def get_schema_version(cursor):
+    cursor.execute('SELECT MAX(version) AS version FROM schema_migrations')
+    row = cursor.fetchone()
+    return row['version'] or 0
+
+def run_migrations(force=False):
+    """
+    Apply pending migrations and return the current schema version.
+    Only the first call in a process touches the database unless force=True;
+    a MySQL named lock keeps concurrent processes from migrating at the same time.
+    """
+    global _completed
+    with _lock:
+        if _completed and not force:
+            return None
+        conn = _connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f'CREATE DATABASE IF NOT EXISTS `{Config.DB_NAME}`')
+            cursor.execute(f'USE `{Config.DB_NAME}`')
+            cursor.execute('SELECT GET_LOCK(%s, %s) AS acquired', (LOCK_NAME, LOCK_TIMEOUT))
+            if not cursor.fetchone()['acquired']:
+                raise RuntimeError('Timed out waiting for the schema migration lock')
+            try:
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS schema_migrations (
+                        version INT PRIMARY KEY,
+                        description VARCHAR(255) NOT NULL,
+                        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+                ''')
+                cursor.execute('SELECT version FROM schema_migrations')
+                applied = {row['version'] for row in cursor.fetchall()}
+                for version, description, func in MIGRATIONS:
+                    if version in applied:
+                        continue
+                    logger.info(f"Applying migration {version}: {description}", extra={'version': version})
+                    try:
+                        func(cursor)
+                    except MigrationDeferred as e:
+                        logger.warning(f"Migration {version} deferred: {e}", extra={'version': version})
+                        continue
+                    cursor.execute(
+                        'INSERT INTO schema_migrations (version, description) VALUES (%s, %s)',
+                        (version, description)
+                    )
+                    logger.info(f"Migration {version} applied", extra={'version': version})
+                version = get_schema_version(cursor)
+            finally:
+                cursor.execute('SELECT RELEASE_LOCK(%s)', (LOCK_NAME,))
+            _completed = True
+            logger.info(f"Database schema is at version {version}", extra={'version': version})
+            return version
+        except Exception as e:
+            logger.exception(f"Error running database migrations: {e}")
+            raise
+        finally:
+            conn.close()
+
+
+if __name__ == '__main__':
+    run_migrations(force=True)
@@ -0,0 +1,306 @@
+# Shared MySQL connection pool
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import pymysql
+from pymysql import cursors
+from pymysql.constants import SERVER_STATUS
+from app.config import Config
+from app.log import get_logger
+
+logger = get_logger('pool')
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the borrow timeout"""
+
+
+class PooledConnection:
+    """
+    Wraps a pymysql connection borrowed from the pool. close() hands the
+    connection back to the pool instead of closing the socket, so existing
+    `conn = ...; try: ... finally: conn.close()` code keeps working.
+    """
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool.release(self)
+
+    def discard(self):
+        """Close the socket so close() drops the connection instead of pooling it"""
+        try:
+            self._raw.close()
+        except Exception:
+            pass
+
+
+class SharedConnection:
+    """
+    The current request's connection, lent to a helper that borrows from the
+    pool while the request holds it. close() leaves it with the request and
+    only rolls back a transaction the helper left open.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        try:
+            if self._conn.open and self._conn.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                self._conn.rollback()
+        except Exception:
+            pass
+
+    def discard(self):
+        pass
+
+
+class ConnectionPool:
+    """Thread-safe, bounded pool of pymysql connections"""
+
+    def __init__(self, connect_params, size=10, max_lifetime=3600, timeout=30, health_check_idle=5):
+        self.connect_params = connect_params
+        self.size = size
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.health_check_idle = health_check_idle
+        self._cond = threading.Condition()
+        self._idle = deque()  # (raw connection, created_at, last_used)
+        self._open = 0
+        self._in_use = 0
+        # Connection the request on this thread holds (see attach_request)
+        self._local = threading.local()
+        self._metrics = {
+            'borrows': 0,
+            'shared_borrows': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'total_wait_seconds': 0.0,
+            'max_wait_seconds': 0.0,
+            'connections_created': 0,
+            'connections_recycled': 0,
+            'health_check_failures': 0,
+            'connection_errors': 0
+        }
+
+    def _connect(self):
+        try:
+            raw = pymysql.connect(**self.connect_params, cursorclass=cursors.DictCursor)
+        except Exception as e:
+            with self._cond:
+                self._metrics['connection_errors'] += 1
+            logger.error(f"Database connection error: {e}")
+            raise
+        with self._cond:
+            self._metrics['connections_created'] += 1
+        return raw, time.monotonic()
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, raw, last_used):
+        if time.monotonic() - last_used < self.health_check_idle:
+            return True
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            with self._cond:
+                self._metrics['health_check_failures'] += 1
+            return False
+
+    def attach_request(self, conn):
+        """Lend `conn` to helpers that borrow on this thread until detach_request()"""
+        self._local.request_conn = conn
+
+    def detach_request(self):
+        self._local.request_conn = None
+
+    def _shared(self):
+        conn = getattr(self._local, 'request_conn', None)
+        if conn is None:
+            return None
+        try:
+            # A request in the middle of its own transaction keeps it to itself
+            if not conn.open or conn.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                return None
+        except Exception:
+            return None
+        with self._cond:
+            self._metrics['shared_borrows'] += 1
+        return SharedConnection(conn)
+
+    def borrow(self, timeout=None, exclusive=False):
+        """
+        Borrow a connection, waiting up to `timeout` seconds for one to be returned.
+        While a request holds a connection on this thread, helpers get that one
+        instead of a second pooled connection; `exclusive` borrowers (server-side
+        cursors, streams outliving the request) always get their own.
+        """
+        if not exclusive:
+            shared = self._shared()
+            if shared is not None:
+                return shared
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        entry = None
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._metrics['timeouts'] += 1
+                    raise PoolTimeoutError(f'No database connection available after {timeout}s')
+                waited = True
+                self._cond.wait(remaining)
+            self._in_use += 1
+            wait_seconds = time.monotonic() - started
+            self._metrics['borrows'] += 1
+            self._metrics['total_wait_seconds'] += wait_seconds
+            self._metrics['max_wait_seconds'] = max(self._metrics['max_wait_seconds'], wait_seconds)
+            if waited:
+                self._metrics['waits'] += 1
+
+        try:
+            if entry is not None:
+                raw, created_at, last_used = entry
+                if time.monotonic() - created_at > self.max_lifetime:
+                    self._discard(raw)
+                    with self._cond:
+                        self._metrics['connections_recycled'] += 1
+                    entry = None
+                elif not self._is_healthy(raw, last_used):
+                    self._discard(raw)
+                    entry = None
+            if entry is None:
+                raw, created_at = self._connect()
+            return PooledConnection(self, raw, created_at)
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn):
+        """
+        Return a borrowed connection; open transactions are rolled back and
+        connections past their max lifetime are closed
+        """
+        raw = conn._raw
+        reusable = True
+        try:
+            if raw.open and raw.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                raw.rollback()
+            reusable = raw.open
+        except Exception:
+            reusable = False
+        if reusable and time.monotonic() - conn._created_at > self.max_lifetime:
+            reusable = False
+            with self._cond:
+                self._metrics['connections_recycled'] += 1
+        if not reusable:
+            self._discard(raw)
+        with self._cond:
+            self._in_use -= 1
+            if reusable:
+                self._idle.append((raw, conn._created_at, time.monotonic()))
+            else:
+                self._open -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Borrow a connection for the duration of a with-block"""
+        conn = self.borrow(timeout)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def close_all(self):
+        """Close every idle connection"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        for raw, _, _ in idle:
+            self._discard(raw)
+
+    def get_metrics(self):
+        with self._cond:
+            metrics = dict(self._metrics)
+            metrics.update({
+                'size': self.size,
+                'open': self._open,
+                'in_use': self._in_use,
+                'idle': len(self._idle)
+            })
+        borrows = metrics['borrows']
+        metrics['avg_wait_ms'] = round(metrics['total_wait_seconds'] * 1000 / borrows, 3) if borrows else 0.0
+        metrics['total_wait_seconds'] = round(metrics['total_wait_seconds'], 3)
+        metrics['max_wait_seconds'] = round(metrics['max_wait_seconds'], 3)
+        return metrics
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """
+    Return the process-wide pool, creating it on first use (and again after a fork)
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ConnectionPool(
+                Config.get_db_connection_params(),
+                size=Config.DB_POOL_SIZE,
+                max_lifetime=Config.DB_POOL_MAX_LIFETIME,
+                timeout=Config.DB_POOL_TIMEOUT,
+                health_check_idle=Config.DB_POOL_HEALTH_CHECK_IDLE
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+def get_connection():
+    """Borrow a pooled connection; call close() on it to return it"""
+    return get_pool().borrow()
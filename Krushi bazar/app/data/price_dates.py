@@ -0,0 +1,54 @@
+# Parsing and display of commodity price dates
+#
+# Price pages show the date as text, usually without a year ("5 Aug"), and
+# that text is kept in commodity_prices.price_date (it is part of the unique
+# key). The typed price_day DATE column next to it is filled from that text
+# once, when the row is scraped, so reads can range-scan and sort by date.
+from datetime import date, datetime, timedelta
+
+# Formats seen on price pages, tried in order
+FULL_FORMATS = ('%Y-%m-%d', '%d %b %Y', '%d %B %Y', '%d-%b-%Y', '%d-%m-%Y', '%d/%m/%Y')
+YEARLESS_FORMATS = ('%d %b', '%d %B', '%d-%b')
+
+
+def parse_price_date(text, reference=None):
+    """
+    The date a price page's date text refers to, or None if it can't be
+    parsed. Dates without a year take the year that puts them on or before
+    `reference` (default today), allowing a day of clock skew.
+    """
+    if not text:
+        return None
+    text = ' '.join(text.split())
+    for fmt in FULL_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            pass
+
+    if isinstance(reference, datetime):
+        reference = reference.date()
+    reference = reference or date.today()
+    for fmt in YEARLESS_FORMATS:
+        try:
+            # Parse against a leap year so 29 Feb is accepted, then pick the year
+            parsed = datetime.strptime(f'{text} 2000', f'{fmt} %Y').date()
+        except ValueError:
+            continue
+        latest = reference + timedelta(days=1)
+        # Step back to the closest year in which the date exists (29 Feb: up to 8 years)
+        for year in range(reference.year, reference.year - 9, -1):
+            try:
+                candidate = parsed.replace(year=year)
+            except ValueError:
+                continue
+            if candidate <= latest:
+                return candidate
+        return None
+    return None
+
+def format_price_date(price_day, price_date=None):
+    """Display form of a price date ("5 Aug"); the stored text when there is no parsed date"""
+    if price_day is None:
+        return price_date
+    return f"{price_day.day} {price_day.strftime('%b')}"
@@ -0,0 +1,206 @@
+# Paged and streamed reads of commodity_prices for /api/database/yard
+#
+# Rows are ordered newest first by (created_at, id) and paged with a keyset
+# cursor: the next page starts strictly after the last row returned, so a page
+# deep into the history costs the same as the first and no OFFSET is scanned.
+# Streaming reads use an unbuffered server-side cursor (SSDictCursor) and
+# write rows as MySQL sends them, so memory stays flat whatever the result size.
+import base64
+import csv
+import io
+from datetime import datetime
+from pymysql import cursors
+from app.config import Config
+from app.data.pool import get_pool
+from app.log import get_logger
+
+logger = get_logger('price_query')
+
+# Output field -> (SQL expression, join it needs)
+FIELDS = {
+    'id': ('cp.id', None),
+    'state_name': ('s.name', 'states'),
+    'district_name': ('d.name', 'districts'),
+    'market_name': ('m.name', 'markets'),
+    'commodity': ('cp.commodity', None),
+    'variety': ('cp.variety', None),
+    'min_price': ('cp.min_price', None),
+    'max_price': ('cp.max_price', None),
+    'modal_price': ('cp.modal_price', None),
+    'price_date': ('cp.price_date', None),
+    'price_day': ('cp.price_day', None),
+    'state_id': ('cp.state_id', None),
+    'district_id': ('cp.district_id', None),
+    'market_id': ('cp.market_id', None),
+    'last_updated': ('cp.last_updated', None),
+    'created_at': ('cp.created_at', None)
+}
+JOINS = {
+    'states': 'JOIN states s ON cp.state_id = s.id',
+    'districts': 'JOIN districts d ON cp.district_id = d.id',
+    'markets': 'JOIN markets m ON cp.market_id = m.id'
+}
+# Selected under these aliases so the keyset cursor works with any projection
+CURSOR_COLUMNS = 'cp.created_at AS _cursor_created_at, cp.id AS _cursor_id'
+CURSOR_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def parse_fields(value):
+    """Requested output fields, in the order given; all fields when value is empty"""
+    if not value:
+        return list(FIELDS)
+    fields = []
+    for field in value.split(','):
+        field = field.strip()
+        if not field:
+            continue
+        if field not in FIELDS:
+            raise ValueError(f'Unknown field "{field}"; valid fields are {", ".join(FIELDS)}')
+        if field not in fields:
+            fields.append(field)
+    if not fields:
+        raise ValueError('fields must name at least one field')
+    return fields
+
+
+def parse_date(value, name):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, DATE_FORMAT).date()
+    except ValueError:
+        raise ValueError(f'Invalid {name}: must be a date in YYYY-MM-DD format')
+
+
+def parse_limit(value, default, maximum):
+    if not value:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError('Invalid limit: must be an integer')
+    if limit < 1 or (maximum and limit > maximum):
+        raise ValueError(f'Invalid limit: must be between 1 and {maximum}' if maximum else 'Invalid limit: must be positive')
+    return limit
+
+
+def encode_cursor(row):
+    """Opaque cursor pointing just after row"""
+    raw = f"{row['_cursor_created_at'].strftime(CURSOR_TIME_FORMAT)}|{row['_cursor_id']}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(value):
+    if not value:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)).decode('utf-8')
+        created_at, row_id = raw.split('|')
+        return datetime.strptime(created_at, CURSOR_TIME_FORMAT), int(row_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def build_query(fields, state_id=None, district_id=None, market_id=None,
+                from_date=None, to_date=None, after=None, limit=None):
+    """
+    SELECT for the requested fields and filters, newest first. Only the
+    location tables whose names are requested are joined. from_date/to_date
+    bound the price date (price_day), inclusive.
+    """
+    columns = [f'{FIELDS[field][0]} AS {field}' for field in fields]
+    joins = [JOINS[table] for table in JOINS if any(FIELDS[field][1] == table for field in fields)]
+    query = f"SELECT {', '.join(columns)}, {CURSOR_COLUMNS} FROM commodity_prices cp"
+    if joins:
+        query += ' ' + ' '.join(joins)
+
+    conditions = []
+    params = []
+    for column, value in (('cp.state_id', state_id), ('cp.district_id', district_id), ('cp.market_id', market_id)):
+        if value:
+            conditions.append(f'{column} = %s')
+            params.append(value)
+    if from_date:
+        conditions.append('cp.price_day >= %s')
+        params.append(from_date)
+    if to_date:
+        conditions.append('cp.price_day <= %s')
+        params.append(to_date)
+    if after:
+        created_at, row_id = after
+        conditions.append('(cp.created_at < %s OR (cp.created_at = %s AND cp.id < %s))')
+        params.extend([created_at, created_at, row_id])
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY cp.created_at DESC, cp.id DESC'
+    if limit:
+        query += ' LIMIT %s'
+        params.append(limit)
+    return query, params
+
+
+def _strip_cursor(row):
+    row.pop('_cursor_created_at', None)
+    row.pop('_cursor_id', None)
+    return row
+
+
+def fetch_page(fields, limit, **filters):
+    """One page of rows plus the cursor for the next page (None on the last page)"""
+    # Ask for one extra row to know whether another page follows
+    query, params = build_query(fields, limit=limit + 1, **filters)
+    conn = get_pool().borrow()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    finally:
+        conn.close()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return [_strip_cursor(row) for row in rows[:limit]], next_cursor
+
+
+def stream_rows(fields, limit=None, batch_size=None, **filters):
+    """
+    Yield rows from a server-side cursor, batch_size at a time. A stream that
+    is abandoned part way (client disconnect) drops its connection instead of
+    reading the rest of the result back into the pool.
+    """
+    query, params = build_query(fields, limit=limit, **filters)
+    batch_size = batch_size or Config.YARD_STREAM_BATCH
+    # Its own connection: the stream outlives the request and holds an unbuffered result
+    conn = get_pool().borrow(exclusive=True)
+    finished = False
+    try:
+        cursor = conn.cursor(cursors.SSDictCursor)
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                finished = True
+                break
+            for row in rows:
+                yield _strip_cursor(row)
+    finally:
+        if not finished:
+            logger.info('Price stream abandoned, dropping its connection')
+            conn.discard()
+        conn.close()
+
+
+def ndjson_lines(rows, dumps):
+    for row in rows:
+        yield dumps(row) + '\n'
+
+
+def csv_lines(rows, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for row in rows:
+        writer.writerow([row[field] for field in fields])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,204 @@
+# Pre-serialised responses for the state/district/market endpoints
+#
+# The hierarchy only changes when a scrape (or the localisation job) updates
+# it, so the JSON for /API/statelist, /API/districtlist, /API/marketlist and
+# /api/database/states is rendered once per (endpoint, params, language) and
+# served as bytes until the hierarchy version changes. The version is a
+# counter in the cache_versions table: writers bump it, and every worker
+# notices within RESPONSE_CACHE_VERSION_CHECK seconds and drops its cache
+# (and reloads its location directory). Responses carry an ETag, so clients
+# that send If-None-Match get an empty 304.
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from flask import Response, current_app, jsonify, request
+from app.config import Config
+from app.data.pool import get_pool
+from app.data.locations import get_directory
+from app.log import get_logger
+
+logger = get_logger('response_cache')
+
+HIERARCHY = 'hierarchy'
+
+
+class HierarchyVersion:
+    """Process-local view of the shared hierarchy version counter"""
+
+    def __init__(self, check_interval=None):
+        self.check_interval = Config.RESPONSE_CACHE_VERSION_CHECK if check_interval is None else check_interval
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self._listeners = []
+
+    @property
+    def last_seen(self):
+        """Last version read or written by this worker, without a database check"""
+        return self._version
+
+    def on_change(self, listener):
+        self._listeners.append(listener)
+
+    def _changed(self, version, force=False):
+        """Notify listeners when the version moved (always when `force`, e.g. after a bump)"""
+        previous, self._version = self._version, version
+        if force or (previous is not None and previous != version):
+            logger.info('Hierarchy version changed', extra={'previous': previous, 'version': version})
+            for listener in self._listeners:
+                listener(version)
+
+    def current(self):
+        """The hierarchy version, re-read from the database at most every check_interval seconds"""
+        if self._version is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self._version
+        with self._lock:
+            if self._version is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return self._version
+            try:
+                conn = get_pool().borrow()
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute('SELECT version FROM cache_versions WHERE name = %s', (HIERARCHY,))
+                    row = cursor.fetchone()
+                finally:
+                    conn.close()
+                self._changed(row['version'] if row else 0)
+            except Exception as e:
+                logger.error(f"Error reading hierarchy version: {e}")
+                if self._version is None:
+                    self._version = 0
+            self._checked_at = time.monotonic()
+            return self._version
+
+    def bump(self):
+        """Record a hierarchy change; this worker sees it at once, the others within check_interval"""
+        with self._lock:
+            try:
+                conn = get_pool().borrow()
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute(
+                        'INSERT INTO cache_versions (name, version) VALUES (%s, 1) '
+                        'ON DUPLICATE KEY UPDATE version = version + 1',
+                        (HIERARCHY,)
+                    )
+                    cursor.execute('SELECT version FROM cache_versions WHERE name = %s', (HIERARCHY,))
+                    version = cursor.fetchone()['version']
+                    conn.commit()
+                finally:
+                    conn.close()
+            except Exception as e:
+                logger.error(f"Error bumping hierarchy version: {e}")
+                # Still drop this worker's cached responses
+                version = (self._version or 0) + 1
+            # A worker that never read the version has no previous one to
+            # compare with, but its directory and cache are stale all the same
+            self._changed(version, force=True)
+            self._checked_at = time.monotonic()
+            return version
+
+
+class ResponseCache:
+    """LRU of serialised JSON responses, valid for one hierarchy version"""
+
+    def __init__(self, version, max_entries=None, fallback_ttl=None):
+        self.version = version
+        self.max_entries = Config.RESPONSE_CACHE_SIZE if max_entries is None else max_entries
+        self.fallback_ttl = Config.RESPONSE_CACHE_FALLBACK_TTL if fallback_ttl is None else fallback_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = {
+            'hits': 0, 'misses': 0, 'not_modified': 0, 'invalidations': 0, 'evictions': 0, 'partial_renders': 0,
+            'bytes_served_from_cache': 0, 'bytes_saved_by_304': 0, 'bytes_rendered': 0
+        }
+        version.on_change(lambda _: self.clear())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._metrics['invalidations'] += 1
+
+    def _get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry['version'] != version:
+                return None
+            if entry['expires'] is not None and time.monotonic() >= entry['expires']:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._metrics['evictions'] += 1
+
+    def _count(self, **amounts):
+        with self._lock:
+            for key, amount in amounts.items():
+                self._metrics[key] += amount
+
+    def respond(self, endpoint, params, render):
+        """
+        Serve endpoint+params from the cache, rendering on a miss. render()
+        returns (payload, status); only 200 responses are cached. A render
+        in which some names fell back to English (translation timeout or
+        Google failure) is kept for fallback_ttl seconds only.
+        """
+        # Imported here: API.app imports app.*, so a module-level import is circular
+        from API.app.translation_service import HybridTranslationService
+        version = self.version.current()
+        key = (endpoint,) + tuple(params)
+        entry = self._get(key, version)
+        if entry is None:
+            fallbacks = HybridTranslationService.fallback_count()
+            payload, status = render()
+            if status != 200:
+                return jsonify(payload), status
+            partial = HybridTranslationService.fallback_count() != fallbacks
+            body = current_app.json.dumps(payload).encode('utf-8')
+            entry = {
+                'body': body, 'etag': hashlib.sha1(body).hexdigest(), 'version': version,
+                'expires': time.monotonic() + self.fallback_ttl if partial else None
+            }
+            self._put(key, entry)
+            self._count(misses=1, bytes_rendered=len(body), partial_renders=int(partial))
+        else:
+            self._count(hits=1, bytes_served_from_cache=len(entry['body']))
+
+        if entry['etag'] in request.if_none_match:
+            self._count(not_modified=1, bytes_saved_by_304=len(entry['body']))
+            response = Response(status=304)
+        else:
+            response = Response(entry['body'], mimetype='application/json')
+        response.set_etag(entry['etag'])
+        # Clients may reuse the body but must revalidate it with If-None-Match
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['entries'] = len(self._entries)
+        lookups = metrics['hits'] + metrics['misses']
+        metrics['hit_ratio'] = round(metrics['hits'] / lookups, 4) if lookups else None
+        metrics['max_entries'] = self.max_entries
+        metrics['hierarchy_version'] = self.version.last_seen
+        return metrics
+
+
+hierarchy_version = HierarchyVersion()
+# A change made by another worker also makes this worker's directory stale
+hierarchy_version.on_change(lambda _: get_directory().invalidate())
+response_cache = ResponseCache(hierarchy_version)
+
+
+def bump_hierarchy_version():
+    """Call after states, districts, markets or their localised names change"""
+    return hierarchy_version.bump()
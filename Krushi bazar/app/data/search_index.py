@@ -0,0 +1,384 @@
+# In-memory typeahead index for /api/database/search
+#
+# Location search used to run three LIKE '%q%' queries with joins. A leading
+# wildcard can't use an index, and Hindi/Gujarati input never matched because
+# names are stored in English. This index covers every state, district and
+# market of the location directory. Each one is indexed under its English
+# name, its name_hi/name_gu columns and its translations in the API/*.json
+# dictionaries, normalised (case-folded, punctuation as spaces).
+#
+# Matches are found tier by tier, best first, and the search stops as soon as
+# every kind has `limit` results:
+#   exact        the whole name
+#   name prefix  the name starts with the query
+#   word prefix  every query word starts a word of the name
+#   substring    the query occurs anywhere in the name (trigram postings;
+#                queries of 3+ characters)
+#   typo         names sharing trigrams with the query within one edit (two
+#                for 8+ characters), only when the tiers above found too few
+# Within a tier shorter names come first, then alphabetical.
+#
+# The index follows the directory: when the directory loads a new snapshot
+# (after a hierarchy change or its TTL), only the entries whose names changed
+# have their postings replaced. Queries and updates hold one lock, so a query
+# never sees postings half updated.
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from app.config import Config
+from app.data.locations import get_directory
+from app.data.response_cache import hierarchy_version
+from app.log import get_logger
+
+logger = get_logger('search_index')
+
+KINDS = ('states', 'districts', 'markets')
+# Dictionary file per kind (HybridTranslationService.JSON_FILES)
+DICTIONARY_FILES = {'states': 'states', 'districts': 'districts', 'markets': 'markets'}
+
+# Name and word prefixes are indexed up to this length; longer queries are
+# looked up by their first PREFIX_LENGTH characters and then verified
+PREFIX_LENGTH = 8
+# Typo tier: minimum query length, and candidates checked per query
+TYPO_MIN_LENGTH = 4
+TYPO_CANDIDATES = 32
+
+_SEPARATORS = re.compile(r'\s+')
+
+
+def normalize(text):
+    """
+    Search form of a name or query: NFKC, case-folded, punctuation and
+    symbols replaced by spaces. Combining marks are kept, they carry the
+    vowels of Devanagari and Gujarati words.
+    """
+    text = unicodedata.normalize('NFKC', str(text)).casefold()
+    text = ''.join(' ' if unicodedata.category(char)[0] in 'PSZ' else char for char in text)
+    return _SEPARATORS.sub(' ', text).strip()
+
+
+def trigrams(term):
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+
+def max_typos(query):
+    return 1 if len(query) < 8 else 2
+
+
+def prefix_distance(query, text, limit):
+    """
+    Smallest edit distance between query and any prefix of text, or None if
+    it is above limit
+    """
+    # A prefix longer than this is more than `limit` edits away
+    text = text[:len(query) + limit]
+    previous = list(range(len(text) + 1))
+    for i, char in enumerate(query, 1):
+        current = [i]
+        for j, other in enumerate(text, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other)))
+        if min(current) > limit:
+            return None
+        previous = current
+    best = min(previous)
+    return best if best <= limit else None
+
+
+def _script(char):
+    """Coarse script of a character: Devanagari, Gujarati or other (Latin, digits)"""
+    if '\u0900' <= char <= '\u097f':
+        return 'deva'
+    if '\u0a80' <= char <= '\u0aff':
+        return 'gujr'
+    return 'other'
+
+
+def _records(snapshot):
+    """(kind, id) -> (search result record, English name, name_hi, name_gu)"""
+    records = {}
+    for state in snapshot.states:
+        records[('states', state['id'])] = (
+            {'id': state['id'], 'name': state['name']},
+            state['name'], state.get('name_hi'), state.get('name_gu')
+        )
+    for district in snapshot.districts_by_id.values():
+        state = snapshot.states_by_id.get(district['state_id'])
+        records[('districts', district['id'])] = (
+            {'id': district['id'], 'name': district['name'], 'state_id': district['state_id'],
+             'state_name': state['name'] if state else None},
+            district['name'], district.get('name_hi'), district.get('name_gu')
+        )
+    for market in snapshot.markets_by_id.values():
+        district = snapshot.districts_by_id.get(market['district_id'])
+        state = snapshot.states_by_id.get(market['state_id'])
+        records[('markets', market['id'])] = (
+            {'id': market['id'], 'name': market['name'], 'district_id': market['district_id'],
+             'state_id': market['state_id'], 'district_name': district['name'] if district else None,
+             'state_name': state['name'] if state else None},
+            market['name'], market.get('name_hi'), market.get('name_gu')
+        )
+    return records
+
+
+def _index_values(terms):
+    """(posting table attribute, values) for an entry's search terms"""
+    words = {word for term in terms for word in term.split(' ')}
+    return (
+        ('_exact', set(terms)),
+        ('_name_prefixes', {term[:length] for term in terms for length in range(1, min(len(term), PREFIX_LENGTH) + 1)}),
+        ('_word_prefixes', {word[:length] for word in words for length in range(1, min(len(word), PREFIX_LENGTH) + 1)}),
+        ('_trigrams', set().union(*(trigrams(term) for term in terms)))
+    )
+
+
+class LocationSearchIndex:
+    """Ranked prefix, substring and typo-tolerant location search over the directory snapshot"""
+
+    def __init__(self, directory=None):
+        # Anything with snapshot(); the process-wide location directory by default
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._dictionaries = None
+        # Per entry: the names its terms came from, normalised terms, their
+        # words, result record and sort key
+        self._sources = {}
+        self._terms = {}
+        self._words = {}
+        self._records = {}
+        self._order = {}
+        # Postings: value -> set of (kind, id)
+        self._exact = {}
+        self._name_prefixes = {}
+        self._word_prefixes = {}
+        self._trigrams = {}
+        self._metrics = {
+            'searches': 0, 'typo_searches': 0, 'total_search_ms': 0.0,
+            'syncs': 0, 'entries_changed': 0, 'last_sync_ms': 0.0
+        }
+
+    # Building
+
+    @staticmethod
+    def _dictionaries_index():
+        # Imported here: API.app imports app.*, so a module-level import is circular
+        from API.app.translation_service import HybridTranslationService
+        try:
+            return HybridTranslationService.get_index()
+        except Exception as e:
+            logger.warning(f"Searching without translation dictionaries: {e}")
+            return None
+
+    @staticmethod
+    def _entry_terms(kind, name, name_hi, name_gu, dictionaries):
+        names = [name, name_hi, name_gu]
+        if dictionaries is not None:
+            file_types = [DICTIONARY_FILES[kind]]
+            english = name.strip()
+            names.append(dictionaries.lookup(english, 'hi', file_types))
+            names.append(dictionaries.lookup(english, 'gu', file_types))
+        terms = []
+        for text in names:
+            term = normalize(text) if text else ''
+            if term and term not in terms:
+                terms.append(term)
+        return tuple(terms)
+
+    def _postings(self, key, terms, add):
+        for attribute, values in _index_values(terms):
+            table = getattr(self, attribute)
+            for value in values:
+                if add:
+                    table.setdefault(value, set()).add(key)
+                else:
+                    keys = table.get(value)
+                    if keys is not None:
+                        keys.discard(key)
+                        if not keys:
+                            del table[value]
+
+    def sync(self, snapshot, dictionaries=None):
+        """
+        Bring the index in line with a directory snapshot. Entries whose
+        search terms are unchanged keep their postings. Returns how many
+        entries were added, removed or re-indexed.
+        """
+        started = time.perf_counter()
+        records = _records(snapshot)
+        # Terms are worked out before taking the lock, and only for entries whose
+        # names (or the dictionaries) changed; postings are touched under it
+        sources = {key: (name, name_hi, name_gu, id(dictionaries)) for key, (_, name, name_hi, name_gu) in records.items()}
+        terms_by_key = {}
+        for key, source in sources.items():
+            terms = self._terms.get(key) if self._sources.get(key) == source else None
+            if terms is None:
+                terms = self._entry_terms(key[0], source[0], source[1], source[2], dictionaries)
+            terms_by_key[key] = terms
+        with self._lock:
+            changed = 0
+            for key in self._terms.keys() - terms_by_key.keys():
+                self._postings(key, self._terms.pop(key), add=False)
+                del self._words[key]
+                changed += 1
+            for key, terms in terms_by_key.items():
+                old = self._terms.get(key)
+                if old == terms:
+                    continue
+                if old is not None:
+                    self._postings(key, old, add=False)
+                self._postings(key, terms, add=True)
+                self._terms[key] = terms
+                self._words[key] = tuple({word for term in terms for word in term.split(' ')})
+                changed += 1
+            # Parent names can change without the entry's own terms changing
+            self._records = {key: value[0] for key, value in records.items()}
+            self._order = {key: (len(value[1]), value[1].lower()) for key, value in records.items()}
+            self._sources = sources
+            self._snapshot = snapshot
+            self._dictionaries = dictionaries
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 3)
+            self._metrics['syncs'] += 1
+            self._metrics['entries_changed'] += changed
+            self._metrics['last_sync_ms'] = elapsed_ms
+        logger.info('Search index synced', extra={
+            'entries': len(records), 'changed': changed, 'sync_ms': elapsed_ms
+        })
+        return changed
+
+    def _refresh(self):
+        if self._directory is None:
+            # Notice hierarchy changes made by other workers (rate limited)
+            hierarchy_version.current()
+        snapshot = (self._directory or get_directory()).snapshot()
+        if snapshot is not self._snapshot:
+            dictionaries = self._dictionaries or self._dictionaries_index()
+            self.sync(snapshot, dictionaries)
+
+    # Searching
+
+    @staticmethod
+    def _intersect(postings):
+        if not postings or not all(postings):
+            return set()
+        postings = sorted(postings, key=len)
+        return postings[0].intersection(*postings[1:])
+
+    def _exact_matches(self, query, words):
+        return self._exact.get(query, ())
+
+    def _name_prefix_matches(self, query, words):
+        keys = self._name_prefixes.get(query[:PREFIX_LENGTH], ())
+        if len(query) <= PREFIX_LENGTH:
+            return keys
+        return [key for key in keys if any(term.startswith(query) for term in self._terms[key])]
+
+    def _word_prefix_matches(self, query, words):
+        keys = self._intersect([self._word_prefixes.get(word[:PREFIX_LENGTH]) for word in words])
+        if len(words) == 1 and len(query) <= PREFIX_LENGTH:
+            return keys
+        return [
+            key for key in keys
+            if all(any(word.startswith(query_word) for word in self._words[key]) for query_word in words)
+        ]
+
+    def _substring_matches(self, query, words):
+        keys = self._intersect([self._trigrams.get(gram) for gram in trigrams(query)])
+        if len(query) == 3:
+            return keys
+        return [key for key in keys if any(query in term for term in self._terms[key])]
+
+    def _typo_matches(self, query, seen):
+        """{key: edit distance} for entries within max_typos of the query"""
+        limit = max_typos(query)
+        grams = trigrams(query)
+        # Each typo breaks at most three of the query's trigrams
+        needed = max(1, len(grams) - 3 * limit)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._trigrams.get(gram, ()))
+        script = _script(query[0])
+        matches = {}
+        checked = 0
+        for key, count in shared.most_common(TYPO_CANDIDATES + len(seen)):
+            if count < needed or checked >= TYPO_CANDIDATES:
+                break
+            if key in seen:
+                continue
+            checked += 1
+            best = None
+            for term in self._terms[key]:
+                # An English query is not compared with the Hindi/Gujarati names
+                if _script(term[0]) != script:
+                    continue
+                words = term.split(' ')
+                # The whole name, and the name from each later word on
+                for start in range(len(words)):
+                    distance = prefix_distance(query, ' '.join(words[start:]), limit)
+                    if distance is not None and (best is None or distance < best):
+                        best = distance
+            if best is not None:
+                matches[key] = best
+        return matches
+
+    def _take(self, results, keys, limit, seen, rank=None):
+        """Add the best unseen keys of one tier to results, up to limit per kind"""
+        order = self._order
+        sort_key = (lambda key: (rank[key], order[key])) if rank else order.__getitem__
+        by_kind = {}
+        for key in keys:
+            if key not in seen:
+                by_kind.setdefault(key[0], []).append(key)
+        for kind, kind_keys in by_kind.items():
+            room = limit - len(results[kind])
+            if room > 0:
+                results[kind].extend(dict(self._records[key]) for key in heapq.nsmallest(room, kind_keys, key=sort_key))
+        seen.update(keys)
+
+    def search(self, query, limit=None):
+        """
+        Ranked matches for query as {'states': [...], 'districts': [...],
+        'markets': [...]}, at most `limit` (default SEARCH_RESULT_LIMIT) of each
+        """
+        limit = limit or Config.SEARCH_RESULT_LIMIT
+        self._refresh()
+        started = time.perf_counter()
+        query = normalize(query)
+        words = query.split(' ')
+        results = {kind: [] for kind in KINDS}
+        with self._lock:
+            if query:
+                seen = set()
+                tiers = [self._exact_matches, self._name_prefix_matches, self._word_prefix_matches]
+                if len(query) >= 3:
+                    tiers.append(self._substring_matches)
+                for tier in tiers:
+                    self._take(results, tier(query, words), limit, seen)
+                    if all(len(rows) >= limit for rows in results.values()):
+                        break
+                if sum(len(rows) for rows in results.values()) < limit and len(query) >= TYPO_MIN_LENGTH:
+                    matches = self._typo_matches(query, seen)
+                    self._take(results, matches, limit, seen, rank=matches)
+                    self._metrics['typo_searches'] += 1
+            self._metrics['searches'] += 1
+            self._metrics['total_search_ms'] += (time.perf_counter() - started) * 1000
+        return results
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics.update({
+                'entries': len(self._terms),
+                'word_prefixes': len(self._word_prefixes),
+                'trigrams': len(self._trigrams),
+                'dictionaries': self._dictionaries is not None
+            })
+        searches = metrics['searches']
+        metrics['avg_search_ms'] = round(metrics['total_search_ms'] / searches, 4) if searches else 0.0
+        metrics['total_search_ms'] = round(metrics['total_search_ms'], 3)
+        return metrics
+
+
+search_index = LocationSearchIndex()
@@ -0,0 +1,107 @@
+# Row counts for /api/database/stats, the home page and scrape responses
+#
+# Counting states, districts, markets and the whole of commodity_prices with
+# COUNT(*) scans an index per table on every call. The counts are kept in the
+# table_counts summary table instead: the write paths add the rows they
+# insert inside their own transaction, and reconcile() recounts from the
+# tables after bulk deletes (which cascade) and when the table is created.
+# Readers get a per-process snapshot re-read at most every STATS_CACHE_TTL
+# seconds, so a busy stats endpoint costs one primary-key read per interval.
+import threading
+import time
+from app.config import Config
+from app.data.pool import get_pool
+from app.log import get_logger
+
+logger = get_logger('stats')
+
+# Stat name -> counted table
+COUNTED_TABLES = {
+    'states': 'states',
+    'districts': 'districts',
+    'markets': 'markets',
+    'commodities': 'commodity_prices'
+}
+
+ADD_ROWS_SQL = 'UPDATE table_counts SET row_count = row_count + %s WHERE name = %s'
+
+RECOUNT_SQL = '''
+    INSERT INTO table_counts (name, row_count)
+    SELECT %s, COUNT(*) FROM {table}
+    ON DUPLICATE KEY UPDATE row_count = VALUES(row_count)
+'''
+
+
+def empty_stats():
+    return {name: 0 for name in COUNTED_TABLES}
+
+
+def add_rows(cursor, name, count):
+    """Count `count` rows inserted into a counted table, on the writer's transaction"""
+    if count:
+        cursor.execute(ADD_ROWS_SQL, (count, name))
+
+
+def reconcile(cursor):
+    """Recount every counted table into table_counts"""
+    for name, table in COUNTED_TABLES.items():
+        cursor.execute(RECOUNT_SQL.format(table=table), (name,))
+
+
+class StatsCache:
+    """Process-local snapshot of table_counts with a short TTL"""
+
+    def __init__(self, ttl=None):
+        self.ttl = Config.STATS_CACHE_TTL if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._stats = None
+        self._loaded_at = 0.0
+        self._metrics = {'hits': 0, 'loads': 0, 'errors': 0}
+
+    def _fresh(self):
+        return self._stats is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def get(self):
+        """The current counts; a stale snapshot (or zeros) if table_counts can't be read"""
+        if self._fresh():
+            self._metrics['hits'] += 1
+            return dict(self._stats)
+        with self._lock:
+            if self._fresh():
+                self._metrics['hits'] += 1
+                return dict(self._stats)
+            try:
+                conn = get_pool().borrow()
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute('SELECT name, row_count FROM table_counts')
+                    rows = cursor.fetchall()
+                finally:
+                    conn.close()
+                stats = empty_stats()
+                stats.update({row['name']: row['row_count'] for row in rows if row['name'] in stats})
+                self._stats = stats
+                self._metrics['loads'] += 1
+            except Exception as e:
+                self._metrics['errors'] += 1
+                logger.error(f"Error getting stats: {e}")
+                if self._stats is None:
+                    self._stats = empty_stats()
+            # A failed read is retried after the TTL too, not on every call
+            self._loaded_at = time.monotonic()
+            return dict(self._stats)
+
+    def invalidate(self):
+        """Re-read on the next get(); used by this worker after bulk deletes"""
+        with self._lock:
+            self._loaded_at = 0.0
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['ttl_seconds'] = self.ttl
+            metrics['snapshot'] = dict(self._stats) if self._stats is not None else None
+        return metrics
+
+
+stats_cache = StatsCache()
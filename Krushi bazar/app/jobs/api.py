@@ -0,0 +1,105 @@
+# Background job API endpoints
+from flask import Blueprint, jsonify, request
+from datetime import datetime
+from app.jobs.queue import job_queue, ACTIVE_STATUSES, FINISHED_STATUSES
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/jobs')
+
+def job_accepted(job, created, message):
+    """
+    Response for endpoints that queue a job: 202 for a new job, 200 when an
+    identical job was already queued or running
+    """
+    return jsonify({
+        'status': 'accepted' if created else 'already_queued',
+        'message': message if created else f"An identical job is already {job['status']}",
+        'job_id': job['id'],
+        'job': job,
+        'status_url': f"/jobs/{job['id']}",
+        'timestamp': datetime.now().isoformat()
+    }), 202 if created else 200
+
+@jobs_bp.route('/', methods=['GET'])
+def list_jobs():
+    """
+    List recent jobs, optionally filtered with ?status=queued|running|succeeded|failed|cancelled
+    """
+    try:
+        status = request.args.get('status')
+        if status and status not in ACTIVE_STATUSES + FINISHED_STATUSES:
+            return jsonify({
+                'status': 'error',
+                'message': f'Unknown job status: {status}',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+        return jsonify({
+            'status': 'success',
+            'data': job_queue.list_jobs(status, limit),
+            'queue': job_queue.get_metrics(),
+            'timestamp': datetime.now().isoformat()
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Error listing jobs: {str(e)}',
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Get a job's status, progress and (once finished) result
+    """
+    try:
+        job = job_queue.get_job(job_id)
+        if not job:
+            return jsonify({
+                'status': 'error',
+                'message': f'Job {job_id} not found',
+                'timestamp': datetime.now().isoformat()
+            }), 404
+        return jsonify({
+            'status': 'success',
+            'data': job,
+            'timestamp': datetime.now().isoformat()
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Error getting job: {str(e)}',
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+@jobs_bp.route('/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """
+    Cancel a queued job, or ask a running job to stop after its current page
+    """
+    try:
+        job = job_queue.cancel(job_id)
+        if not job:
+            return jsonify({
+                'status': 'error',
+                'message': f'Job {job_id} not found',
+                'timestamp': datetime.now().isoformat()
+            }), 404
+        if job['status'] in FINISHED_STATUSES and job['status'] != 'cancelled':
+            return jsonify({
+                'status': 'error',
+                'message': f"Job {job_id} already {job['status']}",
+                'data': job,
+                'timestamp': datetime.now().isoformat()
+            }), 409
+        return jsonify({
+            'status': 'success',
+            'message': 'Job cancelled' if job['status'] == 'cancelled' else 'Cancellation requested',
+            'data': job,
+            'timestamp': datetime.now().isoformat()
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Error cancelling job: {str(e)}',
+            'timestamp': datetime.now().isoformat()
+        }), 500
@@ -0,0 +1,80 @@
+# Background job handlers
+#
+# Each handler receives the JobContext and the job's params and returns a
+# JSON-serialisable result that is stored with the job.
+from app.automated_scraper import AutomatedScraper
+from app.scraping.scraper import AgriplusScraper
+from app.data.localization import localize_names
+from app.jobs.queue import job_handler
+
+
+@job_handler('scrape_state')
+def run_state_scrape(job, params):
+    return AutomatedScraper().scrape_state_by_id(params['state_id'], force=params.get('force', False), job=job)
+
+
+@job_handler('scrape_district')
+def run_district_scrape(job, params):
+    return AutomatedScraper().scrape_district_by_id(params['district_id'], force=params.get('force', False), job=job)
+
+
+@job_handler('scrape_bulk')
+def run_bulk_scrape(job, params):
+    scraper = AutomatedScraper()
+    district_ids = params['district_ids']
+    job.set_total(len(district_ids))
+    results = []
+    for district_id in district_ids:
+        if job.cancelled:
+            break
+        try:
+            result = scraper.scrape_district_by_id(district_id, force=params.get('force', False))
+        except Exception as e:
+            result = {
+                'status': 'error',
+                'message': f'Error scraping district {district_id}: {str(e)}',
+                'district_id': district_id
+            }
+        rows = sum(r.get('rows', 0) for r in result.get('market_latencies', []))
+        failed = result['status'] == 'error'
+        job.advance(rows=rows, errors=1 if failed else 0, error=result.get('message') if failed else None)
+        results.append(result)
+
+    successful = sum(1 for r in results if r['status'] == 'success')
+    partial = sum(1 for r in results if r['status'] == 'partial_success')
+    failed = sum(1 for r in results if r['status'] == 'error')
+    return {
+        'status': 'success' if failed == 0 else 'partial_success' if successful > 0 else 'error',
+        'message': f'Bulk scraping completed: {successful} successful, {partial} partial, {failed} failed',
+        'results': results,
+        'summary': {
+            'total': len(district_ids),
+            'successful': successful,
+            'partial_success': partial,
+            'failed': failed
+        }
+    }
+
+
+@job_handler('scrape_markets')
+def run_markets_scrape(job, params):
+    scraper = AgriplusScraper()
+    state_id = params.get('state_id')
+    if state_id is None:
+        success = scraper.scrape_markets_only(job=job)
+    else:
+        success = scraper.scrape_markets_for_state(state_id, job=job)
+    if not success:
+        raise RuntimeError('Failed to scrape markets data')
+    return {
+        'status': 'success',
+        'state_id': state_id,
+        'counters': scraper.last_run,
+        'token_stats': scraper.last_report.get('token_stats'),
+        'changes': scraper.last_report
+    }
+
+
+@job_handler('localize_names')
+def run_name_localization(job, params):
+    return localize_names(job=job)
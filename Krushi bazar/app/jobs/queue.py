@@ -0,0 +1,404 @@
+# Background scrape jobs
+#
+# Jobs are rows in the scrape_jobs table, so their status survives restarts
+# and can be read from any process. Every app process runs a JobQueue: a
+# dispatcher thread claims queued jobs and runs them on a small thread pool,
+# heartbeats the ones it is running and fails jobs whose owner has died.
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import pymysql
+from app.config import Config
+from app.data.pool import get_pool
+from app.log import get_logger
+
+logger = get_logger('jobs')
+
+ACTIVE_STATUSES = ('queued', 'running')
+FINISHED_STATUSES = ('succeeded', 'failed', 'cancelled')
+
+HANDLERS = {}
+
+def _load_handlers():
+    # Handlers import the scrapers, which enqueue through this module
+    import app.jobs.handlers  # noqa: F401
+
+def job_handler(job_type):
+    """Register the function that runs jobs of `job_type`; it is called with (context, params)"""
+    def register(func):
+        HANDLERS[job_type] = func
+        return func
+    return register
+
+
+def _serialize(value):
+    return json.dumps(value, default=str)
+
+def _format_job(row, include_result=False):
+    total = row['progress_total']
+    done = row['progress_done']
+    job = {
+        'id': row['id'],
+        'type': row['job_type'],
+        'params': json.loads(row['params']),
+        'status': row['status'],
+        'progress': {
+            'done': done,
+            'total': total,
+            'percent': round(done * 100 / total, 1) if total else None
+        },
+        'rows_written': row['rows_written'],
+        'errors': row['error_count'],
+        'last_error': row['last_error'],
+        'cancel_requested': bool(row['cancel_requested']),
+        'worker': row['worker'],
+        'created_at': row['created_at'].isoformat() if row['created_at'] else None,
+        'started_at': row['started_at'].isoformat() if row['started_at'] else None,
+        'finished_at': row['finished_at'].isoformat() if row['finished_at'] else None
+    }
+    if include_result:
+        job['result'] = json.loads(row['result']) if row['result'] else None
+    return job
+
+
+class JobCancelled(Exception):
+    """Raised by JobContext.check_cancelled() once a cancel was requested"""
+
+
+class JobContext:
+    """
+    Handed to job handlers to report progress and to check for cancellation.
+    Progress is buffered and written at most once per FLUSH_INTERVAL seconds.
+    """
+
+    FLUSH_INTERVAL = 2
+
+    def __init__(self, queue, job_id):
+        self.queue = queue
+        self.job_id = job_id
+        self._lock = threading.Lock()
+        self._done = 0
+        self._total = None
+        self._rows = 0
+        self._errors = 0
+        self._last_error = None
+        self._dirty = False
+        self._last_flush = 0.0
+        self._cancelled = False
+
+    def set_total(self, total):
+        with self._lock:
+            self._total = total
+            self._dirty = True
+        self.flush(force=True)
+
+    def advance(self, done=1, rows=0, errors=0, error=None):
+        """Record finished work units, rows written and errors"""
+        with self._lock:
+            self._done += done
+            self._rows += rows or 0
+            self._errors += errors
+            if error:
+                self._last_error = str(error)[:1000]
+            self._dirty = True
+        self.flush()
+
+    def flush(self, force=False):
+        with self._lock:
+            if not self._dirty or (not force and time.monotonic() - self._last_flush < self.FLUSH_INTERVAL):
+                return
+            values = (self._done, self._total, self._rows, self._errors, self._last_error)
+            self._dirty = False
+            self._last_flush = time.monotonic()
+        cancelled = self.queue.store_progress(self.job_id, *values)
+        if cancelled:
+            self._cancelled = True
+
+    @property
+    def cancelled(self):
+        """True once a cancel was requested (checked against the database every few seconds)"""
+        if not self._cancelled and time.monotonic() - self._last_flush >= self.FLUSH_INTERVAL:
+            with self._lock:
+                self._dirty = True
+            self.flush()
+        return self._cancelled
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled()
+
+
+class JobQueue:
+    """Persistent job queue backed by the scrape_jobs table"""
+
+    def __init__(self, workers=None, poll_interval=None, stale_seconds=None):
+        self.workers = workers or Config.JOB_WORKERS
+        self.poll_interval = poll_interval or Config.JOB_POLL_INTERVAL
+        self.stale_seconds = stale_seconds or Config.JOB_STALE_SECONDS
+        self.worker_name = f"{socket.gethostname()}:{os.getpid()}"
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._running = set()
+        self._executor = None
+        self._dispatcher = None
+
+    # Submitting and inspecting jobs
+
+    def submit(self, job_type, params, dedup_key=None):
+        """
+        Queue a job and return (job, created). When a job with the same dedup
+        key is already queued or running, that job is returned instead.
+        """
+        _load_handlers()
+        if job_type not in HANDLERS:
+            raise ValueError(f'Unknown job type: {job_type}')
+        job_id = uuid.uuid4().hex
+        conn = get_pool().borrow()
+        cursor = conn.cursor()
+        try:
+            try:
+                cursor.execute('''
+                    INSERT INTO scrape_jobs (id, job_type, params, dedup_key, active_key)
+                    VALUES (%s, %s, %s, %s, %s)
+                ''', (job_id, job_type, _serialize(params), dedup_key, dedup_key))
+                conn.commit()
+                created = True
+            except pymysql.err.IntegrityError:
+                conn.rollback()
+                cursor.execute('SELECT id FROM scrape_jobs WHERE active_key = %s', (dedup_key,))
+                existing = cursor.fetchone()
+                if not existing:
+                    raise
+                job_id = existing['id']
+                created = False
+        finally:
+            conn.close()
+        if created:
+            logger.info('Job queued', extra={'job_id': job_id, 'job_type': job_type, 'params': params})
+            self._wakeup.set()
+        else:
+            logger.info('Job already active', extra={'job_id': job_id, 'job_type': job_type, 'dedup_key': dedup_key})
+        return self.get_job(job_id), created
+
+    def get_job(self, job_id, include_result=True):
+        conn = get_pool().borrow()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT * FROM scrape_jobs WHERE id = %s', (job_id,))
+            row = cursor.fetchone()
+            return _format_job(row, include_result) if row else None
+        finally:
+            conn.close()
+
+    def list_jobs(self, status=None, limit=50):
+        conn = get_pool().borrow()
+        cursor = conn.cursor()
+        try:
+            if status:
+                cursor.execute(
+                    'SELECT * FROM scrape_jobs WHERE status = %s ORDER BY created_at DESC LIMIT %s',
+                    (status, limit)
+                )
+            else:
+                cursor.execute('SELECT * FROM scrape_jobs ORDER BY created_at DESC LIMIT %s', (limit,))
+            return [_format_job(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def cancel(self, job_id):
+        """
+        Cancel a job: queued jobs are cancelled immediately, running jobs stop
+        at their next progress check. Returns the updated job or None.
+        """
+        conn = get_pool().borrow()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                UPDATE scrape_jobs
+                SET status = 'cancelled', active_key = NULL, cancel_requested = 1, finished_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND status = 'queued'
+            ''', (job_id,))
+            cursor.execute(
+                "UPDATE scrape_jobs SET cancel_requested = 1 WHERE id = %s AND status = 'running'",
+                (job_id,)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return self.get_job(job_id)
+
+    # Updates made by the worker running a job
+
+    def store_progress(self, job_id, done, total, rows, errors, last_error):
+        """Write progress and heartbeat; returns True if a cancel was requested"""
+        conn = get_pool().borrow()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                UPDATE scrape_jobs
+                SET progress_done = %s, progress_total = %s, rows_written = %s, error_count = %s,
+                    last_error = COALESCE(%s, last_error), heartbeat_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+            ''', (done, total, rows, errors, last_error, job_id))
+            cursor.execute('SELECT cancel_requested FROM scrape_jobs WHERE id = %s', (job_id,))
+            row = cursor.fetchone()
+            conn.commit()
+            return bool(row and row['cancel_requested'])
+        except Exception as e:
+            logger.error(f"Error saving progress for job {job_id}: {e}")
+            return False
+        finally:
+            conn.close()
+
+    def _finish(self, job_id, status, result=None, error=None):
+        conn = get_pool().borrow()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                UPDATE scrape_jobs
+                SET status = %s, result = %s, last_error = COALESCE(%s, last_error),
+                    active_key = NULL, finished_at = CURRENT_TIMESTAMP, heartbeat_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+            ''', (status, _serialize(result) if result is not None else None, error, job_id))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _claim_next(self):
+        conn = get_pool().borrow()
+        cursor = conn.cursor()
+        try:
+            while True:
+                cursor.execute(
+                    "SELECT id, job_type, params FROM scrape_jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                )
+                row = cursor.fetchone()
+                if not row:
+                    conn.commit()
+                    return None
+                cursor.execute('''
+                    UPDATE scrape_jobs
+                    SET status = 'running', worker = %s, started_at = CURRENT_TIMESTAMP, heartbeat_at = CURRENT_TIMESTAMP
+                    WHERE id = %s AND status = 'queued'
+                ''', (self.worker_name, row['id']))
+                conn.commit()
+                if cursor.rowcount == 1:
+                    return row
+                # Another process claimed it first
+        finally:
+            conn.close()
+
+    def _heartbeat_and_reap(self):
+        with self._lock:
+            running = list(self._running)
+        conn = get_pool().borrow()
+        cursor = conn.cursor()
+        try:
+            if running:
+                placeholders = ', '.join(['%s'] * len(running))
+                cursor.execute(
+                    f'UPDATE scrape_jobs SET heartbeat_at = CURRENT_TIMESTAMP WHERE id IN ({placeholders})',
+                    running
+                )
+            # Jobs whose process died without finishing them
+            cursor.execute('''
+                UPDATE scrape_jobs
+                SET status = 'failed', active_key = NULL, finished_at = CURRENT_TIMESTAMP,
+                    last_error = 'Worker stopped responding'
+                WHERE status = 'running' AND heartbeat_at < NOW() - INTERVAL %s SECOND
+            ''', (self.stale_seconds,))
+            if cursor.rowcount:
+                logger.warning(f"Marked {cursor.rowcount} stale job(s) as failed")
+            conn.commit()
+        finally:
+            conn.close()
+
+    # Running jobs
+
+    def _execute(self, row):
+        job_id = row['id']
+        context = JobContext(self, job_id)
+        started = time.perf_counter()
+        logger.info('Job started', extra={'job_id': job_id, 'job_type': row['job_type']})
+        try:
+            result = HANDLERS[row['job_type']](context, json.loads(row['params']))
+            context.flush(force=True)
+            status = 'cancelled' if context.cancelled else 'succeeded'
+            self._finish(job_id, status, result)
+        except JobCancelled:
+            context.flush(force=True)
+            self._finish(job_id, 'cancelled')
+            status = 'cancelled'
+        except Exception as e:
+            logger.exception(f"Job {job_id} failed: {e}")
+            context.flush(force=True)
+            self._finish(job_id, 'failed', error=str(e)[:1000])
+            status = 'failed'
+        finally:
+            with self._lock:
+                self._running.discard(job_id)
+            self._wakeup.set()
+        logger.info(f'Job {status}', extra={
+            'job_id': job_id, 'job_type': row['job_type'], 'status': status,
+            'elapsed_seconds': round(time.perf_counter() - started, 3)
+        })
+
+    def _dispatch_loop(self):
+        last_housekeeping = 0.0
+        while not self._stopping.is_set():
+            try:
+                if time.monotonic() - last_housekeeping >= self.poll_interval:
+                    self._heartbeat_and_reap()
+                    last_housekeeping = time.monotonic()
+                while True:
+                    with self._lock:
+                        if len(self._running) >= self.workers:
+                            break
+                    row = self._claim_next()
+                    if not row:
+                        break
+                    with self._lock:
+                        self._running.add(row['id'])
+                    self._executor.submit(self._execute, row)
+            except Exception as e:
+                logger.exception(f"Job dispatcher error: {e}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def start(self):
+        """Start the dispatcher and worker threads (idempotent)"""
+        with self._lock:
+            if self._dispatcher and self._dispatcher.is_alive():
+                return False
+            _load_handlers()
+            self._stopping.clear()
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job-worker')
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name='job-dispatcher', daemon=True)
+            self._dispatcher.start()
+        logger.info('Job queue started', extra={'workers': self.workers, 'worker': self.worker_name})
+        return True
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+    def get_metrics(self):
+        with self._lock:
+            running = len(self._running)
+        return {
+            'worker': self.worker_name,
+            'workers': self.workers,
+            'running_here': running,
+            'dispatcher_alive': bool(self._dispatcher and self._dispatcher.is_alive())
+        }
+
+
+# Global job queue instance
+job_queue = JobQueue()
@@ -0,0 +1,169 @@
+# Structured logging
+#
+# Log records are put on an in-memory queue by the calling thread and written
+# by a single background listener, so a slow stdout or log file never blocks
+# scraping. A forked process starts its own listener. Output is one JSON object per line (LOG_FORMAT=json, the default)
+# or a readable text line (LOG_FORMAT=text). Extra fields passed with
+# `extra={...}` end up as top-level keys of the JSON object.
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from app.config import Config
+
+ROOT_LOGGER = 'khedutbazaar'
+
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+_listener = None
+_configure_lock = threading.Lock()
+
+
+def _extra_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _STANDARD_ATTRS}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'msg': record.getMessage()
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s [%(levelname)s] %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        return line
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Renders the message and traceback in the calling thread (the arguments may
+    change later) but leaves formatting to the listener thread
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(level=None, fmt=None, log_file=None):
+    """
+    Install the queue handler and start the listener; later calls are no-ops
+    """
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return
+        level = (level or Config.LOG_LEVEL).upper()
+        formatter = TextFormatter() if (fmt or Config.LOG_FORMAT) == 'text' else JsonFormatter()
+        handlers = [logging.StreamHandler(sys.stdout)]
+        log_file = log_file if log_file is not None else Config.LOG_FILE
+        if log_file:
+            handlers.append(logging.handlers.WatchedFileHandler(log_file, encoding='utf-8'))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(level)
+        root.addHandler(_QueueHandler(log_queue))
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_stop_listener)
+
+def _stop_listener():
+    # The listener of this process, which is a new one after a fork
+    if _listener is not None:
+        _listener.stop()
+
+def _restart_after_fork():
+    """
+    The listener thread does not survive a fork, so records a forked child
+    logs would pile up on a queue nobody drains: give the child its own
+    queue and listener
+    """
+    global _listener, _configure_lock
+    _configure_lock = threading.Lock()
+    if _listener is None:
+        return
+    log_queue = queue.SimpleQueue()
+    for handler in logging.getLogger(ROOT_LOGGER).handlers:
+        if isinstance(handler, _QueueHandler):
+            handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+os.register_at_fork(after_in_child=_restart_after_fork)
+
+def get_logger(name):
+    """Logger under the app's root logger, e.g. get_logger('scraper')"""
+    configure_logging()
+    return logging.getLogger(f'{ROOT_LOGGER}.{name}')
+
+
+class RunCounters:
+    """
+    Thread-safe counters for one scrape run, logged once as a summary instead
+    of one line per row or page
+    """
+
+    def __init__(self, name, **fields):
+        self.name = name
+        self.fields = fields
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._started = time.perf_counter()
+
+    def incr(self, key, amount=1):
+        if amount:
+            with self._lock:
+                self._counts[key] += amount
+
+    def update(self, counts):
+        with self._lock:
+            for key, amount in counts.items():
+                if amount:
+                    self._counts[key] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def log_summary(self, logger, level=logging.INFO):
+        counters = self.snapshot()
+        logger.log(level, f'{self.name} finished', extra={
+            'run': self.name,
+            **self.fields,
+            'counters': counters,
+            'elapsed_seconds': round(time.perf_counter() - self._started, 3)
+        })
+        return counters
@@ -3,10 +3,11 @@ import schedule
 import time
 import json
 import os
-import traceback
-from datetime import datetime
 from threading import Thread
 from app.automated_scraper import AutomatedScraper
+from app.log import get_logger
+
+logger = get_logger('scheduler')
 
 class ScrapingScheduler:
     def __init__(self, config_file='scraping_config.json'):
@@ -23,7 +24,7 @@ class ScrapingScheduler:
             if os.path.exists(self.config_file):
                 with open(self.config_file, 'r') as f:
                     config = json.load(f)
-                print(f"[INFO] Loaded configuration from {self.config_file}")
+                logger.info(f"Loaded configuration from {self.config_file}")
                 return config
             else:
                 # Create default configuration
@@ -32,15 +33,17 @@ class ScrapingScheduler:
                     "schedule_time": "21:00",  # 9 PM
                     "states_to_scrape": [],
                     "delay_between_requests": 3,
+                    "max_workers": 4,
+                    "per_host_limit": 2,
                     "max_retries": 3,
                     "log_file": "scraping_scheduler.log",
                     "description": "Only add state IDs here. The system will automatically get all districts for each state and scrape commodity data."
                 }
                 self.save_config(default_config)
-                print(f"[INFO] Created default configuration file: {self.config_file}")
+                logger.info(f"Created default configuration file: {self.config_file}")
                 return default_config
         except Exception as e:
-            print(f"[ERROR] Error loading configuration: {e}")
+            logger.error(f"Error loading configuration: {e}")
             return None
     
     def save_config(self, config):
@@ -50,9 +53,9 @@ class ScrapingScheduler:
         try:
             with open(self.config_file, 'w') as f:
                 json.dump(config, f, indent=2)
-            print(f"[INFO] Configuration saved to {self.config_file}")
+            logger.info(f"Configuration saved to {self.config_file}")
         except Exception as e:
-            print(f"[ERROR] Error saving configuration: {e}")
+            logger.error(f"Error saving configuration: {e}")
     
     def add_state_to_schedule(self, state_id):
         """
@@ -62,7 +65,7 @@ class ScrapingScheduler:
         if config and state_id not in config.get('states_to_scrape', []):
             config.setdefault('states_to_scrape', []).append(state_id)
             self.save_config(config)
-            print(f"[INFO] Added state ID {state_id} to scheduled scraping")
+            logger.info(f"Added state ID {state_id} to scheduled scraping")
             return True
         return False
     
@@ -74,7 +77,7 @@ class ScrapingScheduler:
         if config and state_id in config.get('states_to_scrape', []):
             config['states_to_scrape'].remove(state_id)
             self.save_config(config)
-            print(f"[INFO] Removed state ID {state_id} from scheduled scraping")
+            logger.info(f"Removed state ID {state_id} from scheduled scraping")
             return True
         return False
     
@@ -93,49 +96,49 @@ class ScrapingScheduler:
     
     def run_scheduled_scraping(self):
         """
-        Run the scheduled scraping tasks - only for states
+        Queue the scheduled scraping tasks - one background job per state.
+        Returns the queued jobs; states that already have an active job are
+        not queued twice.
         """
+        jobs = []
         try:
-            print(f"[INFO] Starting scheduled scraping at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            logger.info("Starting scheduled scraping")
             
             config = self.load_config()
             if not config or not config.get('enabled', True):
-                print("[INFO] Scheduled scraping is disabled")
-                return
+                logger.info("Scheduled scraping is disabled")
+                return jobs
             
             # Scrape states (this will automatically get all districts for each state)
             states_to_scrape = config.get('states_to_scrape', [])
             for state_id in states_to_scrape:
                 try:
-                    print(f"[INFO] Scraping state ID: {state_id}")
-                    result = self.scraper.scrape_state_by_id(state_id)
-                    print(f"[INFO] State scraping result: {result['status']}")
-                    
-                    # Add delay between requests
-                    time.sleep(config.get('delay_between_requests', 3))
-                    
+                    job, created = self.scraper.enqueue_state(state_id)
+                    logger.info('Scheduled state scrape', extra={
+                        'state_id': state_id, 'job_id': job['id'], 'job_status': job['status'], 'created': created
+                    })
+                    jobs.append(job)
                 except Exception as e:
-                    print(f"[ERROR] Error scraping state {state_id}: {e}")
-                    traceback.print_exc()
+                    logger.exception(f"Error queueing scrape of state {state_id}: {e}")
                     continue
             
-            print(f"[INFO] Completed scheduled scraping at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            logger.info('Queued scheduled scraping', extra={'jobs': len(jobs)})
             
         except Exception as e:
-            print(f"[ERROR] Error in scheduled scraping: {e}")
-            traceback.print_exc()
+            logger.exception(f"Error in scheduled scraping: {e}")
+        return jobs
     
     def start_scheduler(self):
         """
         Start the scheduler in a separate thread
         """
         if self.is_running:
-            print("[WARNING] Scheduler is already running")
+            logger.warning("Scheduler is already running")
             return False
         
         config = self.load_config()
         if not config or not config.get('enabled', True):
-            print("[INFO] Scheduler is disabled in configuration")
+            logger.info("Scheduler is disabled in configuration")
             return False
         
         schedule_time = config.get('schedule_time', '21:00')
@@ -143,8 +146,8 @@ class ScrapingScheduler:
         # Schedule the job
         schedule.every().day.at(schedule_time).do(self.run_scheduled_scraping)
         
-        print(f"[INFO] Scheduler started - will run daily at {schedule_time}")
-        print(f"[INFO] Scheduled items: {self.get_scheduled_items()}")
+        logger.info(f"Scheduler started - will run daily at {schedule_time}")
+        logger.info(f"Scheduled items: {self.get_scheduled_items()}")
         
         self.is_running = True
         
@@ -164,12 +167,12 @@ class ScrapingScheduler:
         Stop the scheduler
         """
         if not self.is_running:
-            print("[WARNING] Scheduler is not running")
+            logger.warning("Scheduler is not running")
             return False
         
         self.is_running = False
         schedule.clear()
-        print("[INFO] Scheduler stopped")
+        logger.info("Scheduler stopped")
         return True
     
     def get_scheduler_status(self):
@@ -187,10 +190,10 @@ class ScrapingScheduler:
     
     def run_now(self):
         """
-        Run scheduled scraping immediately
+        Queue scheduled scraping immediately, returns the queued jobs
         """
-        print("[INFO] Running scheduled scraping immediately...")
-        self.run_scheduled_scraping()
+        logger.info("Running scheduled scraping immediately...")
+        return self.run_scheduled_scraping()
 
 # Global scheduler instance
 scheduler = ScrapingScheduler() 
\ No newline at end of file
@@ -79,15 +79,18 @@ def get_scheduler_status():
 @scheduler_bp.route('/run-now', methods=['POST'])
 def run_scheduler_now():
     """
-    Run scheduled scraping immediately
+    Queue scheduled scraping immediately, one background job per state
+    Poll /jobs/<job_id> for progress
     """
     try:
-        scheduler.run_now()
+        jobs = scheduler.run_now()
         return jsonify({
-            'status': 'success',
-            'message': 'Scheduled scraping started immediately',
+            'status': 'accepted',
+            'message': f'Scheduled scraping queued for {len(jobs)} states',
+            'job_ids': [job['id'] for job in jobs],
+            'jobs': jobs,
             'timestamp': datetime.now().isoformat()
-        }), 200
+        }), 202
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -2,6 +2,8 @@ from flask import Blueprint, jsonify
 from datetime import datetime
 from app.scraping.scraper import AgriplusScraper
 from app.data.database import Database
+from app.jobs.queue import job_queue
+from app.jobs.api import job_accepted
 
 scraping_bp = Blueprint('scraping', __name__, url_prefix='/scrape')
 
@@ -17,6 +19,7 @@ def scrape_states():
                 'status': 'success',
                 'message': 'States data scraped from website',
                 'stats': stats,
+                'changes': scraper.last_report,
                 'timestamp': datetime.now().isoformat()
             })
         else:
@@ -44,6 +47,8 @@ def scrape_districts():
                 'status': 'success',
                 'message': 'Districts data scraped for all states',
                 'stats': stats,
+                'token_stats': scraper.last_report.get('token_stats'),
+                'changes': scraper.last_report,
                 'timestamp': datetime.now().isoformat()
             })
         else:
@@ -61,24 +66,13 @@ def scrape_districts():
 
 @scraping_bp.route('/markets')
 def scrape_markets():
+    """
+    Queue a background scrape of markets for all districts
+    Returns a job ID immediately; poll /jobs/<job_id> for progress
+    """
     try:
-        scraper = AgriplusScraper()
-        success = scraper.scrape_markets_only()
-        db = Database()
-        stats = db.get_stats()
-        if success:
-            return jsonify({
-                'status': 'success',
-                'message': 'Markets data scraped for all districts',
-                'stats': stats,
-                'timestamp': datetime.now().isoformat()
-            })
-        else:
-            return jsonify({
-                'status': 'error',
-                'message': 'Failed to scrape markets data',
-                'timestamp': datetime.now().isoformat()
-            }), 500
+        job, created = job_queue.submit('scrape_markets', {}, dedup_key='scrape_markets:all')
+        return job_accepted(job, created, 'Markets scraping for all districts queued')
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -88,32 +82,23 @@ def scrape_markets():
 
 @scraping_bp.route('/markets/<int:state_id>')
 def scrape_markets_by_state(state_id):
+    """
+    Queue a background scrape of markets for one state
+    Returns a job ID immediately; poll /jobs/<job_id> for progress
+    """
     try:
-        scraper = AgriplusScraper()
-        success = scraper.scrape_markets_for_state(state_id)
-        db = Database()
-        state = db.get_state_by_id(state_id)
-        markets = db.get_markets_by_state(state_id)
-        stats = db.get_stats()
-        if success:
-            return jsonify({
-                'status': 'success',
-                'message': f'Markets data scraped for state ID {state_id}',
-                'state': state,
-                'markets_scraped': len(markets),
-                'markets': markets,
-                'stats': stats,
-                'timestamp': datetime.now().isoformat()
-            })
-        else:
+        if not Database().get_state_by_id(state_id):
             return jsonify({
                 'status': 'error',
-                'message': f'Failed to scrape markets data for state ID {state_id}',
+                'message': f'State with ID {state_id} not found in database',
                 'timestamp': datetime.now().isoformat()
-            }), 500
+            }), 404
+        job, created = job_queue.submit('scrape_markets', {'state_id': state_id},
+                                        dedup_key=f'scrape_markets:{state_id}')
+        return job_accepted(job, created, f'Markets scraping for state ID {state_id} queued')
     except Exception as e:
         return jsonify({
             'status': 'error',
             'message': str(e),
             'timestamp': datetime.now().isoformat()
-        }), 500
\ No newline at end of file
+        }), 500
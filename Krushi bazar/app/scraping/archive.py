@@ -0,0 +1,421 @@
+# Raw price page archive and offline re-parse
+#
+# With PAGE_ARCHIVE_ENABLED, every price page the scraper downloads (URL,
+# status, headers, fetch time and body) is appended to a local archive, so
+# commodity_prices can be rebuilt after a parser change without crawling
+# agriplus again:
+#   python -m app.scraping.archive reparse [--all] [--since YYYY-MM-DD] [--clear]
+#
+# The archive is a directory of append-only segments. Each record is one
+# compressed frame (zstd when the zstandard package is installed, zlib
+# otherwise) and each segment has a JSON-lines index of (url, fetch time,
+# offset, length, body hash). Every process writes its own segment, so the
+# web workers and the job workers never interleave appends. Segments are
+# read through mmap, and a body identical to the last one archived for its
+# URL is not stored again. A segment is closed after ARCHIVE_SEGMENT_MB or a
+# day; closed segments older than ARCHIVE_RETENTION_DAYS, or the oldest ones
+# beyond ARCHIVE_MAX_MB in total, are deleted.
+import argparse
+import glob
+import hashlib
+import json
+import mmap
+import os
+import threading
+import time
+import urllib.parse
+import zlib
+from datetime import datetime
+from app.config import Config
+from app.data.database import Database
+from app.data.locations import get_directory
+from app.scraping.pipeline import IngestPipeline
+from app.log import get_logger
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+logger = get_logger('archive')
+
+# Segment file extension per codec
+CODECS = {'.zst': 'zstd', '.zz': 'zlib'}
+# Extension (and so codec) of the segments this process writes
+SEGMENT_EXT = '.zst' if ZSTD_AVAILABLE else '.zz'
+
+# A segment this recently written may still be another process's open segment
+ACTIVE_SEGMENT_SECONDS = 600
+
+SEGMENT_MAX_AGE = 86400
+
+
+def _compress(codec, data):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=Config.ARCHIVE_ZSTD_LEVEL).compress(data)
+    return zlib.compress(data, 6)
+
+
+def _decompress(codec, data):
+    if codec == 'zstd':
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError('zstd segment, but the zstandard package is not installed')
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def _index_path(segment_path):
+    return os.path.splitext(segment_path)[0] + '.idx'
+
+
+class _Segment:
+    """The segment this process appends to"""
+
+    def __init__(self, directory):
+        self.codec = CODECS[SEGMENT_EXT]
+        self.created = time.time()
+        self.name = f"{time.strftime('%Y%m%d-%H%M%S', time.gmtime(self.created))}-{os.getpid()}{SEGMENT_EXT}"
+        self.path = os.path.join(directory, self.name)
+        self.data = open(self.path, 'ab')
+        self.index = open(_index_path(self.path), 'a', encoding='utf-8')
+        self.size = self.data.tell()
+
+    def append(self, frame, entry):
+        offset = self.size
+        self.data.write(frame)
+        self.data.flush()
+        self.size += len(frame)
+        # The index line is written after the frame, so every indexed record is complete
+        entry = dict(entry, offset=offset, length=len(frame))
+        self.index.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.index.flush()
+        return entry
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+
+class PageArchive:
+    """Append-only, compressed archive of fetched price pages"""
+
+    def __init__(self, path=None, enabled=None):
+        self.path = path or Config.ARCHIVE_PATH
+        self.enabled = Config.PAGE_ARCHIVE_ENABLED if enabled is None else enabled
+        self._lock = threading.Lock()
+        self._segment = None
+        self._pid = None
+        # url -> body hash of its newest archived record, loaded on first append
+        self._last_hash = None
+        self._hash_pid = None
+        self._maps = {}
+        self._metrics = {'appended': 0, 'duplicates': 0, 'bytes_in': 0, 'bytes_stored': 0,
+                         'errors': 0, 'segments_pruned': 0}
+
+    # Writing
+
+    def _open_segment(self):
+        # Called with the lock held; a forked worker opens its own segment
+        if self._segment is not None and self._pid == os.getpid():
+            too_big = self._segment.size >= Config.ARCHIVE_SEGMENT_MB * 1024 * 1024
+            if not too_big and time.time() - self._segment.created < SEGMENT_MAX_AGE:
+                return self._segment
+            self._segment.close()
+            self._segment = None
+        os.makedirs(self.path, exist_ok=True)
+        self._prune_locked()
+        self._segment = _Segment(self.path)
+        self._pid = os.getpid()
+        return self._segment
+
+    def _claim(self, url, body_hash):
+        # Called with the lock held; False when the body is already archived
+        if self._last_hash is None or self._hash_pid != os.getpid():
+            self._last_hash = {entry['url']: entry['body_hash'] for entry in self.entries()}
+            self._hash_pid = os.getpid()
+        if self._last_hash.get(url) == body_hash:
+            self._metrics['duplicates'] += 1
+            return False
+        # Claimed now, so a second fetch of the same body skips while this one compresses
+        self._last_hash[url] = body_hash
+        return True
+
+    def append(self, url, response):
+        """Archive a fetched response; returns False when disabled, a duplicate or on error"""
+        if not self.enabled:
+            return False
+        body = response.content
+        body_hash = hashlib.sha256(body).hexdigest()
+        with self._lock:
+            if not self._claim(url, body_hash):
+                return False
+        try:
+            # Compressed outside the lock, so fetch threads compress in parallel;
+            # the lock only orders the writes
+            fetched_at = time.time()
+            header = json.dumps({
+                'url': url,
+                'fetched_at': fetched_at,
+                'status_code': response.status_code,
+                'encoding': response.encoding,
+                'headers': dict(response.headers)
+            }, ensure_ascii=False).encode('utf-8')
+            frame = _compress(CODECS[SEGMENT_EXT], header + b'\n' + body)
+            with self._lock:
+                self._open_segment().append(frame, {'url': url, 'fetched_at': fetched_at, 'body_hash': body_hash})
+                self._metrics['appended'] += 1
+                self._metrics['bytes_in'] += len(body)
+                self._metrics['bytes_stored'] += len(frame)
+            return True
+        except Exception as e:
+            with self._lock:
+                self._metrics['errors'] += 1
+                if self._last_hash.get(url) == body_hash:
+                    # Not written: let the next fetch archive it
+                    del self._last_hash[url]
+            logger.error(f"Error archiving {url}: {e}")
+            return False
+
+    # Reading
+
+    def segments(self):
+        """Segment paths, oldest first"""
+        paths = []
+        for ext in CODECS:
+            paths.extend(glob.glob(os.path.join(self.path, f'*{ext}')))
+        return sorted(paths, key=os.path.basename)
+
+    def entries(self, since=None, url_prefix=None):
+        """Index entries of every segment in fetch order, each with its 'segment' path"""
+        entries = []
+        for path in self.segments():
+            try:
+                with open(_index_path(path), 'r', encoding='utf-8') as f:
+                    lines = f.readlines()
+            except FileNotFoundError:
+                continue
+            for line in lines:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # A line cut short by a crash
+                if since is not None and entry['fetched_at'] < since:
+                    continue
+                if url_prefix and not entry['url'].startswith(url_prefix):
+                    continue
+                entry['segment'] = path
+                entries.append(entry)
+        entries.sort(key=lambda entry: entry['fetched_at'])
+        return entries
+
+    def _mapped(self, path, end):
+        # Called with the lock held; re-maps a segment that has grown since it was mapped
+        mapped = self._maps.get(path)
+        if mapped is None or len(mapped) < end:
+            if mapped is not None:
+                mapped.close()
+            with open(path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[path] = mapped
+        return mapped
+
+    def read(self, entry):
+        """The archived record of an index entry: url, fetched_at, status_code, encoding, headers and body"""
+        end = entry['offset'] + entry['length']
+        with self._lock:
+            frame = self._mapped(entry['segment'], end)[entry['offset']:end]
+        header, _, body = _decompress(CODECS[os.path.splitext(entry['segment'])[1]], frame).partition(b'\n')
+        record = json.loads(header)
+        record['body'] = body
+        return record
+
+    def read_page(self, entry):
+        """An archived record as a fetched page for the ingest pipeline (never compared with fingerprints)"""
+        record = self.read(entry)
+        return {
+            'status': 'fetched',
+            'text': record['body'].decode(record.get('encoding') or 'utf-8', errors='replace'),
+            'fingerprint': None,
+            'stored': None
+        }
+
+    def close(self):
+        with self._lock:
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps = {}
+            if self._segment is not None and self._pid == os.getpid():
+                self._segment.close()
+            self._segment = None
+
+    # Retention
+
+    def _prune_locked(self):
+        now = time.time()
+        active = self._segment.path if self._segment is not None else None
+        closed = []
+        for path in self.segments():
+            if path == active:
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime < ACTIVE_SEGMENT_SECONDS:
+                continue
+            closed.append((path, stat))
+        total = sum(os.path.getsize(path) for path in self.segments() if os.path.exists(path))
+        removed = 0
+        for path, stat in closed:
+            expired = now - stat.st_mtime > Config.ARCHIVE_RETENTION_DAYS * 86400
+            if not expired and total <= Config.ARCHIVE_MAX_MB * 1024 * 1024:
+                break
+            mapped = self._maps.pop(path, None)
+            if mapped is not None:
+                mapped.close()
+            for file_path in (path, _index_path(path)):
+                try:
+                    os.remove(file_path)
+                except FileNotFoundError:
+                    pass
+            total -= stat.st_size
+            removed += 1
+        if removed:
+            self._metrics['segments_pruned'] += removed
+            logger.info('Archive segments pruned', extra={'segments': removed, 'bytes': total})
+            if self._last_hash is not None:
+                # A URL whose newest record was pruned must be archived again on its next fetch
+                self._last_hash = {entry['url']: entry['body_hash'] for entry in self.entries()}
+        return removed
+
+    def prune(self):
+        """Delete closed segments past the retention period or over the size budget"""
+        with self._lock:
+            return self._prune_locked()
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['enabled'] = self.enabled
+            metrics['codec'] = 'zstd' if ZSTD_AVAILABLE else 'zlib'
+            metrics['segment'] = self._segment.name if self._segment is not None else None
+        if metrics['bytes_stored']:
+            metrics['compression_ratio'] = round(metrics['bytes_in'] / metrics['bytes_stored'], 2)
+        return metrics
+
+
+page_archive = PageArchive()
+
+
+def page_task(entry, base_url):
+    """
+    An ingest pipeline task for an archived price page, or None if its URL
+    does not resolve to a known state/district(/market)
+    """
+    path = entry['url'][len(base_url):] if entry['url'].startswith(base_url) else None
+    slugs = [urllib.parse.unquote(part) for part in (path or '').strip('/').split('/') if part]
+    if len(slugs) not in (2, 3):
+        return None
+    directory = get_directory()
+    state_id = directory.state_id(slugs[0])
+    district_id = directory.district_id(slugs[1], state_id) if state_id else None
+    if not district_id:
+        return None
+    task = {'name': '/'.join(slugs), 'url': entry['url'], 'state_id': state_id, 'district_id': district_id,
+            'archived': entry}
+    if len(slugs) == 3:
+        task['market_id'] = directory.market_id(slugs[2], district_id)
+        if not task['market_id']:
+            return None
+    return task
+
+
+def reparse(archive=None, since=None, url_prefix=None, replay_all=False, clear=False):
+    """
+    Rebuild commodity_prices from archived pages through the ingest
+    pipeline's parse, resolve and write stages, with no network access.
+    By default only the newest record of each URL is parsed; `replay_all`
+    replays every record in rounds of one record per URL, oldest first, so
+    later pages win like they did when they were scraped.
+    """
+    # Imported here: the scraper imports this module to archive what it fetches
+    from app.scraping.scraper import AgriplusScraper
+    archive = archive or page_archive
+    started = time.perf_counter()
+    entries = archive.entries(since=since, url_prefix=url_prefix)
+    rounds = []
+    if replay_all:
+        seen = {}
+        for entry in entries:
+            generation = seen.get(entry['url'], 0)
+            seen[entry['url']] = generation + 1
+            if generation == len(rounds):
+                rounds.append([])
+            rounds[generation].append(entry)
+    else:
+        newest = {entry['url']: entry for entry in entries}
+        rounds = [list(newest.values())] if newest else []
+
+    if clear:
+        Database().clear_commodity_prices_only()
+    base_url = AgriplusScraper.BASE_URL
+    pipeline = IngestPipeline(AgriplusScraper, archive=archive)
+    report = {'records': sum(len(r) for r in rounds), 'unresolved': 0, 'pages': {}, 'rows': 0,
+              'counts': {'inserted': 0, 'updated': 0, 'unchanged': 0}}
+    for entries_round in rounds:
+        tasks = []
+        for entry in entries_round:
+            task = page_task(entry, base_url)
+            if task is None:
+                report['unresolved'] += 1
+                logger.warning(f"Archived page {entry['url']} does not match a known location")
+            else:
+                tasks.append(task)
+        results, _ = pipeline.run(tasks, force=True)
+        for result in results:
+            report['pages'][result['status']] = report['pages'].get(result['status'], 0) + 1
+            report['rows'] += result['rows']
+            for key, value in (result['counts'] or {}).items():
+                report['counts'][key] += value
+    report['rounds'] = len(rounds)
+    report['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    logger.info('Archive reparse finished', extra=report)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Raw price page archive')
+    commands = parser.add_subparsers(dest='command', required=True)
+    reparse_parser = commands.add_parser('reparse', help='rebuild commodity_prices from the archive')
+    reparse_parser.add_argument('--since', help='only pages fetched on or after this date (YYYY-MM-DD)')
+    reparse_parser.add_argument('--url-prefix', help='only pages whose URL starts with this')
+    reparse_parser.add_argument('--all', action='store_true', help='replay every archived record, not just the newest per URL')
+    reparse_parser.add_argument('--clear', action='store_true', help='delete all commodity prices first')
+    commands.add_parser('prune', help='apply the retention policy now')
+    commands.add_parser('stats', help='segments, records and sizes')
+    args = parser.parse_args()
+
+    archive = PageArchive(enabled=False)
+    if args.command == 'reparse':
+        since = datetime.strptime(args.since, '%Y-%m-%d').timestamp() if args.since else None
+        result = reparse(archive, since=since, url_prefix=args.url_prefix, replay_all=args.all, clear=args.clear)
+    elif args.command == 'prune':
+        result = {'segments_pruned': archive.prune()}
+    else:
+        entries = archive.entries()
+        segments = archive.segments()
+        result = {
+            'path': archive.path,
+            'segments': len(segments),
+            'bytes': sum(os.path.getsize(path) for path in segments),
+            'records': len(entries),
+            'urls': len({entry['url'] for entry in entries}),
+            'oldest': datetime.fromtimestamp(entries[0]['fetched_at']).isoformat() if entries else None,
+            'newest': datetime.fromtimestamp(entries[-1]['fetched_at']).isoformat() if entries else None
+        }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
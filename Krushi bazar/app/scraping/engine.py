@@ -0,0 +1,178 @@
+# Bounded-concurrency scraping engine
+import json
+import os
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from app.log import get_logger
+
+logger = get_logger('engine')
+
+DEFAULT_ENGINE_SETTINGS = {
+    'max_workers': 4,
+    'per_host_limit': 2,
+    'delay_between_requests': 3
+}
+
+def load_engine_settings(config_file='scraping_config.json'):
+    """
+    Read the engine settings from the scraping config file, falling back to defaults
+    """
+    settings = dict(DEFAULT_ENGINE_SETTINGS)
+    try:
+        if os.path.exists(config_file):
+            with open(config_file, 'r') as f:
+                config = json.load(f)
+            for key in settings:
+                if key in config:
+                    settings[key] = config[key]
+    except Exception as e:
+        logger.error(f"Error loading engine settings from {config_file}: {e}")
+    settings['max_workers'] = max(1, int(settings['max_workers']))
+    settings['per_host_limit'] = max(1, int(settings['per_host_limit']))
+    settings['delay_between_requests'] = max(0.0, float(settings['delay_between_requests']))
+    return settings
+
+
+class RateLimiter:
+    """Spaces request starts at least `interval` seconds apart across all worker threads"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        """
+        Block until the caller is allowed to start its request, returns seconds waited
+        """
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+class HostBudget:
+    """Caps the number of in-flight requests per host"""
+
+    def __init__(self, per_host_limit):
+        self.per_host_limit = per_host_limit
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    @contextmanager
+    def slot(self, url):
+        host = urllib.parse.urlsplit(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_host_limit)
+                self._semaphores[host] = semaphore
+        with semaphore:
+            yield
+
+
+_shared_limits = {}
+_shared_limits_lock = threading.Lock()
+
+def get_shared_limits(delay_between_requests, per_host_limit):
+    """
+    Return the process-wide rate limiter and host budget for these settings, so
+    engines running at the same time (e.g. two scrape jobs) share one budget
+    """
+    key = (float(delay_between_requests), int(per_host_limit))
+    with _shared_limits_lock:
+        limits = _shared_limits.get(key)
+        if limits is None:
+            limits = (RateLimiter(key[0]), HostBudget(key[1]))
+            _shared_limits[key] = limits
+        return limits
+
+
+class ScrapeEngine:
+    """
+    Runs scrape tasks on a thread pool while respecting a global request rate
+    and a per-host politeness budget. Each worker thread gets its own scraper
+    (and therefore its own HTTP session).
+    """
+
+    def __init__(self, scraper_factory, max_workers=None, per_host_limit=None, delay_between_requests=None):
+        settings = load_engine_settings()
+        self.scraper_factory = scraper_factory
+        self.max_workers = max_workers or settings['max_workers']
+        self.per_host_limit = per_host_limit or settings['per_host_limit']
+        if delay_between_requests is None:
+            delay_between_requests = settings['delay_between_requests']
+        self.rate_limiter, self.host_budget = get_shared_limits(delay_between_requests, self.per_host_limit)
+        self._local = threading.local()
+
+    def _get_scraper(self):
+        scraper = getattr(self._local, 'scraper', None)
+        if scraper is None:
+            scraper = self.scraper_factory()
+            self._local.scraper = scraper
+        return scraper
+
+    def _run_task(self, task, should_stop=None, on_result=None):
+        if should_stop and should_stop():
+            return {'name': task['name'], 'url': task['url'], 'success': False, 'status': 'cancelled',
+                    'latency_seconds': 0.0, 'wait_seconds': 0.0, 'error': None}
+        waited = 0.0
+        success = False
+        error = None
+        outcome = {}
+        started = time.perf_counter()
+        try:
+            scraper = self._get_scraper()
+            with self.host_budget.slot(task['url']):
+                waited = self.rate_limiter.wait()
+                started = time.perf_counter()
+                outcome = task['run'](scraper)
+                if isinstance(outcome, dict):
+                    success = bool(outcome.get('success'))
+                else:
+                    success = bool(outcome)
+                    outcome = {}
+        except Exception as e:
+            error = str(e)
+            logger.exception(f"Error scraping {task['name']}: {e}")
+        latency = time.perf_counter() - started
+        status = outcome.get('status', 'ok' if success else 'failed')
+        logger.debug('Task finished', extra={
+            'task': task['name'], 'status': status,
+            'latency_seconds': round(latency, 3), 'wait_seconds': round(waited, 3)
+        })
+        result = {key: value for key, value in outcome.items() if key != 'success'}
+        result.update({
+            'name': task['name'],
+            'url': task['url'],
+            'success': success,
+            'latency_seconds': round(latency, 3),
+            'wait_seconds': round(waited, 3),
+            'error': error
+        })
+        if on_result:
+            on_result(result)
+        return result
+
+    def run(self, tasks, should_stop=None, on_result=None):
+        """
+        Run tasks concurrently. Each task is a dict with 'name', 'url' and 'run',
+        where 'run' is a callable taking the worker's scraper and returning a bool
+        or a dict with a 'success' key (its other keys are copied into the result).
+        `on_result` is called with each result as soon as its task finishes; once
+        `should_stop()` returns True, tasks that have not started are skipped
+        with status 'cancelled'. Returns one result per task, in the order the
+        tasks were given.
+        """
+        if not tasks:
+            return []
+        workers = min(self.max_workers, len(tasks))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scrape-worker') as executor:
+            return list(executor.map(lambda task: self._run_task(task, should_stop, on_result), tasks))
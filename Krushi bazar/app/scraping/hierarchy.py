@@ -0,0 +1,215 @@
+# State/district/market hierarchy refresh: concurrent crawl and incremental diff
+#
+# The districts and markets scrapes used to walk every state and district one
+# request at a time, sleeping between calls, and upsert every option they saw
+# as its own transaction. The crawler fetches the option lists on the scrape
+# engine's worker threads under one request rate, compares them with the
+# hierarchy in the database and applies only what changed (adds, renames and
+# removals) in a single transaction. A refresh that finds nothing new writes
+# nothing.
+#
+# Removals only come from lists that were fetched: the children of a state
+# or district whose request failed, or whose list came back empty, are left
+# alone. A refresh that would remove more than HIERARCHY_MAX_REMOVALS
+# locations, or more than HIERARCHY_MAX_REMOVAL_RATIO of those in scope,
+# holds them all for manual review instead: a delete cascades to the price
+# history, and one truncated page should not take it with it. A location
+# that moved to another parent is reported but not moved, because its price
+# rows keep the old parent IDs.
+import threading
+import time
+from app.config import Config
+from app.data.database import Database
+from app.data.locations import get_directory
+from app.scraping.engine import ScrapeEngine
+from app.log import get_logger
+
+logger = get_logger('hierarchy')
+
+# Parent column per level; states have none
+PARENT_KEYS = {'states': None, 'districts': 'state_id', 'markets': 'district_id'}
+
+# 'held' (removals over the limit) and 'failed' (rows the database refused)
+# are filled in by HierarchyCrawler.apply()
+CHANGE_KINDS = ('added', 'renamed', 'moved', 'removed', 'held', 'failed')
+
+# Locations listed per change kind in a report (the summary counts them all)
+REPORT_LIMIT = 200
+
+
+def current_rows(snapshot, level):
+    """{id: row} of one level in a location directory snapshot"""
+    if level == 'states':
+        return {state['id']: state for state in snapshot.states}
+    return dict(snapshot.districts_by_id if level == 'districts' else snapshot.markets_by_id)
+
+
+def diff_level(level, current, fetched, scope=None):
+    """
+    Compare fetched locations with the stored ones of one level.
+    `current` is {id: row} from the database, `fetched` the rows the site
+    listed and `scope` the parent IDs whose lists were fetched (None: the
+    whole level was fetched). Returns a list per CHANGE_KINDS entry plus
+    an 'unchanged' count; renamed entries carry 'old_name', moved ones the
+    stored parent as 'old_<parent>'.
+    """
+    parent_key = PARENT_KEYS[level]
+    changes = {kind: [] for kind in CHANGE_KINDS}
+    changes['unchanged'] = 0
+    seen = {}
+    for row in fetched:
+        # A location listed twice keeps its first parent
+        seen.setdefault(row['id'], row)
+    for location_id, row in seen.items():
+        stored = current.get(location_id)
+        if stored is None:
+            changes['added'].append(row)
+            continue
+        if parent_key and stored[parent_key] != row[parent_key]:
+            changes['moved'].append(dict(row, **{f'old_{parent_key}': stored[parent_key]}))
+        if stored['name'] != row['name']:
+            changes['renamed'].append(dict(row, old_name=stored['name']))
+        elif not parent_key or stored[parent_key] == row[parent_key]:
+            changes['unchanged'] += 1
+    for location_id, stored in current.items():
+        if location_id in seen:
+            continue
+        if scope is None or stored[parent_key] in scope:
+            changes['removed'].append({'id': location_id, 'name': stored['name'],
+                                       **({parent_key: stored[parent_key]} if parent_key else {})})
+    return changes
+
+
+def removals_allowed(removed, in_scope, max_removals=None, max_ratio=None):
+    """Whether `removed` of the `in_scope` stored locations may be deleted without review"""
+    max_removals = Config.HIERARCHY_MAX_REMOVALS if max_removals is None else max_removals
+    max_ratio = Config.HIERARCHY_MAX_REMOVAL_RATIO if max_ratio is None else max_ratio
+    return removed <= max_removals and removed <= max_ratio * in_scope
+
+
+def change_report(level, changes, fetch_counts, writes, started):
+    summary = {kind: len(changes[kind]) for kind in CHANGE_KINDS}
+    summary['unchanged'] = changes['unchanged']
+    return {
+        'level': level,
+        'fetched': fetch_counts,
+        'summary': summary,
+        'changes': {kind: changes[kind][:REPORT_LIMIT] for kind in CHANGE_KINDS},
+        'writes': writes,
+        'applied': writes is not None,
+        'elapsed_seconds': round(time.perf_counter() - started, 3)
+    }
+
+
+class HierarchyCrawler:
+    """
+    Refreshes one level of the hierarchy from the site. Option lists are
+    fetched by a ScrapeEngine, so each worker thread has its own scraper
+    (and CSRF token) and requests are spaced HIERARCHY_CRAWL_INTERVAL
+    seconds apart across all workers. The workers' CSRF token stats are
+    summed into the report as 'token_stats'.
+    """
+
+    def __init__(self, scraper_factory, max_workers=None, interval=None):
+        self.scraper_factory = scraper_factory
+        self._scrapers = []
+        self._scrapers_lock = threading.Lock()
+        self.engine = ScrapeEngine(
+            self._new_scraper,
+            max_workers=max_workers or Config.HIERARCHY_CRAWL_WORKERS,
+            delay_between_requests=Config.HIERARCHY_CRAWL_INTERVAL if interval is None else interval
+        )
+        self.db = Database()
+
+    def _new_scraper(self):
+        # Kept so the per-thread scrapers' token stats can be read after the crawl
+        scraper = self.scraper_factory()
+        with self._scrapers_lock:
+            self._scrapers.append(scraper)
+        return scraper
+
+    def token_stats(self):
+        """CSRF token stats (get_token_stats) summed over every worker's scraper"""
+        totals = {}
+        with self._scrapers_lock:
+            scrapers = list(self._scrapers)
+        for scraper in scrapers:
+            for key, value in scraper.get_token_stats().items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def apply(self, level, fetched, scope=None, fetch_counts=None, started=None):
+        """Diff fetched rows against a fresh load of the hierarchy and apply the changes"""
+        started = started or time.perf_counter()
+        # Diff against the database, not a directory snapshot that may be minutes old
+        current = current_rows(get_directory().refresh(), level)
+        changes = diff_level(level, current, fetched, scope)
+        for moved in changes['moved']:
+            logger.warning(f"{level[:-1].capitalize()} {moved['name']} ({moved['id']}) moved to another parent, not applied")
+        parent_key = PARENT_KEYS[level]
+        in_scope = sum(1 for row in current.values() if scope is None or row[parent_key] in scope)
+        if changes['removed'] and not removals_allowed(len(changes['removed']), in_scope):
+            changes['held'], changes['removed'] = changes['removed'], []
+            logger.warning(
+                f"Holding {len(changes['held'])} of {in_scope} {level} removals for manual review",
+                extra={'held': changes['held'][:REPORT_LIMIT]}
+            )
+        writes = 0
+        if any(changes[kind] for kind in ('added', 'renamed', 'removed')):
+            result = self.db.apply_hierarchy_changes(level, changes)
+            if result is None:
+                writes = None
+            else:
+                writes = result['writes']
+                changes['failed'] = result['failed']
+        report = change_report(level, changes, fetch_counts or {}, writes, started)
+        logger.info(f'{level} refresh finished', extra={'summary': report['summary'], 'writes': writes})
+        return report
+
+    def _crawl(self, level, tasks, should_stop=None, on_result=None):
+        """Fetch option lists, then apply them with the successfully fetched parents as scope"""
+        started = time.perf_counter()
+        results = self.engine.run(tasks, should_stop=should_stop, on_result=on_result)
+        fetched = []
+        scope = set()
+        fetch_counts = {'ok': 0, 'empty': 0, 'failed': 0, 'cancelled': 0}
+        for task, result in zip(tasks, results):
+            if result.get('status') == 'cancelled':
+                fetch_counts['cancelled'] += 1
+            elif not result['success']:
+                fetch_counts['failed'] += 1
+            elif not result['locations']:
+                # An empty list is more likely a site hiccup than a parent with no children
+                fetch_counts['empty'] += 1
+                logger.warning(f"No {level} found for {task['name']}")
+            else:
+                fetch_counts['ok'] += 1
+                fetched.extend(result['locations'])
+                scope.add(task['parent_id'])
+        report = self.apply(level, fetched, scope, fetch_counts, started)
+        report['token_stats'] = self.token_stats()
+        return report
+
+    def crawl_districts(self, states, should_stop=None, on_result=None):
+        """Refresh the districts of the given states"""
+        tasks = [{
+            'name': state['name'],
+            'url': 'https://agriplus.in/district/fetch',
+            'parent_id': state['id'],
+            'run': lambda scraper, state=state: {
+                'success': True, 'locations': scraper.fetch_district_options(state['id'])
+            }
+        } for state in states]
+        return self._crawl('districts', tasks, should_stop, on_result)
+
+    def crawl_markets(self, districts, should_stop=None, on_result=None):
+        """Refresh the markets of the given districts (rows with 'id', 'name' and 'state_id')"""
+        tasks = [{
+            'name': district['name'],
+            'url': 'https://agriplus.in/market/fetch',
+            'parent_id': district['id'],
+            'run': lambda scraper, district=district: {
+                'success': True, 'locations': scraper.fetch_market_options(district['state_id'], district['id'])
+            }
+        } for district in districts]
+        return self._crawl('markets', tasks, should_stop, on_result)
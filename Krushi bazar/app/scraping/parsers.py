@@ -0,0 +1,132 @@
+# Price table extraction backends
+#
+# Every backend returns the rows of the first <table> on the page as lists of
+# stripped <td> texts (header rows, which only have <th> cells, come back as
+# empty lists), or None when the page has no table. All backends must return
+# identical rows; benchmarks/parser_benchmark.py checks this.
+from html.parser import HTMLParser
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+
+def extract_rows_bs4(html_content):
+    """Reference backend: BeautifulSoup with the pure-Python html.parser"""
+    soup = BeautifulSoup(html_content, 'html.parser')
+    table = soup.find('table')
+    if not table:
+        return None
+    return [[cell.get_text().strip() for cell in row.find_all('td')] for row in table.find_all('tr')]
+
+
+def extract_rows_lxml(html_content):
+    """libxml2 backend, only available when lxml is installed"""
+    if not html_content.strip():
+        return None
+    try:
+        document = lxml.html.fromstring(html_content)
+    except ValueError:
+        # lxml refuses str input that carries an XML encoding declaration
+        return extract_rows_bs4(html_content)
+    # iter() includes the root itself, which is the <table> for a bare table fragment
+    table = next(document.iter('table'), None)
+    if table is None:
+        return None
+    return [[cell.text_content().strip() for cell in row.iter('td')] for row in table.iter('tr')]
+
+
+class _TableTokenizer(HTMLParser):
+    """Collects cell texts of the first table and ignores everything else"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = None
+        self.done = False
+        self._table_depth = 0
+        self._row = None
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == 'table':
+            if self.rows is None:
+                self.rows = []
+            self._table_depth += 1
+        elif self._table_depth == 0:
+            return
+        elif tag == 'tr':
+            self._close_row()
+            self._row = []
+            self.rows.append(self._row)
+        elif tag == 'td' and self._row is not None:
+            self._close_cell()
+            self._cell = []
+        elif tag == 'th':
+            self._close_cell()
+
+    def handle_endtag(self, tag):
+        if self.done or self._table_depth == 0:
+            return
+        if tag == 'td':
+            self._close_cell()
+        elif tag == 'tr':
+            self._close_row()
+        elif tag == 'table':
+            self._table_depth -= 1
+            if self._table_depth == 0:
+                self._close_row()
+                self.done = True
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+    def _close_cell(self):
+        if self._cell is not None:
+            self._row.append(''.join(self._cell).strip())
+            self._cell = None
+
+    def _close_row(self):
+        self._close_cell()
+        self._row = None
+
+
+def extract_rows_stream(html_content, chunk_size=65536):
+    """
+    Streaming backend: tokenizes the page in chunks and stops as soon as the
+    first table is closed, without building a document tree
+    """
+    tokenizer = _TableTokenizer()
+    for start in range(0, len(html_content), chunk_size):
+        tokenizer.feed(html_content[start:start + chunk_size])
+        if tokenizer.done:
+            break
+    else:
+        tokenizer.close()
+        tokenizer._close_row()
+    return tokenizer.rows
+
+
+BACKENDS = {
+    'bs4': extract_rows_bs4,
+    'stream': extract_rows_stream
+}
+if LXML_AVAILABLE:
+    BACKENDS['lxml'] = extract_rows_lxml
+
+def default_backend():
+    return 'lxml' if LXML_AVAILABLE else 'bs4'
+
+def extract_table_rows(html_content, backend=None):
+    """
+    Extract the first table of a page with the given backend ('lxml', 'stream'
+    or 'bs4'); unknown or unavailable backends fall back to BeautifulSoup
+    """
+    backend = backend or default_backend()
+    extract = BACKENDS.get(backend, extract_rows_bs4)
+    return extract(html_content)
@@ -0,0 +1,572 @@
+# Staged price page ingestion: fetch → parse → resolve → write
+#
+# A scrape run used to do everything for one page in one worker call: the
+# HTTP request, the HTML parse, the name lookups and its own upsert
+# transaction. A run is now a pipeline of stages joined by bounded queues,
+# so each stage runs at its own pace and a slow stage holds back the stages
+# before it instead of piling pages up in memory:
+#
+#   fetch    threads, behind the engine's shared rate limiter and host budget
+#   parse    threads, each waiting on a process pool that runs the parser
+#            (CPU-bound, so parsing does not compete with the fetch threads
+#            for the GIL). The pool is started once per worker process and
+#            kept across runs; its processes come from a forkserver, not a
+#            fork of this multi-threaded process
+#   resolve  one thread, turning table rows into price records with dict
+#            lookups on the location directory snapshot
+#   write    one thread, writing the records of several pages per
+#            upsert_commodity_prices transaction: it flushes every
+#            PIPELINE_BATCH_ROWS rows, or PIPELINE_FLUSH_MS after the
+#            first pending page, whichever comes first
+#
+# Items, busy time and queue depths are kept per stage, for the run result
+# and for /api/database/metrics.
+import atexit
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from app.config import Config
+from app.data.database import Database
+from app.data.locations import get_directory, normalize_name, slugify
+from app.scraping.engine import get_shared_limits, load_engine_settings
+from app.scraping.parsers import extract_table_rows
+from app.log import get_logger
+
+logger = get_logger('pipeline')
+
+STAGES = ('fetch', 'parse', 'resolve', 'write')
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+class StageStats:
+    """Items, busy seconds and inbox depth of one stage in one run"""
+
+    def __init__(self, name, inbox):
+        self.name = name
+        self.inbox = inbox
+        self._lock = threading.Lock()
+        self.items = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.max_queue_depth = 0
+        self._depth_total = 0
+        self._depth_samples = 0
+
+    def took(self):
+        """Sample the inbox depth when the stage takes an item"""
+        depth = self.inbox.qsize()
+        with self._lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+            self._depth_total += depth
+            self._depth_samples += 1
+
+    def record(self, busy_seconds, items=1, errors=0):
+        with self._lock:
+            self.items += items
+            self.errors += errors
+            self.busy_seconds += busy_seconds
+
+    def snapshot(self, elapsed, finished=False):
+        with self._lock:
+            return {
+                'items': self.items,
+                'errors': self.errors,
+                'busy_seconds': round(self.busy_seconds, 3),
+                # Items per second of stage work, and per second of the run
+                'items_per_busy_second': round(self.items / self.busy_seconds, 1) if self.busy_seconds else None,
+                'items_per_second': round(self.items / elapsed, 2) if elapsed else None,
+                'queue_depth': 0 if finished else self.inbox.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'mean_queue_depth': round(self._depth_total / self._depth_samples, 2) if self._depth_samples else 0
+            }
+
+
+class PipelineMetrics:
+    """Totals over every pipeline run in this process, plus the last run's stages"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {'runs': 0, 'pages': 0, 'rows': 0, 'flushes': 0, 'flush_retries': 0,
+                        'parse_fallbacks': 0}
+        self._stages = {name: {'items': 0, 'busy_seconds': 0.0} for name in STAGES}
+        self._active = []
+        self._last_run = None
+
+    def run_started(self, run):
+        with self._lock:
+            self._active.append(run)
+
+    def run_finished(self, run, summary):
+        with self._lock:
+            self._active.remove(run)
+            self._totals['runs'] += 1
+            for key in ('pages', 'rows', 'flushes', 'flush_retries', 'parse_fallbacks'):
+                self._totals[key] += summary[key]
+            for name, stage in summary['stages'].items():
+                self._stages[name]['items'] += stage['items']
+                self._stages[name]['busy_seconds'] += stage['busy_seconds']
+            self._last_run = summary
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self._totals)
+            active = list(self._active)
+            metrics['stages'] = {
+                name: {'items': stage['items'], 'busy_seconds': round(stage['busy_seconds'], 3)}
+                for name, stage in self._stages.items()
+            }
+            metrics['last_run'] = self._last_run
+        # Live stage throughput and queue depths of the runs in progress
+        metrics['active_runs'] = [run.summary() for run in active]
+        return metrics
+
+
+pipeline_metrics = PipelineMetrics()
+
+
+_parse_pool = None
+_parse_pool_key = None
+_parse_pool_lock = threading.Lock()
+
+def _parse_context():
+    # Forking a process that runs fetch, scheduler and pool threads can copy
+    # held locks into the child; forkserver children fork from a clean server
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    context = multiprocessing.get_context(method)
+    if method == 'forkserver':
+        # Workers fork with the parsers already imported
+        context.set_forkserver_preload(['app.scraping.parsers'])
+    return context
+
+def get_parse_pool(processes):
+    """
+    The process pool the parse stage submits to, shared by every run in
+    this process and created on first use (and again after a fork, a
+    different size or a broken pool)
+    """
+    global _parse_pool, _parse_pool_key
+    key = (os.getpid(), processes)
+    with _parse_pool_lock:
+        if _parse_pool is None or _parse_pool_key != key:
+            if _parse_pool is not None and _parse_pool_key[0] == key[0]:
+                _parse_pool.shutdown(wait=False)
+            _parse_pool = ProcessPoolExecutor(max_workers=processes, mp_context=_parse_context())
+            _parse_pool_key = key
+        return _parse_pool
+
+def discard_parse_pool(executor):
+    """Forget a broken pool so the next run starts a fresh one"""
+    global _parse_pool, _parse_pool_key
+    with _parse_pool_lock:
+        if _parse_pool is executor:
+            _parse_pool, _parse_pool_key = None, None
+    executor.shutdown(wait=False)
+
+def shutdown_parse_pool():
+    """Stop this process's parse pool (at exit); a pool inherited through a fork is left alone"""
+    global _parse_pool, _parse_pool_key
+    with _parse_pool_lock:
+        executor, key = _parse_pool, _parse_pool_key
+        _parse_pool, _parse_pool_key = None, None
+    if executor is not None and key[0] == os.getpid():
+        executor.shutdown()
+
+atexit.register(shutdown_parse_pool)
+
+
+def page_records(table_rows, state_id, district_id, market_id=None, market_keys=None, extract=None):
+    """
+    Price records from the table of a market page (`market_id` given) or of
+    a district page (markets looked up by name in `market_keys`, the
+    directory snapshot's (district_id, name) index). Returns the records and
+    the names of the markets that could not be resolved.
+    """
+    records = []
+    unresolved = set()
+    for cells in table_rows[1:]:  # Skip header row
+        if len(cells) < 10:  # Ensure enough columns (including Sl no.)
+            continue
+        row_market_id = market_id
+        if row_market_id is None:
+            name = cells[3]
+            row_market_id = market_keys.get((district_id, normalize_name(name)))
+            if row_market_id is None:
+                row_market_id = market_keys.get((district_id, slugify(name)))
+            if row_market_id is None:
+                unresolved.add(name)
+                continue
+        record = extract(cells)
+        record.update({'state_id': state_id, 'district_id': district_id, 'market_id': row_market_id})
+        records.append(record)
+    return records, unresolved
+
+
+class IngestPipeline:
+    """
+    Runs price page tasks through the fetch → parse → resolve → write stages.
+    Each fetch thread gets its own scraper (and HTTP session) from
+    `scraper_factory`, like the scrape engine's workers.
+    """
+
+    def __init__(self, scraper_factory, fetch_workers=None, parse_processes=None, queue_size=None,
+                 batch_rows=None, flush_ms=None, per_host_limit=None, delay_between_requests=None, archive=None):
+        settings = load_engine_settings()
+        self.scraper_factory = scraper_factory
+        self.fetch_workers = fetch_workers or settings['max_workers']
+        self.parse_processes = Config.PIPELINE_PARSE_PROCESSES if parse_processes is None else parse_processes
+        self.queue_size = queue_size or Config.PIPELINE_QUEUE_SIZE
+        self.batch_rows = batch_rows or Config.PIPELINE_BATCH_ROWS
+        self.flush_seconds = (Config.PIPELINE_FLUSH_MS if flush_ms is None else flush_ms) / 1000
+        per_host_limit = per_host_limit or settings['per_host_limit']
+        if delay_between_requests is None:
+            delay_between_requests = settings['delay_between_requests']
+        self.rate_limiter, self.host_budget = get_shared_limits(delay_between_requests, per_host_limit)
+        self.db = Database()
+        # Page archive that 'archived' tasks are read from (app/scraping/archive.py)
+        self.archive = archive
+        self._local = threading.local()
+
+    @property
+    def max_workers(self):
+        return self.fetch_workers
+
+    def _get_scraper(self):
+        scraper = getattr(self._local, 'scraper', None)
+        if scraper is None:
+            scraper = self.scraper_factory()
+            self._local.scraper = scraper
+        return scraper
+
+    def run(self, tasks, force=False, should_stop=None, on_result=None):
+        """
+        Run price page tasks. Each task is a dict with 'name', 'url',
+        'state_id', 'district_id' and, for a market page, 'market_id' (a
+        district page resolves the market of each row by name). A task with
+        an 'archived' index entry is read from the archive instead of fetched.
+        `should_stop` and `on_result` work as in ScrapeEngine.run(). Returns
+        (results, stages): one result per task in the order the tasks were
+        given, with the same keys as the engine's, and the per-stage metrics.
+        """
+        if not tasks:
+            return [], {}
+        run = _Run(self, tasks, force, should_stop, on_result)
+        pipeline_metrics.run_started(run)
+        summary = None
+        try:
+            summary = run.execute()
+        finally:
+            if summary is None:
+                summary = run.summary()
+            pipeline_metrics.run_finished(run, summary)
+        logger.debug('Pipeline run finished', extra={'tasks': len(tasks), 'stages': summary['stages']})
+        return run.results, summary['stages']
+
+
+class _Run:
+    """State of one IngestPipeline.run(): the queues, the stage threads and the results"""
+
+    def __init__(self, pipeline, tasks, force, should_stop, on_result):
+        self.pipeline = pipeline
+        self.tasks = tasks
+        self.force = force
+        self.should_stop = should_stop
+        self.on_result = on_result
+        self.results = [None] * len(tasks)
+        self.inboxes = {name: queue.Queue(maxsize=0 if name == 'fetch' else pipeline.queue_size) for name in STAGES}
+        self.stats = {name: StageStats(name, self.inboxes[name]) for name in STAGES}
+        self.counts = {'pages': 0, 'rows': 0, 'flushes': 0, 'flush_retries': 0, 'parse_fallbacks': 0}
+        self._lock = threading.Lock()
+        self._running = {}
+        self._executor = None
+        self._started = time.perf_counter()
+        self._elapsed = None
+
+    # Plumbing
+
+    def _stage(self, name, workers, work, downstream):
+        """Start `workers` threads running `work(item)` on the items of a stage's inbox"""
+        inbox = self.inboxes[name]
+        self._running[name] = workers
+
+        def loop():
+            while True:
+                item = inbox.get()
+                if item is _DONE:
+                    # Let the other workers of this stage see the end too
+                    inbox.put(_DONE)
+                    break
+                self.stats[name].took()
+                try:
+                    work(item)
+                except Exception as e:
+                    # Stages handle their own errors; this keeps the thread (and the run) going
+                    if self.results[item['index']] is None:
+                        self._fail(item, name, e)
+            with self._lock:
+                self._running[name] -= 1
+                last = self._running[name] == 0
+            if last and downstream:
+                self.inboxes[downstream].put(_DONE)
+
+        return [threading.Thread(target=loop, name=f'ingest-{name}-{i}', daemon=True) for i in range(workers)]
+
+    def _timed(self, name, func, *args):
+        """Call func and record it as one item of the stage; exceptions are recorded and re-raised"""
+        started = time.perf_counter()
+        try:
+            value = func(*args)
+        except Exception:
+            self.stats[name].record(time.perf_counter() - started, errors=1)
+            raise
+        self.stats[name].record(time.perf_counter() - started)
+        return value
+
+    def _finish(self, item, status, success, rows=0, counts=None, error=None):
+        task = item['task']
+        result = {
+            'name': task['name'],
+            'url': task['url'],
+            'status': status,
+            'rows': rows,
+            'counts': counts,
+            'success': success,
+            'latency_seconds': round(time.perf_counter() - item['started'], 3) if item.get('started') else 0.0,
+            'wait_seconds': round(item.get('waited', 0.0), 3),
+            'error': error
+        }
+        logger.debug('Task finished', extra={
+            'task': task['name'], 'status': status,
+            'latency_seconds': result['latency_seconds'], 'wait_seconds': result['wait_seconds']
+        })
+        self.results[item['index']] = result
+        if self.on_result:
+            self.on_result(result)
+
+    def _fail(self, item, stage, error):
+        logger.exception(f"Error in {stage} stage for {item['task']['name']}: {error}")
+        self._finish(item, 'failed', False, error=str(error))
+
+    # Stages
+
+    def fetch(self, item):
+        task = item['task']
+        if self.should_stop and self.should_stop():
+            self._finish(item, 'cancelled', False)
+            return
+        try:
+            scraper = self.pipeline._get_scraper()
+            if 'archived' in task:
+                item['started'] = time.perf_counter()
+                page = self._timed('fetch', self.pipeline.archive.read_page, task['archived'])
+            else:
+                with self.pipeline.host_budget.slot(task['url']):
+                    item['waited'] = self.pipeline.rate_limiter.wait()
+                    item['started'] = time.perf_counter()
+                    page = self._timed('fetch', scraper.request_price_page, task['url'], self.force)
+        except Exception as e:
+            self._fail(item, 'fetch', e)
+            return
+        if page['status'] != 'fetched':
+            logger.debug('Prices unchanged, skipping', extra={'url': task['url'], 'page_status': page['status']})
+            self._finish(item, page['status'], True)
+            return
+        item['page'] = page
+        item['scraper'] = scraper
+        self.inboxes['parse'].put(item)
+
+    def _extract(self, text, backend):
+        if self._executor is not None:
+            try:
+                return self._executor.submit(extract_table_rows, text, backend).result()
+            except BrokenProcessPool as e:
+                # A parse process died (e.g. killed for memory); parse here from now on
+                with self._lock:
+                    if self._executor is not None:
+                        logger.warning(f"Parse process pool broke, parsing in threads: {e}")
+                        self.counts['parse_fallbacks'] += 1
+                        discard_parse_pool(self._executor)
+                        self._executor = None
+        return extract_table_rows(text, backend)
+
+    def parse(self, item):
+        scraper = item.pop('scraper')
+        page = item.pop('page')
+        try:
+            table_rows = self._timed('parse', self._extract, page['text'], scraper.parser_backend)
+            if page['fingerprint'] is None:
+                # Archived page: written whatever the stored fingerprint says
+                checked = {'status': 'changed', 'table_rows': table_rows, 'fingerprint': None}
+            else:
+                checked = scraper.finish_price_page(page, table_rows)
+        except Exception as e:
+            self._fail(item, 'parse', e)
+            return
+        if checked['status'] != 'changed':
+            logger.debug('Prices unchanged, skipping', extra={'url': item['task']['url'], 'page_status': 'unchanged'})
+            self._finish(item, 'unchanged', True)
+            return
+        if checked['table_rows'] is None:
+            logger.error(f"No commodity prices table found for {item['task']['name']}")
+            self._finish(item, 'failed', False)
+            return
+        item['checked'] = checked
+        item['extract'] = scraper.extract_commodity_data
+        self.inboxes['resolve'].put(item)
+
+    def resolve(self, item):
+        task = item['task']
+        checked = item.pop('checked')
+        try:
+            records, unresolved = self._timed(
+                'resolve', page_records, checked['table_rows'], task['state_id'], task['district_id'],
+                task.get('market_id'), get_directory().snapshot().market_keys, item.pop('extract')
+            )
+        except Exception as e:
+            self._fail(item, 'resolve', e)
+            return
+        for name in sorted(unresolved):
+            logger.warning(f"Market {name} not found in database for {task['name']}")
+        if not records:
+            logger.error(f"No valid commodity data found for {task['name']}")
+            self._finish(item, 'failed', False)
+            return
+        item['records'] = records
+        item['fingerprint'] = checked['fingerprint']
+        self.inboxes['write'].put(item)
+
+    def _write_pages(self, pages):
+        """One upsert transaction for several pages; returns per-market counts or None"""
+        market_counts = {}
+        rows = [record for page in pages for record in page['records']]
+        if self.pipeline.db.upsert_commodity_prices(rows, market_counts) is None:
+            return None
+        with self._lock:
+            self.counts['flushes'] += 1
+        return market_counts
+
+    def _page_written(self, page, market_counts):
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        for market_id in {record['market_id'] for record in page['records']}:
+            for key, value in market_counts.get(market_id, {}).items():
+                counts[key] += value
+        if page['fingerprint']:
+            self.pipeline.db.save_page_fingerprint(**page['fingerprint'])
+        logger.debug('Saved prices', extra={'url': page['task']['url'], 'rows': len(page['records']), **counts})
+        with self._lock:
+            self.counts['pages'] += 1
+            self.counts['rows'] += len(page['records'])
+        self._finish(page, 'changed', True, rows=len(page['records']), counts=counts)
+
+    def flush(self, pending):
+        started = time.perf_counter()
+        market_counts = self._write_pages(pending)
+        if market_counts is None and len(pending) > 1:
+            # Retry page by page so one bad page does not fail the others
+            with self._lock:
+                self.counts['flush_retries'] += 1
+            for page in pending:
+                page_counts = self._write_pages([page])
+                if page_counts is None:
+                    logger.error(f"Failed to save commodities for {page['task']['name']}")
+                    self._finish(page, 'failed', False)
+                else:
+                    self._page_written(page, page_counts)
+        elif market_counts is None:
+            logger.error(f"Failed to save commodities for {pending[0]['task']['name']}")
+            self._finish(pending[0], 'failed', False)
+        else:
+            for page in pending:
+                self._page_written(page, market_counts)
+        self.stats['write'].record(time.perf_counter() - started, items=len(pending))
+
+    def write_loop(self):
+        """Single writer: collects pages and flushes them by row count or age"""
+        inbox = self.inboxes['write']
+        pending = []
+        pending_rows = 0
+        pending_markets = set()
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = inbox.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is not None and item is not _DONE:
+                self.stats['write'].took()
+                markets = {record['market_id'] for record in item['records']}
+                if markets & pending_markets:
+                    # Two pages of one market in a transaction would merge their rows and counts
+                    self._flush_safely(pending)
+                    pending, pending_rows, pending_markets, deadline = [], 0, set(), None
+                pending.append(item)
+                pending_rows += len(item['records'])
+                pending_markets |= markets
+                if deadline is None:
+                    deadline = time.monotonic() + self.pipeline.flush_seconds
+            if pending and (item is None or item is _DONE or pending_rows >= self.pipeline.batch_rows
+                            or time.monotonic() >= deadline):
+                self._flush_safely(pending)
+                pending, pending_rows, pending_markets, deadline = [], 0, set(), None
+            if item is _DONE:
+                break
+
+    def _flush_safely(self, pending):
+        try:
+            self.flush(pending)
+        except Exception as e:
+            for page in pending:
+                if self.results[page['index']] is None:
+                    self._fail(page, 'write', e)
+
+    # Run
+
+    def _start_executor(self):
+        if self.pipeline.parse_processes <= 0:
+            return
+        try:
+            self._executor = get_parse_pool(self.pipeline.parse_processes)
+        except (OSError, NotImplementedError, ValueError) as e:
+            logger.warning(f"No parse process pool, parsing in threads: {e}")
+            self.counts['parse_fallbacks'] += 1
+
+    def execute(self):
+        self._start_executor()
+        # One parse thread per process keeps every process busy without queueing in the pool
+        parse_threads = max(1, self.pipeline.parse_processes)
+        threads = (self._stage('fetch', min(self.pipeline.fetch_workers, len(self.tasks)), self.fetch, 'parse')
+                   + self._stage('parse', parse_threads, self.parse, 'resolve')
+                   + self._stage('resolve', 1, self.resolve, 'write')
+                   + [threading.Thread(target=self.write_loop, name='ingest-write', daemon=True)])
+        for index, task in enumerate(self.tasks):
+            self.inboxes['fetch'].put({'index': index, 'task': task})
+        self.inboxes['fetch'].put(_DONE)
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            # The pool outlives the run; the next run reuses its processes
+            self._executor = None
+        self._elapsed = time.perf_counter() - self._started
+        for index, result in enumerate(self.results):
+            if result is None:
+                self._finish({'index': index, 'task': self.tasks[index]}, 'failed', False, error='not processed')
+        return self.summary()
+
+    def summary(self):
+        elapsed = self._elapsed if self._elapsed is not None else time.perf_counter() - self._started
+        with self._lock:
+            summary = dict(self.counts)
+        summary['elapsed_seconds'] = round(elapsed, 3)
+        summary['stages'] = {
+            name: stats.snapshot(elapsed, finished=self._elapsed is not None) for name, stats in self.stats.items()
+        }
+        return summary
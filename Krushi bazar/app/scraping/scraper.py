@@ -1,16 +1,47 @@
 # Consolidated scraper logic
+import hashlib
+import json
 import re
-import traceback
+import threading
 import requests
 import time
 import urllib.parse
 from bs4 import BeautifulSoup
+from app.config import Config
 from app.data.database import Database
+from app.scraping.parsers import extract_table_rows
+from app.scraping.archive import page_archive
+from app.scraping.hierarchy import HierarchyCrawler
+from app.scraping.pipeline import page_records
+from app.data.locations import get_directory, slugify
+from app.data.localization import enqueue_localization
+from app.data.price_dates import parse_price_date
+from app.log import get_logger, RunCounters
+
+logger = get_logger('scraper')
 
 class AgriplusScraper:
-    def __init__(self):
+    # Seconds a CSRF token is reused before the landing page is fetched again
+    CSRF_TOKEN_TTL = 900
+    BASE_URL = "https://agriplus.in/prices/all"
+
+    def __init__(self, parser_backend=None):
         self.db = Database()
-        self.base_url = "https://agriplus.in/prices/all"
+        self.base_url = self.BASE_URL
+        self.parser_backend = parser_backend or Config.PARSER_BACKEND or None
+        self._csrf_token = None
+        self._csrf_fetched_at = 0.0
+        self._csrf_lock = threading.Lock()
+        self.token_stats = {
+            'landing_page_fetches': 0,
+            'token_reuses': 0,
+            'token_refreshes': 0
+        }
+        # Counters of the last states/districts/markets run (rows inserted,
+        # updated, unchanged), reported instead of whole-table statistics
+        self.last_run = {}
+        # Change report of the last hierarchy refresh (app/scraping/hierarchy.py)
+        self.last_report = None
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -23,14 +54,58 @@ class AgriplusScraper:
 
     def normalize_name_for_url(self, name):
         """Normalize name for URL formation, handling special characters"""
-        # Handle parentheses by replacing them with hyphens and removing extra spaces
-        # Example: "Vadodara(Baroda)" → "Vadodara-Baroda"
-        name = re.sub(r'\(([^)]*)\)', r'-\1', name)
-        # Replace spaces and special characters with hyphens
-        name = re.sub(r'[^\w\s-]', '', name)
-        name = re.sub(r'[-\s]+', '-', name)
-        # Convert to lowercase and remove leading/trailing hyphens
-        return name.lower().strip('-')
+        return slugify(name)
+
+    def _remember_csrf_token(self, html_content):
+        soup = BeautifulSoup(html_content, 'html.parser')
+        csrf_token = soup.find('input', {'name': '_token'})
+        self._csrf_token = csrf_token['value'] if csrf_token else ''
+        self._csrf_fetched_at = time.monotonic()
+        return self._csrf_token
+
+    def get_csrf_token(self, force_refresh=False):
+        """
+        Return the session's CSRF token, fetching the landing page only when
+        there is no token yet, it is older than CSRF_TOKEN_TTL, or a refresh is forced
+        """
+        with self._csrf_lock:
+            age = time.monotonic() - self._csrf_fetched_at
+            if not force_refresh and self._csrf_token is not None and age < self.CSRF_TOKEN_TTL:
+                self.token_stats['token_reuses'] += 1
+                return self._csrf_token
+            response = self.session.get(self.base_url, timeout=30)
+            response.raise_for_status()
+            self.token_stats['landing_page_fetches'] += 1
+            return self._remember_csrf_token(response.text)
+
+    def post_with_csrf_token(self, url, form_data):
+        """POST a form with the cached CSRF token, refreshing it once if the server rejects it"""
+        response = self.session.post(url, data={**form_data, '_token': self.get_csrf_token()}, timeout=30)
+        if response.status_code in (403, 419):
+            # Token expired or the session was reset on the server side
+            self.token_stats['token_refreshes'] += 1
+            token = self.get_csrf_token(force_refresh=True)
+            response = self.session.post(url, data={**form_data, '_token': token}, timeout=30)
+        response.raise_for_status()
+        return response
+
+    def get_token_stats(self):
+        stats = dict(self.token_stats)
+        # Every reuse is a landing page GET + parse that did not happen
+        stats['landing_page_fetches_avoided'] = stats['token_reuses']
+        return stats
+
+    def extract_commodity_data(self, cells):
+        """Build a commodity price record from the cell texts of a price table row"""
+        return {
+            'commodity': cells[4],
+            'variety': cells[5],
+            'min_price': int(re.sub(r'[^\d]', '', cells[6])),
+            'max_price': int(re.sub(r'[^\d]', '', cells[7])),
+            'modal_price': int(re.sub(r'[^\d]', '', cells[8])),
+            'price_date': cells[9],
+            'price_day': parse_price_date(cells[9])
+        }
 
     def extract_states_from_html(self, html_content):
         soup = BeautifulSoup(html_content, 'html.parser')
@@ -57,372 +132,351 @@ class AgriplusScraper:
                 unique_states[state['id']] = state
         return list(unique_states.values())
 
+    @staticmethod
+    def _extract_options(html_content, placeholders, **parent):
+        """Location options of a district/market <select> response as {'id', 'name', **parent} dicts"""
+        soup = BeautifulSoup(html_content, 'html.parser')
+        locations = []
+        for option in soup.find_all('option'):
+            value = option.get('value', '').strip()
+            name = option.get_text().strip()
+            if value and value != '' and value != '0' and name and name.lower() not in placeholders:
+                try:
+                    location_id = int(value)
+                    clean_name = re.sub(r'\s+', ' ', name).strip().replace('&nbsp;', ' ').strip()
+                    if clean_name:
+                        locations.append({'id': location_id, 'name': clean_name, **parent})
+                except ValueError:
+                    continue
+        return locations
+
+    def fetch_district_options(self, state_id):
+        """Districts of a state as listed by the site; raises on request errors"""
+        response = self.post_with_csrf_token("https://agriplus.in/district/fetch", {
+            'stateid': str(state_id),
+            'id': 'district'
+        })
+        return self._extract_options(response.text, ['any district', 'select district'], state_id=state_id)
+
+    def fetch_market_options(self, state_id, district_id):
+        """Markets of a district as listed by the site; raises on request errors"""
+        response = self.post_with_csrf_token("https://agriplus.in/market/fetch", {
+            'distid': str(district_id),
+            'id': 'market'
+        })
+        return self._extract_options(response.text, ['any market', 'select market'],
+                                     district_id=district_id, state_id=state_id)
+
     def get_districts_for_state(self, state_id):
         try:
-            response = self.session.get(self.base_url, timeout=30)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-            csrf_token = soup.find('input', {'name': '_token'})
-            csrf_value = csrf_token['value'] if csrf_token else ''
-            
-            url = "https://agriplus.in/district/fetch"
-            form_data = {
-                'stateid': str(state_id),
-                'id': 'district',
-                '_token': csrf_value
-            }
-            response = self.session.post(url, data=form_data, timeout=30)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-            districts = []
-            
-            options = soup.find_all('option')
-            for option in options:
-                value = option.get('value', '').strip()
-                name = option.get_text().strip()
-                if value and value != '' and value != '0' and name and name.lower() not in ['any district', 'select district']:
-                    try:
-                        district_id = int(value)
-                        clean_name = re.sub(r'\s+', ' ', name).strip().replace('&nbsp;', ' ').strip()
-                        if clean_name:
-                            districts.append({'id': district_id, 'name': clean_name, 'state_id': state_id})
-                    except ValueError:
-                        continue
-            return districts
+            return self.fetch_district_options(state_id)
         except Exception as e:
-            print(f"[ERROR] Error getting districts for state {state_id}: {e}")
+            logger.error(f"Error getting districts for state {state_id}: {e}")
             return []
 
     def get_markets_for_district(self, state_id, district_id):
         try:
-            response = self.session.get(self.base_url, timeout=30)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-            csrf_token = soup.find('input', {'name': '_token'})
-            csrf_value = csrf_token['value'] if csrf_token else ''
-            
-            url = "https://agriplus.in/market/fetch"
-            form_data = {
-                'distid': str(district_id),
-                'id': 'market',
-                '_token': csrf_value
-            }
-            response = self.session.post(url, data=form_data, timeout=30)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-            markets = []
-            
-            options = soup.find_all('option')
-            for option in options:
-                value = option.get('value', '').strip()
-                name = option.get_text().strip()
-                if value and value != '' and value != '0' and name and name.lower() not in ['any market', 'select market']:
-                    try:
-                        market_id = int(value)
-                        clean_name = re.sub(r'\s+', ' ', name).strip().replace('&nbsp;', ' ').strip()
-                        if clean_name:
-                            markets.append({'id': market_id, 'name': clean_name, 'district_id': district_id, 'state_id': state_id})
-                    except ValueError:
-                        continue
-            return markets
+            return self.fetch_market_options(state_id, district_id)
         except Exception as e:
-            print(f"[ERROR] Error getting markets for district {district_id}: {e}")
+            logger.error(f"Error getting markets for district {district_id}: {e}")
             return []
 
+    def _finish_hierarchy_refresh(self, report, counters):
+        """Record a hierarchy refresh report; True when its changes were applied"""
+        level = report['level']
+        counters.update({f'{level}_{kind}': count for kind, count in report['summary'].items()})
+        counters.update({f'fetches_{kind}': count for kind, count in report['fetched'].items()})
+        self.last_report = report
+        self.last_run = counters.log_summary(logger)
+        if 'token_stats' in report:
+            logger.info('CSRF token stats', extra={'token_stats': report['token_stats']})
+        if report['writes']:
+            # New or renamed names still need their Hindi/Gujarati names
+            enqueue_localization()
+        return report['applied']
+
+    def _job_callbacks(self, job):
+        """Engine callbacks reporting each fetched option list to a background job"""
+        if not job:
+            return None, None
+        def on_result(result):
+            failed = not result['success'] and result.get('status') != 'cancelled'
+            job.advance(rows=len(result.get('locations') or []), errors=1 if failed else 0,
+                        error=result['error'] if failed else None)
+        return (lambda: job.cancelled), on_result
+
     def scrape_states_only(self):
-        print("Starting states scraping from website...")
+        logger.info("Starting states scraping from website")
         try:
             response = self.session.get(self.base_url, timeout=30)
             response.raise_for_status()
+            with self._csrf_lock:
+                self._remember_csrf_token(response.text)
             states = self.extract_states_from_html(response.text)
-            print(f"Found {len(states)} states")
-            
-            for state in states:
-                self.db.insert_state(state['id'], state['name'])
-                print(f"[SUCCESS] Saved state: {state['name']} (ID: {state['id']})")
+            logger.info('States found', extra={'count': len(states)})
+            if not states:
+                logger.error("No states found on the website, keeping the stored states")
+                return False
             
-            print("[SUCCESS] States scraped and saved to database")
-            stats = self.db.get_stats()
-            print(f"Database Statistics after states scraping:")
-            print(f"  States: {stats['states']}")
-            print(f"  Districts: {stats['districts']}")
-            print(f"  Markets: {stats['markets']}")
-            return True
+            counters = RunCounters('states_scrape')
+            report = HierarchyCrawler(type(self)).apply('states', states, fetch_counts={'ok': 1})
+            return self._finish_hierarchy_refresh(report, counters)
         except Exception as e:
-            print(f"[ERROR] Error scraping states: {e}")
+            logger.exception(f"Error scraping states: {e}")
             return False
 
     def scrape_districts_only(self):
-        print("Starting districts scraping for all states...")
+        logger.info("Starting districts scraping for all states")
         try:
             states = self.db.get_all_states()
             if not states:
-                print("[ERROR] No states found in database. Please scrape states first.")
+                logger.error("No states found in database. Please scrape states first.")
                 return False
-            total_districts = 0
-            for state in states:
-                print(f"Scraping districts for {state['name']} (ID: {state['id']})...")
-                districts = self.get_districts_for_state(state['id'])
-                if districts:
-                    for district in districts:
-                        self.db.insert_district(district['id'], district['name'], district['state_id'])
-                        total_districts += 1
-                    print(f"[SUCCESS] Found {len(districts)} districts for {state['name']}")
-                else:
-                    print(f"No districts found for {state['name']}")
-                time.sleep(2)
-            print(f"[SUCCESS] Total {total_districts} districts saved to database")
-            stats = self.db.get_stats()
-            print(f"Database Statistics after districts scraping:")
-            print(f"  States: {stats['states']}")
-            print(f"  Districts: {stats['districts']}")
-            print(f"  Markets: {stats['markets']}")
-            return True
+            counters = RunCounters('districts_scrape')
+            report = HierarchyCrawler(type(self)).crawl_districts(states)
+            return self._finish_hierarchy_refresh(report, counters)
         except Exception as e:
-            print(f"[ERROR] Error scraping districts: {e}")
+            logger.exception(f"Error scraping districts: {e}")
             return False
 
-    def scrape_markets_only(self):
-        print("Starting markets scraping for all districts...")
+    def scrape_markets_only(self, job=None):
+        """`job` is the JobContext when running as a background job"""
+        logger.info("Starting markets scraping for all districts")
         try:
-            states = self.db.get_all_states()
-            if not states:
-                print("[ERROR] No states found in database. Please scrape states first.")
+            if not self.db.get_all_states():
+                logger.error("No states found in database. Please scrape states first.")
                 return False
-            total_markets = 0
-            for state in states:
-                print(f"Scraping markets for {state['name']} (ID: {state['id']})...")
-                districts = self.db.get_districts_by_state(state['id'])
-                if not districts:
-                    print(f"No districts found for {state['name']}")
-                    continue
-                for district in districts:
-                    print(f"Scraping markets for {district['name']} district...")
-                    markets = self.get_markets_for_district(state['id'], district['id'])
-                    if markets:
-                        for market in markets:
-                            self.db.insert_market(market['id'], market['name'], market['district_id'], market['state_id'])
-                            total_markets += 1
-                        print(f"[SUCCESS] Found {len(markets)} markets for {district['name']}")
-                    else:
-                        print(f"No markets found for {district['name']}")
-                    time.sleep(1)
-                time.sleep(2)
-            print(f"[SUCCESS] Total {total_markets} markets saved to database")
-            stats = self.db.get_stats()
-            print(f"Database Statistics after markets scraping:")
-            print(f"  States: {stats['states']}")
-            print(f"  Districts: {stats['districts']}")
-            print(f"  Markets: {stats['markets']}")
-            return True
+            districts = self.db.get_all_districts()
+            if job:
+                job.set_total(len(districts))
+            counters = RunCounters('markets_scrape')
+            should_stop, on_result = self._job_callbacks(job)
+            report = HierarchyCrawler(type(self)).crawl_markets(districts, should_stop, on_result)
+            if job and job.cancelled:
+                logger.info("Markets scraping cancelled")
+            return self._finish_hierarchy_refresh(report, counters)
         except Exception as e:
-            print(f"[ERROR] Error scraping markets: {e}")
+            logger.exception(f"Error scraping markets: {e}")
             return False
 
-    def scrape_markets_for_state(self, state_id):
-        print(f"Starting markets scraping for state ID {state_id}...")
+    def scrape_markets_for_state(self, state_id, job=None):
+        """`job` is the JobContext when running as a background job"""
+        logger.info('Starting markets scraping for state', extra={'state_id': state_id})
         try:
             state = self.db.get_state_by_id(state_id)
             if not state:
-                print(f"[ERROR] State with ID {state_id} not found in database.")
+                logger.error(f"State with ID {state_id} not found in database.")
                 return False
-            print(f"Scraping markets for {state['name']} (ID: {state['id']})...")
-            districts = self.db.get_districts_by_state(state['id'])
+            districts = get_directory().districts(state['id'])
             if not districts:
-                print(f"No districts found for {state['name']}")
+                logger.warning('No districts found', extra={'state': state['name']})
                 return False
-            total_markets = 0
-            for district in districts:
-                print(f"Scraping markets for {district['name']} district...")
-                markets = self.get_markets_for_district(state['id'], district['id'])
-                if markets:
-                    for market in markets:
-                        self.db.insert_market(market['id'], market['name'], market['district_id'], market['state_id'])
-                        total_markets += 1
-                    print(f"[SUCCESS] Found {len(markets)} markets for {district['name']}")
-                else:
-                    print(f"No markets found for {district['name']}")
-                time.sleep(1)
-            print(f"[SUCCESS] Total {total_markets} markets saved to database for {state['name']}")
-            stats = self.db.get_stats()
-            print(f"Database Statistics after markets scraping:")
-            print(f"  States: {stats['states']}")
-            print(f"  Districts: {stats['districts']}")
-            print(f"  Markets: {stats['markets']}")
-            return True
+            if job:
+                job.set_total(len(districts))
+            counters = RunCounters('markets_scrape', state_id=state_id, state=state['name'])
+            should_stop, on_result = self._job_callbacks(job)
+            report = HierarchyCrawler(type(self)).crawl_markets(districts, should_stop, on_result)
+            if job and job.cancelled:
+                logger.info("Markets scraping cancelled")
+            return self._finish_hierarchy_refresh(report, counters)
         except Exception as e:
-            print(f"[ERROR] Error scraping markets for state {state_id}: {e}")
+            logger.exception(f"Error scraping markets for state {state_id}: {e}")
             return False
 
-    def scrape_yard_data(self, state, district, market):
-        print(f"Starting yard data scraping for {state}/{district}/{market}...")
+    def request_price_page(self, url, force=False):
+        """
+        Conditionally GET a price page, without parsing it.
+        Sends the stored ETag / Last-Modified validators and compares the body
+        hash with the previous run. Returns a dict with 'status' ('not_modified',
+        'unchanged' or 'fetched'), the page 'text' (only when fetched), the
+        'fingerprint' and the 'stored' fingerprint for finish_price_page().
+        """
+        stored = None if force else self.db.get_page_fingerprint(url)
+        headers = {}
+        if stored:
+            if stored['etag']:
+                headers['If-None-Match'] = stored['etag']
+            if stored['last_modified']:
+                headers['If-Modified-Since'] = stored['last_modified']
+
+        response = self.session.get(url, headers=headers, timeout=30)
+        logger.debug('Fetched price page', extra={'url': url, 'http_status': response.status_code})
+        if response.status_code == 304:
+            self.db.touch_page_fingerprint(url)
+            return {'status': 'not_modified', 'text': None, 'fingerprint': None, 'stored': stored}
+        response.raise_for_status()
+        page_archive.append(url, response)
+
+        fingerprint = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'body_hash': hashlib.sha256(response.content).hexdigest(),
+            'table_hash': None
+        }
+        if stored and stored['body_hash'] == fingerprint['body_hash'] and stored['table_hash']:
+            # Identical bytes, no need to parse
+            fingerprint['table_hash'] = stored['table_hash']
+            self.db.save_page_fingerprint(**fingerprint)
+            return {'status': 'unchanged', 'text': None, 'fingerprint': fingerprint, 'stored': stored}
+        return {'status': 'fetched', 'text': response.text, 'fingerprint': fingerprint, 'stored': stored}
+
+    def finish_price_page(self, page, table_rows):
+        """
+        Compare the extracted table of a fetched page with the previous run.
+        Returns a dict with 'status' ('unchanged' or 'changed'), 'table_rows'
+        (only when changed) and the 'fingerprint' to save once the rows are written.
+        """
+        fingerprint = page['fingerprint']
+        stored = page['stored']
+        if table_rows is not None:
+            fingerprint['table_hash'] = hashlib.sha256(
+                json.dumps(table_rows, ensure_ascii=False).encode('utf-8')
+            ).hexdigest()
+            if stored and stored['table_hash'] == fingerprint['table_hash']:
+                # Page markup changed (tokens, ads...) but the prices did not
+                self.db.save_page_fingerprint(**fingerprint)
+                return {'status': 'unchanged', 'table_rows': None, 'fingerprint': fingerprint}
+        return {'status': 'changed', 'table_rows': table_rows, 'fingerprint': fingerprint}
+
+    def fetch_price_page(self, url, force=False):
+        """
+        Conditionally GET a price page and extract its table. Returns a dict
+        with 'status' ('not_modified', 'unchanged' or 'changed'), 'table_rows'
+        (only when changed) and the 'fingerprint' to save once the rows are written.
+        """
+        page = self.request_price_page(url, force)
+        if page['status'] != 'fetched':
+            return {'status': page['status'], 'table_rows': None, 'fingerprint': page['fingerprint']}
+        return self.finish_price_page(page, extract_table_rows(page['text'], self.parser_backend))
+
+    def scrape_yard_data(self, state, district, market, delay=1, force=False):
+        return self.scrape_yard_page(state, district, market, delay, force)['success']
+
+    def scrape_yard_page(self, state, district, market, delay=1, force=False):
+        """
+        Scrape one market page. Returns a dict with 'success', 'status'
+        ('changed', 'unchanged', 'not_modified' or 'failed'), 'rows' and 'counts'
+        """
+        result = {'success': False, 'status': 'failed', 'rows': 0, 'counts': None}
         try:
             # Normalize names for URL with proper handling of special characters
             state_slug = self.normalize_name_for_url(state)
             district_slug = self.normalize_name_for_url(district)
             market_slug = self.normalize_name_for_url(market)
             url = f"{self.base_url}/{state_slug}/{district_slug}/{market_slug}"
-            print(f"Requesting URL: {url}")
-            
-            response = self.session.get(url, timeout=30)
-            print(f"HTTP Status: {response.status_code}")
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
 
-            # Find the commodity prices table
-            table = soup.find('table')
-            if not table:
-                print(f"[ERROR] No commodity prices table found for {state}/{district}/{market}")
-                return False
+            page = self.fetch_price_page(url, force)
+            if page['status'] != 'changed':
+                logger.debug('Prices unchanged, skipping', extra={'url': url, 'page_status': page['status']})
+                result.update({'success': True, 'status': page['status']})
+                return result
+
+            # Extract the commodity prices table
+            table_rows = page['table_rows']
+            if table_rows is None:
+                logger.error(f"No commodity prices table found for {state}/{district}/{market}")
+                return result
 
             # Fetch IDs for state, district, and market
             state_id = self.db.get_state_id_by_name(state)
             if not state_id:
-                print(f"[ERROR] State {state} not found in database")
-                return False
+                logger.error(f"State {state} not found in database")
+                return result
             district_id = self.db.get_district_id_by_name(district, state_id)
             if not district_id:
-                print(f"[ERROR] District {district} not found in state {state}")
-                return False
+                logger.error(f"District {district} not found in state {state}")
+                return result
             market_id = self.db.get_market_id_by_name(market, district_id)
             if not market_id:
-                print(f"[ERROR] Market {market} not found in district {district}")
-                return False
+                logger.error(f"Market {market} not found in district {district}")
+                return result
 
-            rows = table.find_all('tr')[1:]  # Skip header row
-            commodities = []
-            for row in rows:
-                cells = row.find_all('td')
-                if len(cells) >= 10:  # Ensure enough columns (including Sl no.)
-                    commodity_data = {
-                        'commodity': cells[4].get_text().strip(),
-                        'variety': cells[5].get_text().strip(),
-                        'min_price': int(re.sub(r'[^\d]', '', cells[6].get_text().strip())),
-                        'max_price': int(re.sub(r'[^\d]', '', cells[7].get_text().strip())),
-                        'modal_price': int(re.sub(r'[^\d]', '', cells[8].get_text().strip())),
-                        'price_date': cells[9].get_text().strip()
-                    }
-                    commodities.append(commodity_data)
-                    if self.db.insert_commodity_price(
-                        state_id,
-                        district_id,
-                        market_id,
-                        commodity_data['commodity'],
-                        commodity_data['variety'],
-                        commodity_data['min_price'],
-                        commodity_data['max_price'],
-                        commodity_data['modal_price'],
-                        commodity_data['price_date']
-                    ):
-                        print(f"[SUCCESS] Saved commodity: {commodity_data['commodity']} ({commodity_data['variety']}) for market {market}")
-                    else:
-                        print(f"[ERROR] Failed to save commodity: {commodity_data['commodity']} ({commodity_data['variety']}) for market {market}")
+            commodities, _ = page_records(table_rows, state_id, district_id, market_id,
+                                          extract=self.extract_commodity_data)
 
             if not commodities:
-                print(f"[ERROR] No valid commodity data found for {state}/{district}/{market}")
-                return False
+                logger.error(f"No valid commodity data found for {state}/{district}/{market}")
+                return result
 
-            print(f"[SUCCESS] Scraped {len(commodities)} commodities for {state}/{district}/{market}")
-            stats = self.db.get_stats()
-            print(f"Database Statistics after yard scraping:")
-            print(f"  States: {stats['states']}")
-            print(f"  Districts: {stats['districts']}")
-            print(f"  Markets: {stats['markets']}")
-            print(f"  Commodities: {stats['commodities']}")
-            time.sleep(1)  # Add delay to avoid overwhelming the server
-            return True
+            # Write the whole page in a single transaction
+            counts = self.db.upsert_commodity_prices(commodities)
+            if counts is None:
+                logger.error(f"Failed to save commodities for market {market}")
+                return result
+            self.db.save_page_fingerprint(**page['fingerprint'])
+            logger.info('Saved market prices', extra={'url': url, 'rows': len(commodities), **counts})
+            if delay:
+                time.sleep(delay)  # Add delay to avoid overwhelming the server
+            result.update({'success': True, 'status': 'changed', 'rows': len(commodities), 'counts': counts})
+            return result
         except Exception as e:
-            print(f"[ERROR] Error scraping yard data for {state}/{district}/{market}: {e}")
-            traceback.print_exc()
-            return False
+            logger.exception(f"Error scraping yard data for {state}/{district}/{market}: {e}")
+            return result
+
+    def scrape_district_data(self, state, district, delay=1, force=False):
+        return self.scrape_district_page(state, district, delay, force)['success']
 
-    def scrape_district_data(self, state, district):
-        print(f"Starting district data scraping for {state}/{district}...")
+    def scrape_district_page(self, state, district, delay=1, force=False):
+        """
+        Scrape one district page. Returns a dict with 'success', 'status'
+        ('changed', 'unchanged', 'not_modified' or 'failed'), 'rows' and 'counts'
+        """
+        result = {'success': False, 'status': 'failed', 'rows': 0, 'counts': None}
         try:
             # Normalize names for URL with proper handling of special characters
             state_slug = self.normalize_name_for_url(state)
             district_slug = self.normalize_name_for_url(district)
             url = f"{self.base_url}/{state_slug}/{district_slug}"
-            print(f"Requesting URL: {url}")
-            
-            response = self.session.get(url, timeout=30)
-            print(f"HTTP Status: {response.status_code}")
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
 
-            # Find the commodity prices table
-            table = soup.find('table')
-            if not table:
-                print(f"[ERROR] No commodity prices table found for {state}/{district}")
-                return False
+            page = self.fetch_price_page(url, force)
+            if page['status'] != 'changed':
+                logger.debug('Prices unchanged, skipping', extra={'url': url, 'page_status': page['status']})
+                result.update({'success': True, 'status': page['status']})
+                return result
+
+            # Extract the commodity prices table
+            table_rows = page['table_rows']
+            if table_rows is None:
+                logger.error(f"No commodity prices table found for {state}/{district}")
+                return result
 
             # Fetch IDs for validation
             state_id = self.db.get_state_id_by_name(state)
             if not state_id:
-                print(f"[ERROR] State {state} not found in database")
-                return False
+                logger.error(f"State {state} not found in database")
+                return result
             district_id = self.db.get_district_id_by_name(district, state_id)
             if not district_id:
-                print(f"[ERROR] District {district} not found in state {state}")
-                return False
+                logger.error(f"District {district} not found in state {state}")
+                return result
 
-            # Get all markets for this district
-            markets = self.db.get_markets_by_state_and_district(state_id, district_id)
-            if not markets:
-                print(f"[ERROR] No markets found for district {district}")
-                return False
+            # Markets are resolved by name through the location directory
+            if not get_directory().markets(district_id=district_id):
+                logger.error(f"No markets found for district {district}")
+                return result
 
-            rows = table.find_all('tr')[1:]  # Skip header row
-            commodities = []
-            for row in rows:
-                cells = row.find_all('td')
-                if len(cells) >= 10:  # Ensure enough columns
-                    market_name = cells[3].get_text().strip()
-                    # Find market ID by name
-                    market = next((m for m in markets if m['name'].lower() == market_name.lower()), None)
-                    if not market:
-                        print(f"[WARNING] Market {market_name} not found in database for district {district}")
-                        continue
-                    
-                    commodity_data = {
-                        'commodity': cells[4].get_text().strip(),
-                        'variety': cells[5].get_text().strip(),
-                        'min_price': int(re.sub(r'[^\d]', '', cells[6].get_text().strip())),
-                        'max_price': int(re.sub(r'[^\d]', '', cells[7].get_text().strip())),
-                        'modal_price': int(re.sub(r'[^\d]', '', cells[8].get_text().strip())),
-                        'price_date': cells[9].get_text().strip()
-                    }
-                    commodities.append(commodity_data)
-                    
-                    if self.db.insert_commodity_price(
-                        state_id,
-                        district_id,
-                        market['id'],
-                        commodity_data['commodity'],
-                        commodity_data['variety'],
-                        commodity_data['min_price'],
-                        commodity_data['max_price'],
-                        commodity_data['modal_price'],
-                        commodity_data['price_date']
-                    ):
-                        print(f"[SUCCESS] Saved commodity: {commodity_data['commodity']} ({commodity_data['variety']}) for market {market_name}")
-                    else:
-                        print(f"[ERROR] Failed to save commodity: {commodity_data['commodity']} ({commodity_data['variety']}) for market {market_name}")
+            commodities, unresolved = page_records(table_rows, state_id, district_id,
+                                                   market_keys=get_directory().snapshot().market_keys,
+                                                   extract=self.extract_commodity_data)
+            for market_name in sorted(unresolved):
+                logger.warning(f"Market {market_name} not found in database for district {district}")
 
             if not commodities:
-                print(f"[ERROR] No valid commodity data found for {state}/{district}")
-                return False
+                logger.error(f"No valid commodity data found for {state}/{district}")
+                return result
 
-            print(f"[SUCCESS] Scraped {len(commodities)} commodities for {state}/{district}")
-            stats = self.db.get_stats()
-            print(f"Database Statistics after district scraping:")
-            print(f"  States: {stats['states']}")
-            print(f"  Districts: {stats['districts']}")
-            print(f"  Markets: {stats['markets']}")
-            print(f"  Commodities: {stats['commodities']}")
-            time.sleep(1)  # Add delay to avoid overwhelming the server
-            return True
+            # Write the whole page in a single transaction
+            counts = self.db.upsert_commodity_prices(commodities)
+            if counts is None:
+                logger.error(f"Failed to save commodities for district {district}")
+                return result
+            self.db.save_page_fingerprint(**page['fingerprint'])
+            logger.info('Saved district prices', extra={'url': url, 'rows': len(commodities), **counts})
+            if delay:
+                time.sleep(delay)  # Add delay to avoid overwhelming the server
+            result.update({'success': True, 'status': 'changed', 'rows': len(commodities), 'counts': counts})
+            return result
         except Exception as e:
-            print(f"[ERROR] Error scraping district data for {state}/{district}: {e}")
-            traceback.print_exc()
-            return False
\ No newline at end of file
+            logger.exception(f"Error scraping district data for {state}/{district}: {e}")
+            return result
@@ -56,7 +56,6 @@ def scrape_yard():
         # Initialize scraper and results
         scraper = AgriplusScraper()
         results = {'successful': [], 'failed': []}
-        stats = db.get_stats()
 
         if market_id:
             # Scrape single market
@@ -83,7 +82,7 @@ def scrape_yard():
                 results['failed'].append(f"{state['name']}/{district['name']}")
 
         # Prepare response
-        stats = db.get_stats()  # Refresh stats after scraping
+        stats = db.get_stats()
         if results['successful']:
             status = 'success' if not results['failed'] else 'partial_success'
             message = f"Scraped data for {len(results['successful'])} locations successfully"
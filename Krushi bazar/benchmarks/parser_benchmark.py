@@ -0,0 +1,121 @@
+# Benchmark for the price table parser backends
+#
+# Usage (from the "Krushi bazar" directory):
+#   python benchmarks/parser_benchmark.py [fixtures_dir] [--repeat N]
+#
+# Saved agriplus pages (*.html) in fixtures_dir are used when present
+# (default: benchmarks/fixtures); otherwise synthetic price pages are generated.
+# Reports rows/second and peak memory per backend and exits with status 1 if
+# any backend returns rows that differ from the BeautifulSoup reference.
+import argparse
+import glob
+import multiprocessing
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.scraping.parsers import BACKENDS
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+def synthetic_price_page(rows, seed=0):
+    """Build a page shaped like an agriplus district price page"""
+    options = ''.join(f'<option value="{i}">State {i}</option>' for i in range(1, 37))
+    body = []
+    for i in range(rows):
+        n = i + seed
+        body.append(
+            '<tr>'
+            f'<td>{i + 1}</td><td>Gujarat</td><td>Vadodara(Baroda)</td>'
+            f'<td><a href="/prices/all/gujarat/vadodara-baroda/market-{n % 7}">Market {n % 7}</a></td>'
+            f'<td><span class="commodity">Commodity &amp; Co {n % 90}</span></td>'
+            f'<td>Variety&nbsp;{n % 13}</td>'
+            f'<td>{1000 + n % 500:,}</td><td>{2000 + n % 700:,}</td><td>{1500 + n % 600:,}</td>'
+            f'<td>{1 + n % 28} Aug</td>'
+            '</tr>'
+        )
+    return (
+        '<!DOCTYPE html><html><head><title>Prices</title>'
+        '<script>var config = {"a": "<table>"};</script></head><body>'
+        '<nav><ul>' + ''.join(f'<li><a href="/p/{i}">Link {i}</a></li>' for i in range(60)) + '</ul></nav>'
+        '<form><input type="hidden" name="_token" value="abc123">'
+        f'<select id="state">{options}</select></form>'
+        '<table class="table"><thead><tr>'
+        + ''.join(f'<th>{h}</th>' for h in ['Sl no.', 'State', 'District', 'Market', 'Commodity',
+                                            'Variety', 'Min', 'Max', 'Modal', 'Date'])
+        + '</tr></thead><tbody>' + ''.join(body) + '</tbody></table>'
+        '<footer>' + '<p>Footer text</p>' * 200 + '</footer></body></html>'
+    )
+
+def load_pages(fixtures_dir):
+    paths = sorted(glob.glob(os.path.join(fixtures_dir, '*.html')))
+    if paths:
+        pages = []
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                pages.append((os.path.basename(path), f.read()))
+        return pages
+    return [(f'synthetic-{rows}', synthetic_price_page(rows, seed)) for seed, rows in enumerate((20, 150, 300, 800))]
+
+def run_backend(backend, pages, repeat, queue):
+    extract = BACKENDS[backend]
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    total_rows = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for _, html in pages:
+            total_rows += len(extract(html) or [])
+    elapsed = time.perf_counter() - started
+    _, py_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    queue.put({
+        'backend': backend,
+        'rows': total_rows,
+        'seconds': elapsed,
+        'rows_per_second': total_rows / elapsed if elapsed else 0.0,
+        'py_peak_kb': py_peak // 1024,
+        'rss_growth_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark price table parser backends')
+    parser.add_argument('fixtures_dir', nargs='?', default=FIXTURES_DIR)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    pages = load_pages(args.fixtures_dir)
+    print(f"Pages: {len(pages)} ({', '.join(name for name, _ in pages)}), repeat: {args.repeat}")
+
+    # Every backend must return exactly what the BeautifulSoup reference returns
+    mismatches = 0
+    for name, html in pages:
+        reference = BACKENDS['bs4'](html)
+        for backend, extract in BACKENDS.items():
+            if extract(html) != reference:
+                mismatches += 1
+                print(f"[ERROR] {backend} rows differ from bs4 for {name}")
+
+    # Each backend runs in a fresh process so peak memory is not shared
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for backend in BACKENDS:
+        queue = context.Queue()
+        process = context.Process(target=run_backend, args=(backend, pages, args.repeat, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+
+    print(f"{'backend':<8} {'rows':>8} {'seconds':>9} {'rows/s':>10} {'py peak KB':>11} {'rss +KB':>9}")
+    for r in sorted(results, key=lambda r: -r['rows_per_second']):
+        print(f"{r['backend']:<8} {r['rows']:>8} {r['seconds']:>9.3f} {r['rows_per_second']:>10.0f} "
+              f"{r['py_peak_kb']:>11} {r['rss_growth_kb']:>9}")
+    print('All backends returned identical rows' if not mismatches else f'{mismatches} mismatches')
+    return 1 if mismatches else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
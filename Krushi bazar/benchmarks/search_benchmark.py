@@ -0,0 +1,256 @@
+# Benchmark for /api/database/search: in-memory index vs the LIKE queries
+#
+# Usage (from the "Krushi bazar" directory):
+#   python benchmarks/search_benchmark.py [--queries N] [--repeat N] [--sql]
+#
+# Without --sql the hierarchy is built from the API/{states,districts,markets}.json
+# dictionaries, and the old path is a Python scan with the same semantics as
+# the three LIKE '%q%' queries (case-insensitive substring, ordered by name).
+# With --sql the hierarchy is the configured MySQL database's, and the old
+# path runs the original SQL against it.
+#
+# The workload mixes English typeahead prefixes, substrings, Hindi and
+# Gujarati prefixes, one-typo names and misses. Reports latency percentiles
+# per implementation, how many queries each answers and how long the index
+# takes to build and to apply a small hierarchy change. Exits with status 1
+# if the index misses any location that the LIKE path finds for a query of
+# three or more characters (shorter queries only match word prefixes).
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# API.app modules import app.*, whose package __init__ imports every API
+# blueprint; load the app package first like app.py does
+import app  # noqa: F401
+from app.data.locations import _Snapshot
+from app.config import Config
+from app.data.search_index import LocationSearchIndex, normalize
+from API.app.translation_service import HybridTranslationService
+
+# The search_locations queries this index replaces
+SQL_QUERIES = {
+    'states': 'SELECT id, name FROM states WHERE name LIKE %s ORDER BY name',
+    'districts': '''
+        SELECT d.id, d.name, d.state_id, s.name as state_name
+        FROM districts d
+        JOIN states s ON d.state_id = s.id
+        WHERE d.name LIKE %s
+        ORDER BY d.name
+    ''',
+    'markets': '''
+        SELECT m.id, m.name, m.district_id, m.state_id, d.name as district_name, s.name as state_name
+        FROM markets m
+        JOIN districts d ON m.district_id = d.id
+        JOIN states s ON m.state_id = s.id
+        WHERE m.name LIKE %s
+        ORDER BY m.name
+    '''
+}
+
+# Large enough that the index returns every match, for the recall check
+UNCAPPED = 10 ** 6
+
+
+def json_snapshot():
+    """A hierarchy from the dictionaries: markets spread over districts, districts over states"""
+    paths = HybridTranslationService.json_paths()
+    names = {}
+    for kind in ('states', 'districts', 'markets'):
+        with open(paths[kind], 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        names[kind] = sorted({item['english'] for item in data[list(data.keys())[0]] if item.get('english')})
+    states = [{'id': i, 'name': name} for i, name in enumerate(names['states'], 1)]
+    districts = [
+        {'id': i, 'name': name, 'state_id': states[i % len(states)]['id']}
+        for i, name in enumerate(names['districts'], 1)
+    ]
+    markets = []
+    for i, name in enumerate(names['markets'], 1):
+        district = districts[i % len(districts)]
+        markets.append({'id': i, 'name': name, 'district_id': district['id'], 'state_id': district['state_id']})
+    return _Snapshot(states, districts, markets)
+
+
+class FixedDirectory:
+    """Stands in for the location directory with one snapshot"""
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+
+    def snapshot(self):
+        return self._snapshot
+
+
+def scan_search(snapshot, query):
+    """The LIKE '%q%' queries as a scan (utf8mb4_unicode_ci is case-insensitive)"""
+    needle = query.lower()
+    results = {'states': [], 'districts': [], 'markets': []}
+    for state in snapshot.states:
+        if needle in state['name'].lower():
+            results['states'].append({'id': state['id'], 'name': state['name']})
+    for district in sorted(snapshot.districts_by_id.values(), key=lambda d: d['name'].lower()):
+        if needle in district['name'].lower():
+            results['districts'].append({'id': district['id'], 'name': district['name']})
+    for market in sorted(snapshot.markets_by_id.values(), key=lambda m: m['name'].lower()):
+        if needle in market['name'].lower():
+            results['markets'].append({'id': market['id'], 'name': market['name']})
+    return results
+
+
+def sql_search(cursor, query):
+    results = {}
+    for kind, sql in SQL_QUERIES.items():
+        cursor.execute(sql, (f'%{query}%',))
+        results[kind] = cursor.fetchall()
+    return results
+
+
+def typo(name, rng):
+    chars = list(name)
+    positions = [i for i, char in enumerate(chars) if char.isalpha()][1:]
+    if not positions:
+        return name
+    i = rng.choice(positions)
+    chars[i] = 'z' if chars[i].lower() != 'z' else 'q'
+    return ''.join(chars)
+
+
+def build_workload(snapshot, dictionaries, queries, seed=0):
+    rng = random.Random(seed)
+    entries = [('states', s) for s in snapshot.states]
+    entries += [('districts', d) for d in snapshot.districts_by_id.values()]
+    entries += [('markets', m) for m in snapshot.markets_by_id.values()]
+    workload = []
+    while len(workload) < queries:
+        kind, entry = rng.choice(entries)
+        name = entry['name'].strip()
+        if len(name) < 4:
+            continue
+        shape = len(workload) % 6
+        if shape == 0:
+            workload.append(('prefix', name[:rng.randint(2, min(6, len(name)))]))
+        elif shape == 1:
+            start = rng.randint(1, len(name) - 3)
+            workload.append(('substring', name[start:start + rng.randint(3, 5)]))
+        elif shape in (2, 3):
+            lang = 'hi' if shape == 2 else 'gu'
+            translated = dictionaries.lookup(name, lang, [kind]) if dictionaries else None
+            if not translated or translated == name or len(translated) < 3:
+                continue
+            workload.append((lang, translated[:rng.randint(2, min(6, len(translated)))]))
+        elif shape == 4:
+            if len(name) < 6:
+                continue
+            workload.append(('typo', typo(name, rng)))
+        else:
+            workload.append(('miss', f'xq{rng.randint(0, 10 ** 6)}'))
+    return workload
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def timed(workload, search, repeat):
+    latencies = []
+    results = []
+    for _ in range(repeat):
+        results = []
+        for _, query in workload:
+            started = time.perf_counter()
+            results.append(search(query))
+            latencies.append((time.perf_counter() - started) * 1000)
+    return results, latencies
+
+
+def answered(workload, results):
+    counts = {}
+    for (shape, _), result in zip(workload, results):
+        hit = any(result[kind] for kind in ('states', 'districts', 'markets'))
+        total, hits = counts.get(shape, (0, 0))
+        counts[shape] = (total + 1, hits + (1 if hit else 0))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark location search')
+    parser.add_argument('--queries', type=int, default=600)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--sql', action='store_true', help='compare with the SQL path on the configured database')
+    args = parser.parse_args()
+
+    dictionaries = HybridTranslationService.get_index()
+    conn = None
+    if args.sql:
+        from app.data.locations import get_directory
+        from app.data.pool import get_pool
+        snapshot = get_directory().snapshot()
+        conn = get_pool().borrow()
+        cursor = conn.cursor()
+        old_name = 'SQL LIKE'
+        old_search = lambda query: sql_search(cursor, query)
+    else:
+        snapshot = json_snapshot()
+        old_name = 'LIKE scan'
+        old_search = lambda query: scan_search(snapshot, query)
+
+    directory = FixedDirectory(snapshot)
+    index = LocationSearchIndex(directory)
+    started = time.perf_counter()
+    index.sync(snapshot, dictionaries)
+    build_ms = (time.perf_counter() - started) * 1000
+    metrics = index.get_metrics()
+    print(f"Locations: {metrics['entries']}, word prefixes: {metrics['word_prefixes']}, trigrams: {metrics['trigrams']}")
+    print(f"Index: full build {build_ms:.1f} ms")
+    if not args.sql:
+        # A hierarchy change: the directory loads a new snapshot with a few renamed markets
+        markets = [dict(m) for m in snapshot.markets_by_id.values()]
+        for market in markets[:10]:
+            market['name'] += ' (New)'
+        renamed = _Snapshot(snapshot.states, list(snapshot.districts_by_id.values()), markets)
+        started = time.perf_counter()
+        changed = index.sync(renamed, dictionaries)
+        print(f"Index: sync after renaming 10 markets {(time.perf_counter() - started) * 1000:.1f} ms "
+              f"({changed} re-indexed)")
+        index.sync(snapshot, dictionaries)
+
+    workload = build_workload(snapshot, dictionaries, args.queries)
+    try:
+        old, old_latencies = timed(workload, old_search, args.repeat)
+    finally:
+        if conn is not None:
+            conn.close()
+    new, new_latencies = timed(workload, index.search, args.repeat)
+
+    print(f"{'implementation':<14} {'p50 ms':>8} {'p99 ms':>8} {'queries/s':>10}")
+    for name, latencies in ((old_name, old_latencies), ('index', new_latencies)):
+        print(f"{name:<14} {percentile(latencies, 0.5):>8.3f} {percentile(latencies, 0.99):>8.3f} "
+              f"{len(latencies) / (sum(latencies) / 1000):>10.0f}")
+    print(f"Speed-up (mean): {sum(old_latencies) / sum(new_latencies):.1f}x "
+          f"(index capped at {Config.SEARCH_RESULT_LIMIT} per kind, LIKE uncapped)")
+
+    old_answered, new_answered = answered(workload, old), answered(workload, new)
+    print(f"{'query shape':<12} {'queries':>8} {old_name:>10} {'index':>8}")
+    for shape, (total, hits) in sorted(new_answered.items()):
+        print(f"{shape:<12} {total:>8} {old_answered[shape][1]:>10} {hits:>8}")
+
+    # Every location the LIKE path finds must be found by the uncapped index.
+    # Shorter queries only match word prefixes, by design.
+    missed = 0
+    for (_, query), old_result in zip(workload, old):
+        if len(normalize(query)) < 3:
+            continue
+        new_result = index.search(query, UNCAPPED)
+        for kind in ('states', 'districts', 'markets'):
+            missed += len({row['id'] for row in old_result[kind]} - {row['id'] for row in new_result[kind]})
+    print('No LIKE matches missed' if not missed else f'{missed} LIKE matches missed by the index')
+    return 1 if missed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+# Benchmark for JSON dictionary lookups in HybridTranslationService
+#
+# Usage (from the "Krushi bazar" directory):
+#   python benchmarks/translation_benchmark.py [--terms N] [--repeat N]
+#
+# Compares the original linear scan over the five API/*.json dictionaries with
+# the hash index in API/app/translation_index.py. The workload mixes English
+# terms (translated to Hindi/Gujarati), Hindi/Gujarati terms (reverse lookup and
+# language detection) and misses. Also reports how long compiling the index
+# takes versus loading the precompiled artefact. Exits with status 1 if the two
+# implementations disagree on any term.
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# API.app modules import app.*, whose package __init__ imports every API
+# blueprint; load the app package first like app.py does
+import app  # noqa: F401
+from API.app.translation_index import TranslationIndex
+from API.app.translation_service import HybridTranslationService
+
+LANG_FIELDS = {'hi': 'hindi', 'gu': 'gujarati', 'en': 'english'}
+
+
+def load_items(paths):
+    items = []
+    for path in paths.values():
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        items.append(data[list(data.keys())[0]])
+    return items
+
+
+def linear_lookup(all_items, text, target_lang):
+    """The pre-index implementation of _get_translation_from_json"""
+    target_field = LANG_FIELDS.get(target_lang)
+    for items in all_items:
+        for item in items:
+            if target_lang == 'en':
+                if item.get('hindi') == text or item.get('gujarati') == text:
+                    return item.get('english')
+            elif item.get('english') == text:
+                return item.get(target_field)
+    return None
+
+
+def linear_detect(all_items, text):
+    """The pre-index implementation of detect_language_from_json"""
+    for items in all_items:
+        for item in items:
+            if item.get('hindi') == text:
+                return 'hi'
+            if item.get('gujarati') == text:
+                return 'gu'
+    return None
+
+
+def build_workload(all_items, terms, seed=0):
+    rng = random.Random(seed)
+    flat = [item for items in all_items for item in items]
+    workload = []
+    for i in range(terms):
+        item = rng.choice(flat)
+        kind = i % 4
+        if kind == 0:
+            workload.append(('lookup', item.get('english'), rng.choice(('hi', 'gu'))))
+        elif kind == 1:
+            workload.append(('lookup', item.get(rng.choice(('hindi', 'gujarati'))), 'en'))
+        elif kind == 2:
+            workload.append(('detect', item.get(rng.choice(('hindi', 'gujarati'))), None))
+        else:
+            workload.append(('lookup', f'Unknown term {i}', rng.choice(('hi', 'gu', 'en'))))
+    return workload
+
+
+def run(workload, lookup, detect, repeat):
+    results = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        results = [detect(text) if op == 'detect' else lookup(text, lang) for op, text, lang in workload]
+    elapsed = time.perf_counter() - started
+    return results, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark JSON dictionary lookups')
+    parser.add_argument('--terms', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    paths = HybridTranslationService.json_paths()
+    all_items = load_items(paths)
+    print(f"Dictionary items: {sum(len(items) for items in all_items)}, "
+          f"terms: {args.terms}, repeat: {args.repeat}")
+
+    started = time.perf_counter()
+    index = TranslationIndex.compile(paths)
+    compile_ms = (time.perf_counter() - started) * 1000
+    with tempfile.TemporaryDirectory() as tmp:
+        artefact = os.path.join(tmp, 'translation_index.pickle')
+        index.save(artefact)
+        size_kb = os.path.getsize(artefact) // 1024
+        started = time.perf_counter()
+        index = TranslationIndex.load(paths, artefact)
+        load_ms = (time.perf_counter() - started) * 1000
+    print(f"Index: compile {compile_ms:.1f} ms, load precompiled {load_ms:.1f} ms, artefact {size_kb} KB")
+
+    workload = build_workload(all_items, args.terms)
+    old, old_seconds = run(
+        workload,
+        lambda text, lang: linear_lookup(all_items, text, lang),
+        lambda text: linear_detect(all_items, text),
+        args.repeat
+    )
+    new, new_seconds = run(workload, index.lookup, index.detect, args.repeat)
+
+    mismatches = sum(1 for a, b in zip(old, new) if a != b)
+    total = len(workload) * args.repeat
+    print(f"{'implementation':<14} {'seconds':>9} {'lookups/s':>12}")
+    print(f"{'linear scan':<14} {old_seconds:>9.3f} {total / old_seconds:>12.0f}")
+    print(f"{'hash index':<14} {new_seconds:>9.3f} {total / new_seconds:>12.0f}")
+    print(f"Speed-up: {old_seconds / new_seconds:.0f}x")
+    print('Identical results' if not mismatches else f'{mismatches} mismatches')
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())